@@ -0,0 +1,483 @@
+"""Controle de admissão: limita a concorrência por rota e a taxa por cliente
+
+Em sobrecarga, aceitar todas as requisições só aumenta a fila no lock do
+SQLite e a latência de todas cresce até virarem timeouts. Com o controle
+ligado, cada requisição passa, antes de chegar à aplicação Flask, por:
+
+  1. um token bucket por cliente (CLIENT_RATE requisições/s, rajadas de até
+     CLIENT_BURST); sem token, 429
+  2. o limite de requisições simultâneas da rota; as escritas de
+     WRITE_ENDPOINTS dividem um orçamento próprio, WRITE_CONCURRENCY. Sem
+     vaga, a requisição espera em uma fila FIFO de até QUEUE_SIZE posições por
+     no máximo QUEUE_TIMEOUT segundos; com a fila cheia, ou se a espera
+     estimada já passar do prazo, é recusada na hora com 503
+
+As recusas levam o header Retry-After. O estado dos limitadores é registrado
+no log (no máximo a cada LOG_INTERVAL segundos, quando houve fila ou recusas)
+e exposto como gauges em GET /metrics.
+"""
+import asyncio
+import math
+import os
+import threading
+from collections import OrderedDict, deque
+from time import monotonic, perf_counter
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import HTTP_STATUS_CODES
+
+from logger import logger
+from schemas.erro import ErrorSchema
+
+
+# liga o controle de admissão (RPG_ADMISSION=1); desligado, toda requisição é aceita
+ADMISSION_ENABLED = os.environ.get('RPG_ADMISSION', '0').lower() not in ('0', 'false', 'off', 'no')
+# requisições simultâneas por rota, em cada processo; RPG_ADMISSION_LIMIT_<ENDPOINT>
+# sobrescreve uma rota, ex.: RPG_ADMISSION_LIMIT_LIST_NOTE_CHANGES=200. Com o GIL, mais
+# requisições simultâneas por processo só dividem a mesma CPU (benchmarks/admission.py)
+CONCURRENCY = int(os.environ.get('RPG_ADMISSION_CONCURRENCY', 2))
+# escritas simultâneas somadas de WRITE_ENDPOINTS; o SQLite tem um único escritor,
+# então escritas além desse número só esperariam pelo lock
+WRITE_CONCURRENCY = int(os.environ.get('RPG_ADMISSION_WRITE_CONCURRENCY', 2))
+WRITE_ENDPOINTS = frozenset(
+    name.strip() for name in os.environ.get('RPG_ADMISSION_WRITE_ENDPOINTS', 'create_campaign,create_note').split(',')
+    if name.strip()
+)
+# posições na fila de cada limitador e prazo máximo de espera nela; quem espera ocupa
+# uma thread do servidor, então limites e filas somados devem ficar abaixo das threads
+QUEUE_SIZE = int(os.environ.get('RPG_ADMISSION_QUEUE_SIZE', 8))
+QUEUE_TIMEOUT = float(os.environ.get('RPG_ADMISSION_QUEUE_TIMEOUT', 0.5))
+# token bucket por cliente (0 desliga); o cliente é o valor de CLIENT_HEADER, se
+# configurado e presente, ou o endereço remoto
+CLIENT_RATE = float(os.environ.get('RPG_ADMISSION_CLIENT_RATE', 0))
+CLIENT_BURST = int(os.environ.get('RPG_ADMISSION_CLIENT_BURST', 20))
+CLIENT_HEADER = os.environ.get('RPG_ADMISSION_CLIENT_HEADER', '')
+MAX_CLIENTS = int(os.environ.get('RPG_ADMISSION_MAX_CLIENTS', 10000))
+LOG_INTERVAL = float(os.environ.get('RPG_ADMISSION_LOG_INTERVAL', 10))
+
+# peso de cada nova medida na média móvel do tempo de serviço
+SERVICE_TIME_WEIGHT = 0.1
+
+
+class Rejected(Exception):
+    """Requisição recusada pelo controle de admissão, com o status e o Retry-After da resposta"""
+
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    """Requisição recusada por um limitador sem vaga"""
+
+    def __init__(self, limiter, retry_after):
+        super().__init__(limiter)
+        self.limiter = limiter
+        self.retry_after = retry_after
+
+
+def _retry_after(seconds):
+    """Segundos inteiros para o header Retry-After, no mínimo 1"""
+    return max(1, math.ceil(seconds))
+
+
+class ConcurrencyLimiter:
+    """Limite de requisições simultâneas com fila FIFO limitada e prazo de espera
+
+    Quem libera uma vaga a entrega diretamente ao primeiro da fila, de modo
+    que uma requisição recém-chegada não passa na frente de quem já espera. A
+    espera de quem chega é estimada pela posição na fila e pela média móvel
+    do tempo de serviço; se já passar do prazo, a recusa é imediata.
+    """
+
+    def __init__(self, name, limit, max_queue=QUEUE_SIZE, timeout=QUEUE_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.service_time = 0.0
+        self.admitted = 0
+        self.queued = 0
+        self.queue_time = 0.0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _estimated_wait(self, position):
+        return position * self.service_time / self.limit
+
+    def acquire(self):
+        """Ocupa uma vaga, esperando na fila se preciso
+
+        Returns:
+            Tempo de espera na fila, em segundos
+
+        Raises:
+            Overloaded: fila cheia, espera estimada ou efetiva acima do prazo
+        """
+        waiter = self._enqueue()
+        return 0.0 if waiter is None else self._wait(waiter)
+
+    async def acquire_async(self):
+        """Como acquire, para as rotas assíncronas: a espera na fila ocupa uma
+        thread do executor, nunca o event loop"""
+        waiter = self._enqueue()
+        if waiter is None:
+            return 0.0
+        future = asyncio.get_running_loop().run_in_executor(None, self._wait, waiter)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # o cliente desistiu na fila: a vaga, se chegar, é devolvida
+            future.add_done_callback(lambda f: f.exception() is None and self.release(0.0))
+            raise
+
+    def _enqueue(self):
+        """Ocupa uma vaga livre (devolve None) ou entra na fila (devolve o evento a aguardar)"""
+        with self._lock:
+            if self.in_flight < self.limit and not self._waiters:
+                self.in_flight += 1
+                self.admitted += 1
+                return None
+            position = len(self._waiters) + 1
+            wait = self._estimated_wait(position)
+            if position > self.max_queue or wait > self.timeout:
+                self.rejected += 1
+                raise Overloaded(self.name, _retry_after(wait))
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+            return waiter
+
+    def _wait(self, waiter):
+        start = perf_counter()
+        granted = waiter.wait(self.timeout)
+        waited = perf_counter() - start
+        with self._lock:
+            # a vaga pode ter sido entregue entre o fim do prazo e o lock
+            if not granted and not waiter.is_set():
+                self._waiters.remove(waiter)
+                self.timed_out += 1
+                raise Overloaded(self.name, _retry_after(self._estimated_wait(len(self._waiters) + 1)))
+            self.admitted += 1
+            self.queued += 1
+            self.queue_time += waited
+        return waited
+
+    def release(self, service_time):
+        """Libera a vaga de uma requisição que levou service_time segundos"""
+        with self._lock:
+            if self.service_time:
+                self.service_time += SERVICE_TIME_WEIGHT * (service_time - self.service_time)
+            else:
+                self.service_time = service_time
+            if self._waiters:
+                # a vaga passa para o primeiro da fila sem ser devolvida
+                self._waiters.popleft().set()
+            else:
+                self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'waiting': len(self._waiters),
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'queue_seconds': round(self.queue_time, 6),
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'service_seconds': round(self.service_time, 6),
+            }
+
+
+class ClientBuckets:
+    """Token bucket por cliente, lembrando no máximo max_clients clientes (LRU)"""
+
+    def __init__(self, rate, burst, max_clients=MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.allowed = 0
+        self.limited = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client):
+        """Consome um token do cliente
+
+        Returns:
+            0 se havia token, senão os segundos até o próximo
+        """
+        now = monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+                self.allowed += 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self.limited += 1
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._buckets), 'allowed': self.allowed, 'limited': self.limited}
+
+
+class AdmissionControl:
+    """Limitadores por rota, orçamento de escritas e buckets por cliente de uma aplicação"""
+
+    def __init__(self, concurrency=CONCURRENCY, write_concurrency=WRITE_CONCURRENCY, write_endpoints=WRITE_ENDPOINTS,
+                 max_queue=QUEUE_SIZE, timeout=QUEUE_TIMEOUT, client_rate=CLIENT_RATE, client_burst=CLIENT_BURST,
+                 log_interval=LOG_INTERVAL):
+        self.concurrency = concurrency
+        self.write_endpoints = write_endpoints
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.write = ConcurrencyLimiter('write', write_concurrency, max_queue, timeout)
+        self.clients = ClientBuckets(client_rate, client_burst) if client_rate > 0 else None
+        self.log_interval = log_interval
+        self._limiters = {}
+        self._lock = threading.Lock()
+        self._report_lock = threading.Lock()
+        self._last_report = monotonic()
+        self._reported = (0, 0)
+
+    def limiter(self, endpoint):
+        """Limitador da rota (nome da função, sem o blueprint); as escritas dividem o mesmo"""
+        if endpoint in self.write_endpoints:
+            return self.write
+        limiter = self._limiters.get(endpoint)
+        if limiter is None:
+            limit = int(os.environ.get(f'RPG_ADMISSION_LIMIT_{endpoint.upper()}', self.concurrency))
+            with self._lock:
+                limiter = self._limiters.setdefault(
+                    endpoint, ConcurrencyLimiter(endpoint, limit, self.max_queue, self.timeout)
+                )
+        return limiter
+
+    def admit(self, endpoint, client):
+        """Consome o token do cliente e ocupa uma vaga da rota, esperando na fila se preciso
+
+        Returns:
+            Tupla (limitador a liberar com release, tempo de espera na fila)
+
+        Raises:
+            Rejected: 429 sem token do cliente, 503 sem vaga na rota
+        """
+        self._take_token(client)
+        limiter = self.limiter(endpoint)
+        try:
+            return limiter, limiter.acquire()
+        except Overloaded as e:
+            raise self._overloaded(e) from None
+
+    async def admit_async(self, endpoint, client):
+        """Como admit, para as rotas assíncronas do modo ASGI"""
+        self._take_token(client)
+        limiter = self.limiter(endpoint)
+        try:
+            return limiter, await limiter.acquire_async()
+        except Overloaded as e:
+            raise self._overloaded(e) from None
+
+    def release(self, limiter, service_time):
+        """Libera a vaga ocupada por admit"""
+        limiter.release(service_time)
+        self.report()
+
+    def _take_token(self, client):
+        if self.clients is not None:
+            wait = self.clients.take(client)
+            if wait:
+                self.report()
+                raise Rejected(
+                    429, "Limite de requisições do cliente excedido; aguarde antes de tentar novamente.",
+                    _retry_after(wait),
+                )
+
+    def _overloaded(self, e):
+        self.report()
+        return Rejected(
+            503, f"Servidor sobrecarregado ({e.limiter}); tente novamente em {e.retry_after} s.", e.retry_after
+        )
+
+    def limiters(self):
+        with self._lock:
+            return [self.write] + [self._limiters[name] for name in sorted(self._limiters)]
+
+    def stats(self):
+        """Estado de todos os limitadores em um dicionário plano, para render_gauges"""
+        values = {}
+        for limiter in self.limiters():
+            for key, value in limiter.stats().items():
+                values[f'{limiter.name}_{key}'] = value
+        if self.clients is not None:
+            for key, value in self.clients.stats().items():
+                values[f'client_{key}'] = value
+        return values
+
+    def report(self):
+        """Registra no log o estado dos limitadores, se houve fila ou recusas desde o último registro
+
+        Chamado a cada requisição; no máximo um registro por log_interval segundos.
+        """
+        now = monotonic()
+        if now - self._last_report < self.log_interval or not self._report_lock.acquire(blocking=False):
+            return
+        try:
+            if now - self._last_report < self.log_interval:
+                return
+            self._last_report = now
+            limiters = [(limiter.name, limiter.stats()) for limiter in self.limiters()]
+            clients = self.clients.stats() if self.clients is not None else None
+            queued = sum(s['queued'] for _, s in limiters)
+            shed = sum(s['rejected'] + s['timed_out'] for _, s in limiters) + (clients['limited'] if clients else 0)
+            previous_queued, previous_shed = self._reported
+            self._reported = (queued, shed)
+            if queued == previous_queued and shed == previous_shed:
+                return
+            parts = [
+                f"{name} {s['in_flight']}/{s['limit']} fila={s['waiting']} admitidas={s['admitted']} "
+                f"esperaram={s['queued']} recusadas={s['rejected']} expiradas={s['timed_out']} "
+                f"serviço={s['service_seconds'] * 1000:.1f}ms"
+                for name, s in limiters if s['admitted'] or s['rejected'] or s['timed_out']
+            ]
+            if clients is not None:
+                parts.append(f"clientes={clients['clients']} limitados={clients['limited']}")
+            log = logger.warning if shed > previous_shed else logger.info
+            log("Admissão: %d recusadas desde o último registro; %s", shed - previous_shed, '; '.join(parts))
+        finally:
+            self._report_lock.release()
+
+
+def _client_key(environ):
+    if CLIENT_HEADER:
+        value = environ.get('HTTP_' + CLIENT_HEADER.upper().replace('-', '_'))
+        if value:
+            return value
+    return environ.get('REMOTE_ADDR') or '-'
+
+
+def _rejection(start_response, status, message, retry_after):
+    body = ErrorSchema(message=message).model_dump_json().encode('utf-8')
+    start_response(f'{status} {HTTP_STATUS_CODES[status]}', [
+        ('Content-Type', 'application/json'),
+        ('Content-Length', str(len(body))),
+        ('Retry-After', str(retry_after)),
+    ])
+    return [body]
+
+
+class _ReleasingIterable:
+    """Corpo da resposta que libera a vaga ao terminar de ser lido ou ao ser fechado, o que vier antes"""
+
+    def __init__(self, app_iter, release):
+        self._app_iter = app_iter
+        self._release = release
+        self._released = False
+
+    def __iter__(self):
+        yield from self._app_iter
+        self._done()
+
+    def _done(self):
+        if not self._released:
+            self._released = True
+            self._release()
+
+    def close(self):
+        try:
+            close = getattr(self._app_iter, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._done()
+
+
+class AdmissionMiddleware:
+    """Middleware WSGI que aplica o controle de admissão antes da aplicação Flask
+
+    A recusa acontece antes do contexto da requisição e dos hooks (logs,
+    métricas, CORS) e custa ~20 µs, contra ~270 µs de uma recusa dentro do
+    Flask e ~2,5 ms de um POST /notes atendido; recusar precisa continuar
+    barato justamente quando a CPU está saturada. A vaga é liberada quando a
+    resposta termina de ser enviada, inclusive em streaming. Os itens de
+    POST /batch são despachados dentro do Flask e não passam por aqui: o lote
+    ocupa uma única vaga da sua rota.
+    """
+
+    def __init__(self, wsgi_app, url_map, control, blueprints, exempt):
+        self.wsgi_app = wsgi_app
+        self.url_map = url_map
+        self.control = control
+        self.blueprints = frozenset(blueprints)
+        self.exempt = frozenset(exempt)
+
+    def _endpoint(self, environ):
+        """Nome da função da rota, sem o blueprint, ou None se a rota não é limitada"""
+        if environ.get('REQUEST_METHOD') == 'OPTIONS':
+            return None
+        try:
+            endpoint, _ = self.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            # 404, 405 e redirecionamentos ficam a cargo do Flask
+            return None
+        blueprint, _, name = endpoint.rpartition('.')
+        if blueprint not in self.blueprints or endpoint in self.exempt:
+            return None
+        return name
+
+    def __call__(self, environ, start_response):
+        endpoint = self._endpoint(environ)
+        if endpoint is None:
+            return self.wsgi_app(environ, start_response)
+
+        control = self.control
+        try:
+            limiter, waited = control.admit(endpoint, _client_key(environ))
+        except Rejected as e:
+            return _rejection(start_response, e.status, e.message, e.retry_after)
+        start = perf_counter()
+
+        def release():
+            control.release(limiter, perf_counter() - start)
+
+        def start_with_queue_time(status, headers, exc_info=None):
+            if waited:
+                headers.append(('Server-Timing', f'queue;dur={waited * 1000:.2f}'))
+            return start_response(status, headers, exc_info)
+
+        try:
+            app_iter = self.wsgi_app(environ, start_with_queue_time)
+        except BaseException:
+            release()
+            raise
+        return _ReleasingIterable(app_iter, release)
+
+
+def init_admission(app, control=None, blueprints=('rpg',), exempt=()):
+    """Instala o controle de admissão nas rotas dos blueprints informados, se habilitado
+
+    Args:
+        control: AdmissionControl (padrão: um novo, com a configuração do ambiente)
+        exempt: endpoints nunca limitados, ex.: 'rpg.metrics', para observar a sobrecarga
+
+    Returns:
+        O AdmissionControl instalado, ou None se desligado
+    """
+    if not ADMISSION_ENABLED:
+        return None
+    control = control or AdmissionControl()
+    app.wsgi_app = AdmissionMiddleware(app.wsgi_app, app.url_map, control, blueprints, exempt)
+    return control
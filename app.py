@@ -1,21 +1,66 @@
-from flask_openapi3 import OpenAPI, Info, Tag
-from flask import redirect
+from flask_openapi3 import OpenAPI, APIBlueprint, Info, Tag
+from flask import redirect, request, Response, g, current_app
+from werkzeug.http import is_resource_modified
+from datetime import datetime, timezone
 from urllib.parse import unquote
+from pydantic import ValidationError
+from functools import partial
+import tempfile
+import click
 import traceback
+import json
+import os
 
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 
 # Garante que o modelo e a sessão sejam importados corretamente
 try:
-    from model import Session, Campaign, Notes
-    from logger import logger
+    from model import Session, ReadSession, Campaign, Notes, CampaignNoteVersion, db_profile
+    from model import write, WriteTimeoutError, CampaignStats, shards, change_notifier
+    from model.changes import changed_notes, merge_changes, encode_change_cursor, decode_change_cursor
+    from model.sharding import migrate_to_shards, migrate_schemas, move_campaign
+    from model.stats import check_campaign_stats, rebuild_campaign_stats
+    from model.pagination import paginate_notes, paginate_notes_merged, order_notes, note_sort_key, filter_created
+    from model.archive import export_statement
+    from model.pagination import InvalidCursorError, DEFAULT_PAGE_SIZE
+    from model.search import search_notes, rebuild_search_index
+    from model.bulk import ingest_notes, CampaignResolver
+    from model.migrations import migrate_campaign_fk, needs_campaign_fk_migration, MigrationError, MIGRATION_BATCH_SIZE
+    from model.migrations import recompress_notes
+    from model.compression import settings as compression_settings
+    from streaming import (
+        iter_ndjson, iter_json_array, MalformedStreamError, NDJSON_MIMETYPES, stream_format, iter_partitions,
+        iter_merged_partitions
+    )
+    from serialization import (
+        CAMPAIGN_COLUMNS, CAMPAIGN_STATS_COLUMNS, note_fields, select_notes, notes_page_json, campaigns_json, campaign_json,
+        stream_notes, stream_campaigns, streaming_response, negotiate_mimetype, negotiated_response,
+        note_changes_json, JSON_MIMETYPE
+    )
+    from change_feed import wait_for_changes, iter_sse, sse_response, SSE_MIMETYPE
+    from response_compression import init_compression
+    from admission import init_admission, AdmissionControl, ADMISSION_ENABLED
+    from batch import run_batch
+    from archive import (
+        export_response, iter_archive, import_archive, ArchiveError, ArchiveConflictError, ARCHIVE_MIMETYPES
+    )
+    import openapi_cache
+    from logger import logger, init_request_logging
+    from cache import notes_cache, make_etag
+    from metrics import init_metrics, instrument_engine, register_collector, render_gauges, metrics_response
     from schemas.erro import ErrorSchema
-    from schemas.campaign import CampaignPath, CampaignCreate, CampaignInDB
-    from schemas.note import NoteCreate, NoteResponse, NotesSearchResponse, CampaignNamePath
+    from schemas.campaign import CampaignPath, CampaignCreate, CampaignUpdate, CampaignInDB, CampaignListQuery
+    from schemas.campaign import CampaignIncludeQuery, CampaignWithStats
+    from schemas.note import NoteCreate, NoteResponse, NotesQuery, NotesSearchResponse, CampaignNamePath
+    from schemas.note import NoteSearchQuery, NoteSearchHit, NoteSearchResponse, NoteBulkResponse
+    from schemas.note import NoteChangesQuery, NoteChangesResponse
+    from schemas.batch import BatchRequest, BatchResponse
+    from schemas.archive import CampaignExportQuery, CampaignImportQuery, CampaignImportResponse
     from schemas import *
-    print("All imports successful!")
+    logger.debug("All imports successful!")
 except ImportError as e:
-    print(f"Import error: {e}")
+    click.echo(f"Import error: {e}", err=True)
     traceback.print_exc()
     raise
 
@@ -26,16 +71,44 @@ info = Info(
     version="1.0.0",
     description="API para gerenciamento de campanhas e notas de RPG"
 )
-app = OpenAPI(__name__, info=info)
-CORS(app)
+
+# especificação OpenAPI em cache para este código (ver openapi_cache.py); com
+# ela em disco as rotas são registradas sem gerar a documentação de cada uma
+_spec_path = openapi_cache.cache_path()
+_spec_cached = _spec_path is not None and os.path.exists(_spec_path)
+
+# rotas e comandos da aplicação, registrados em cada app criada por create_app()
+api = APIBlueprint('rpg', __name__, doc_ui=not _spec_cached, cli_group=None)
+
+register_collector(lambda: render_gauges('rpg_notes_cache', notes_cache.stats(), 'Cache de listagens de notas'))
+if db_profile['group_commit']:
+    register_collector(lambda: render_gauges('rpg_group_commit', shards.writer_stats(), 'Escritas agrupadas (group commit)'))
+
+# limites de admissão do processo, compartilhados pelas apps criadas nele
+admission = AdmissionControl() if ADMISSION_ENABLED else None
+# nunca limitados: a documentação, a observação da sobrecarga e o feed de
+# alterações, cujo long-poll/SSE ocupa a vaga por até minutos esperando
+# (sem usar CPU nem o banco) e inflaria o tempo de serviço estimado da rota
+ADMISSION_EXEMPT = ('rpg.home', 'rpg.metrics', 'rpg.cache_stats', 'rpg.list_note_changes')
+if admission is not None:
+    register_collector(lambda: render_gauges('rpg_admission', admission.stats(), 'Controle de admissão'))
+
+
+def _instrument_database(database):
+    instrument_engine(database.engine)
+    instrument_engine(database.read_engine)
+
 
 # Depuração
-@app.errorhandler(500)
 def internal_error(error):
-    print(f"Erro interno: {error}")
-    traceback.print_exc()
+    logger.error("Erro interno: %s", error, exc_info=True)
     return {"error": "Erro interno do servidor", "details": str(error)}, 500
 
+def write_timeout(error):
+    """503 para uma escrita descartada na fila do group commit; ela não foi gravada e pode ser repetida"""
+    logger.warning("Escrita recusada: %s", error)
+    return ErrorSchema(message=str(error)).model_dump(mode='json'), 503, {'Retry-After': '1'}
+
 # definindo tags
 home_tag = Tag(
     name="Documentação",
@@ -53,8 +126,16 @@ error_tag = Tag(
     name="Erro",
     description="Mensagens de erro e respostas de exceção"
 )
+batch_tag = Tag(
+    name="Lote",
+    description="Várias requisições da API em uma única chamada HTTP"
+)
+diagnostic_tag = Tag(
+    name="Diagnóstico",
+    description="Estatísticas internas de funcionamento da API"
+)
 
-@app.get('/', tags=[home_tag])
+@api.get('/', tags=[home_tag])
 def home():
     """Redireciona para /openapi, tela que permite a escolha do estilo de documentação.
     """
@@ -62,95 +143,262 @@ def home():
 
 # --- CAMPANHAS ---
 
-@app.post('/campaigns', tags=[campaign_tag], responses={"201": CampaignInDB, "400": ErrorSchema})
+@api.post('/campaigns', tags=[campaign_tag], responses={"201": CampaignInDB, "400": ErrorSchema, "503": ErrorSchema})
 def create_campaign(body: CampaignCreate):
     """Cria uma nova campanha de RPG"""
-    print(f"Received data: {body}")
-    session = Session()
-    try:
+    logger.debug("Received campaign: %s", body.name)
+
+    def insert_campaign(session):
         campaign = Campaign(name=body.name, description=body.description)
-        print(f"Created campaign object: {campaign}")
         session.add(campaign)
-        session.commit()
-        session.refresh(campaign)  
-        print(f"Campaign saved: {campaign}")
-        result = CampaignInDB.model_validate(campaign)
-        print(f"Validated result: {result}")
+        session.flush()
+        session.refresh(campaign)
+        # com shards, grava no diretório o shard que receberá as notas e,
+        # antes do commit, a cópia da campanha nele
+        shards.register(session, campaign.id)
+        session.flush()
+        shards.sync_campaign(campaign.id, session=session)
+        return CampaignInDB.model_validate(campaign)
+
+    try:
+        result = write(insert_campaign)
+        logger.debug("Campaign saved: %s", result.id)
         return result.model_dump(mode='json'), 201
+    except WriteTimeoutError as e:
+        return write_timeout(e)
     except IntegrityError as e:
-        session.rollback()
-        print(f"Integrity error creating campaign: {e}")
-        logger.error(f"Integrity error creating campaign: {e}")
+        logger.error("Integrity error creating campaign: %s", e)
         return ErrorSchema(message="Erro de integridade ao criar campanha.").model_dump(mode='json'), 400
     except Exception as e:
-        session.rollback()
-        print(f"Unexpected error creating campaign: {e}")
-        traceback.print_exc()
-        logger.error(f"Unexpected error creating campaign: {e}")
+        logger.exception("Unexpected error creating campaign: %s", e)
         return ErrorSchema(message=f"Erro interno: {str(e)}").model_dump(mode='json'), 500
-    finally:
-        session.close()
 
-@app.get('/campaigns', tags=[campaign_tag])
-def list_campaigns():
-    """Lista todas as campanhas"""
-    session = Session()
+def _campaigns_query(select_from, include):
+    """Seleciona as colunas de campanha, com as estatísticas se include=stats"""
+    if include == 'stats' and not shards.enabled:
+        return select_from(*CAMPAIGN_STATS_COLUMNS).outerjoin(
+            CampaignStats, CampaignStats.campaign_id == Campaign.id
+        )
+    return select_from(*CAMPAIGN_COLUMNS)
+
+def _with_shard_stats(rows, include):
+    """Com shards, completa as campanhas com as estatísticas lidas do shard de cada uma"""
+    if include != 'stats' or not shards.enabled:
+        return rows
+    stats = shards.campaign_stats([row.id for row in rows])
+    result = []
+    for row in rows:
+        row_stats = stats.get(row.id)
+        result.append({
+            **row._asdict(),
+            'note_count': row_stats.note_count if row_stats else 0,
+            'content_bytes': row_stats.content_bytes if row_stats else 0,
+            'last_activity_at': row_stats.last_activity_at if row_stats else None,
+        })
+    return result
+
+def _in_request_order(rows, ids):
+    """Ordena o resultado de um multi-get (ids=) na ordem dos IDs pedidos
+
+    Returns:
+        Tupla (linhas, IDs não encontrados); IDs repetidos contam uma vez
+    """
+    by_id = {row.id: row for row in rows}
+    wanted = list(dict.fromkeys(ids))
+    return [by_id[i] for i in wanted if i in by_id], [i for i in wanted if i not in by_id]
+
+def _with_missing_ids(response, missing):
+    """Informa no header X-Missing-Ids os IDs de um multi-get que não existem"""
+    if missing:
+        response.headers['X-Missing-Ids'] = ','.join(str(i) for i in missing)
+    return response
+
+@api.get('/campaigns', tags=[campaign_tag], responses={"200": CampaignWithStats})
+def list_campaigns(query: CampaignListQuery):
+    """Lista todas as campanhas
+
+    Args:
+        include: 'stats' inclui quantidade de notas, bytes de conteúdo e última atividade
+        stream: Transmite a lista de forma incremental (ou envie Accept: application/x-ndjson)
+        ids: Busca apenas as campanhas com estes IDs, em uma única consulta
+    """
+    stats = query.include == 'stats'
+    fmt = stream_format(query.stream)
+    if fmt and query.ids is None:
+        statement = _campaigns_query(select, query.include).order_by(Campaign.id)
+        partitions = (_with_shard_stats(rows, query.include) for rows in iter_partitions(ReadSession, statement))
+        return streaming_response(stream_campaigns(partitions, fmt, stats=stats), fmt)
+
+    session = ReadSession()
     try:
-        campaigns = session.query(Campaign).all()
-        campaign_list = [CampaignInDB.model_validate(c).model_dump(mode='json') for c in campaigns]
-        return campaign_list
+        campaigns_query = _campaigns_query(session.query, query.include)
+        missing = None
+        if query.ids is not None:
+            campaigns, missing = _in_request_order(campaigns_query.filter(Campaign.id.in_(query.ids)).all(), query.ids)
+        else:
+            campaigns = campaigns_query.all()
+        campaigns = _with_shard_stats(campaigns, query.include)
+        mimetype = negotiate_mimetype()
+        response = negotiated_response(campaigns_json(campaigns, stats=stats, mimetype=mimetype), mimetype)
+        return _with_missing_ids(response, missing)
     except Exception as e:
-        print(f"Error listing campaigns: {e}")
-        traceback.print_exc()
+        logger.exception("Error listing campaigns: %s", e)
         return ErrorSchema(message=f"Erro ao listar campanhas: {str(e)}").model_dump(mode='json'), 500
     finally:
         session.close()
 
-@app.get('/campaigns/<int:campaign_id>', tags=[campaign_tag], responses={"200": CampaignInDB, "404": ErrorSchema})
-def get_campaign(path: CampaignPath):
+@api.get('/campaigns/<int:campaign_id>', tags=[campaign_tag], responses={"200": CampaignWithStats, "404": ErrorSchema})
+def get_campaign(path: CampaignPath, query: CampaignIncludeQuery):
     """Busca uma campanha pelo ID
     
     Args:
         campaign_id: ID da campanha a ser buscada
+        include: 'stats' inclui quantidade de notas, bytes de conteúdo e última atividade
     """
     campaign_id = path.campaign_id
-    session = Session()
+    session = ReadSession()
     try:
-        campaign = session.query(Campaign).filter_by(id=campaign_id).first()
+        campaign = _campaigns_query(session.query, query.include).filter(Campaign.id == campaign_id).first()
         if campaign:
-            return CampaignInDB.model_validate(campaign).model_dump(mode='json')
+            campaign = _with_shard_stats([campaign], query.include)[0]
+            mimetype = negotiate_mimetype()
+            return negotiated_response(campaign_json(campaign, stats=query.include == 'stats', mimetype=mimetype), mimetype)
         return ErrorSchema(message="Campanha não encontrada.").model_dump(mode='json'), 404
     except Exception as e:
-        print(f"Error getting campaign: {e}")
-        traceback.print_exc()
+        logger.exception("Error getting campaign: %s", e)
         return ErrorSchema(message=f"Erro ao buscar campanha: {str(e)}").model_dump(mode='json'), 500
     finally:
         session.close()
 
+@api.patch('/campaigns/<int:campaign_id>', tags=[campaign_tag], responses={"200": CampaignInDB, "400": ErrorSchema, "404": ErrorSchema})
+def update_campaign(path: CampaignPath, body: CampaignUpdate):
+    """Atualiza o nome e/ou a descrição de uma campanha
+
+    As notas referenciam a campanha pelo id, então renomear uma campanha não
+    altera nenhuma nota.
+
+    Args:
+        campaign_id: ID da campanha a ser atualizada
+    """
+    session = Session()
+    try:
+        campaign = session.query(Campaign).filter_by(id=path.campaign_id).first()
+        if not campaign:
+            return ErrorSchema(message="Campanha não encontrada.").model_dump(mode='json'), 404
+
+        for field, value in body.model_dump(exclude_unset=True).items():
+            setattr(campaign, field, value)
+        session.flush()
+        shards.sync_campaign(campaign.id, session=session)
+        session.commit()
+        session.refresh(campaign)
+        # as páginas em cache trazem o nome da campanha; a renomeação já
+        # incrementou a versão (trigger campaigns_version_au) para todos os
+        # workers, aqui só se libera a memória deste
+        notes_cache.invalidate(campaign.id)
+        return CampaignInDB.model_validate(campaign).model_dump(mode='json')
+    except IntegrityError as e:
+        session.rollback()
+        logger.error("Integrity error updating campaign: %s", e)
+        return ErrorSchema(message="Erro de integridade ao atualizar campanha.").model_dump(mode='json'), 400
+    except Exception as e:
+        session.rollback()
+        logger.exception("Unexpected error updating campaign: %s", e)
+        return ErrorSchema(message=f"Erro interno: {str(e)}").model_dump(mode='json'), 500
+    finally:
+        session.close()
+
+@api.get('/campaigns/<int:campaign_id>/export', tags=[campaign_tag], responses={"404": ErrorSchema})
+def export_campaign(path: CampaignPath, query: CampaignExportQuery):
+    """Exporta a campanha e suas notas como um arquivo NDJSON comprimido com gzip
+
+    O arquivo é gerado e enviado aos poucos, com memória constante, e pode
+    ser importado em outra instância por POST /campaigns/import.
+
+    Args:
+        campaign_id: ID da campanha a exportar
+        from: Apenas notas criadas a partir desta data/hora (inclusive)
+        to: Apenas notas criadas antes desta data/hora (exclusive)
+    """
+    session = ReadSession()
+    try:
+        campaign = session.query(*CAMPAIGN_COLUMNS).filter(Campaign.id == path.campaign_id).first()
+    except Exception as e:
+        logger.exception("Error exporting campaign %s: %s", path.campaign_id, e)
+        return ErrorSchema(message=f"Erro ao exportar campanha: {str(e)}").model_dump(mode='json'), 500
+    finally:
+        session.close()
+    if not campaign:
+        return ErrorSchema(message="Campanha não encontrada.").model_dump(mode='json'), 404
+
+    # as notas são lidas do shard da campanha em lotes, enquanto o arquivo é enviado
+    shard = shards.locate(campaign_id=campaign.id)
+    statement = export_statement(campaign.id, query.from_, query.to)
+    return export_response(campaign, iter_partitions(partial(ReadSession, shard=shard), statement))
+
+@api.post('/campaigns/import', tags=[campaign_tag], responses={"200": CampaignImportResponse, "400": ErrorSchema, "409": ErrorSchema, "503": ErrorSchema})
+def import_campaign(query: CampaignImportQuery):
+    """Importa um arquivo gerado por GET /campaigns/<id>/export
+
+    Envie o arquivo como corpo (Content-Type application/gzip; NDJSON sem
+    compressão também é aceito). As notas são gravadas em transações de
+    algumas centenas; se a importação for interrompida, reenviar o mesmo
+    arquivo continua de onde parou, sem duplicar notas.
+
+    Args:
+        name: Nome da campanha a criar (padrão: o nome gravado no arquivo)
+    """
+    compressed = request.mimetype in ARCHIVE_MIMETYPES or request.content_encoding == 'gzip'
+    try:
+        result = import_archive(iter_archive(request.stream, compressed), name=query.name)
+    except ArchiveConflictError as e:
+        return ErrorSchema(message=str(e)).model_dump(mode='json'), 409
+    except WriteTimeoutError as e:
+        return write_timeout(e)
+    except ArchiveError as e:
+        return ErrorSchema(message=str(e)).model_dump(mode='json'), 400
+    except Exception as e:
+        logger.exception("Unexpected error importing campaign: %s", e)
+        return ErrorSchema(message=f"Erro interno: {str(e)}").model_dump(mode='json'), 500
+    notes_cache.invalidate(result.campaign_id)
+    return result.model_dump(mode='json')
+
 # --- NOTAS (MENSAGENS) ---
 
-@app.post('/notes', tags=[note_tag], responses={"201": NoteResponse, "400": ErrorSchema, "404": ErrorSchema})
+def _resync_campaign(name):
+    """Refaz a cópia no shard de uma campanha do diretório que ficou sem ela
+
+    Campanhas criadas antes de a cópia fazer parte da transação de criação
+    podem ter ficado sem ela, e nenhuma nota poderia ser gravada nelas.
+    """
+    session = ReadSession()
+    try:
+        campaign_id = session.scalar(select(Campaign.id).where(Campaign.name == name).order_by(Campaign.id).limit(1))
+    finally:
+        session.close()
+    return campaign_id is not None and shards.sync_campaign(campaign_id)
+
+@api.post('/notes', tags=[note_tag], responses={"201": NoteResponse, "400": ErrorSchema, "404": ErrorSchema, "503": ErrorSchema})
 def create_note(body: NoteCreate):
     """Cria uma nova nota para uma campanha"""
-    print(f"Received note data: {body}")
-    session = Session()
-    try:
+    logger.debug("Received note for campaign: %s", body.campaign_name)
+
+    def insert_note(session):
         # Verifica se a campanha existe
         campaign = session.query(Campaign).filter_by(name=body.campaign_name).first()
         if not campaign:
-            return ErrorSchema(message=f"Campanha '{body.campaign_name}' não encontrada.").model_dump(mode='json'), 404
-        
+            return None
+
         # Cria a nota
         note = Notes(
             title=body.title,
             content=body.content,
-            campaign_name=campaign.name
+            campaign_id=campaign.id
         )
-        
         session.add(note)
-        session.commit()
+        session.flush()
         session.refresh(note)
-        
+
         # Prepara a resposta incluindo o nome da campanha
         note_dict = {
             'id': note.id,
@@ -160,101 +408,578 @@ def create_note(body: NoteCreate):
             'created_at': note.created_at,
             'updated_at': note.updated_at
         }
-        
-        result = NoteResponse.model_validate(note_dict)
-        return result.model_dump(mode='json'), 201
-        
+        return campaign.id, NoteResponse.model_validate(note_dict)
+
+    try:
+        # com shards, a nota é gravada no arquivo da campanha
+        shard = shards.locate(name=body.campaign_name)
+        created = write(insert_note, shard=shard)
+        if created is None and shard is not None and _resync_campaign(body.campaign_name):
+            created = write(insert_note, shard=shard)
+    except WriteTimeoutError as e:
+        return write_timeout(e)
     except IntegrityError as e:
-        session.rollback()
-        print(f"Integrity error creating note: {e}")
+        logger.error("Integrity error creating note: %s", e)
         return ErrorSchema(message="Erro de integridade ao criar nota.").model_dump(mode='json'), 400
     except Exception as e:
-        session.rollback()
-        print(f"Unexpected error creating note: {e}")
-        traceback.print_exc()
+        logger.exception("Unexpected error creating note: %s", e)
         return ErrorSchema(message=f"Erro interno: {str(e)}").model_dump(mode='json'), 500
+
+    if created is None:
+        return ErrorSchema(message=f"Campanha '{body.campaign_name}' não encontrada.").model_dump(mode='json'), 404
+    campaign_id, result = created
+    notes_cache.invalidate(campaign_id)
+    return result.model_dump(mode='json'), 201
+
+# resultados da importação em lote ficam em memória até este tamanho e depois vão para disco
+BULK_RESULTS_SPOOL_SIZE = 1024 * 1024
+
+
+def _validate_bulk_rows(source):
+    """Valida cada objeto recebido com o schema NoteCreate"""
+    for index, obj, error in source:
+        if error is not None:
+            yield index, None, error
+            continue
+        try:
+            yield index, NoteCreate.model_validate(obj), None
+        except ValidationError as e:
+            details = '; '.join(
+                f"{'.'.join(str(loc) for loc in err['loc']) or 'nota'}: {err['msg']}" for err in e.errors()
+            )
+            yield index, None, details
+
+
+def _bulk_response_body(spool, created, failed, ndjson):
+    """Gera o corpo da resposta a partir dos resultados gravados no spool"""
+    try:
+        if ndjson:
+            for line in spool:
+                yield line
+            return
+        yield ('{"created":%d,"failed":%d,"results":[' % (created, failed)).encode('utf-8')
+        for position, line in enumerate(spool):
+            yield (b',' if position else b'') + line.rstrip(b'\n')
+        yield b']}'
     finally:
-        session.close()
+        spool.close()
+
+
+@api.post('/notes/bulk', tags=[note_tag], responses={"200": NoteBulkResponse, "400": ErrorSchema})
+def create_notes_bulk():
+    """Cria notas em lote a partir de um array JSON ou de um corpo NDJSON
+
+    O corpo é lido de forma incremental (envie Content-Type application/x-ndjson
+    para NDJSON) e as notas válidas são gravadas em lotes dentro de uma única
+    transação (uma por shard, com sharding). Cada nota recebe um resultado próprio,
+    na ordem de envio; em NDJSON a resposta também é NDJSON e os totais vão nos
+    headers X-Bulk-Created e X-Bulk-Failed.
+    """
+    ndjson = request.mimetype in NDJSON_MIMETYPES
+    source = iter_ndjson(request.stream) if ndjson else iter_json_array(request.stream)
+    spool = tempfile.SpooledTemporaryFile(max_size=BULK_RESULTS_SPOOL_SIZE)
+    created = failed = 0
 
-@app.get('/notes', tags=[note_tag], responses={"200": NotesSearchResponse, "400": ErrorSchema})
-def list_all_notes():
-    """Lista todas as notas de todas as campanhas"""
     session = Session()
+    resolver = CampaignResolver(session, router=shards)
+    # sessões de escrita dos shards que receberam notas, abertas sob demanda
+    shard_sessions = {}
+
+    def session_for(shard):
+        if shard is None:
+            return session
+        if shard not in shard_sessions:
+            shard_sessions[shard] = Session(shard=shard)
+        return shard_sessions[shard]
+
     try:
-        notes = session.query(Notes).join(Campaign).all()
-        
-        note_list = []
-        for note in notes:
-            note_dict = {
-                'id': note.id,
-                'title': note.title,
-                'content': note.content,
-                'campaign_name': note.campaign.name,
-                'created_at': note.created_at,
-                'updated_at': note.updated_at
-            }
-            note_list.append(NoteResponse.model_validate(note_dict).model_dump(mode='json'))
-        
-        response = NotesSearchResponse(
-            notes=note_list,
-            total=len(note_list),
-            campaign_name=None
-        )
-        
-        return response.model_dump(mode='json')
+        for result in ingest_notes(session, _validate_bulk_rows(source), resolver=resolver, session_for=session_for):
+            if result['status'] == 'created':
+                created += 1
+            else:
+                failed += 1
+            spool.write(json.dumps(result, ensure_ascii=False).encode('utf-8') + b'\n')
+        for shard_session in shard_sessions.values():
+            shard_session.commit()
+        session.commit()
+        for campaign_id in resolver.known.values():
+            notes_cache.invalidate(campaign_id)
+    except MalformedStreamError as e:
+        for open_session in (session, *shard_sessions.values()):
+            open_session.rollback()
+        spool.close()
+        return ErrorSchema(message=str(e)).model_dump(mode='json'), 400
+    except Exception as e:
+        for open_session in (session, *shard_sessions.values()):
+            open_session.rollback()
+        spool.close()
+        logger.exception("Unexpected error creating notes in bulk: %s", e)
+        return ErrorSchema(message=f"Erro interno: {str(e)}").model_dump(mode='json'), 500
+    finally:
+        for open_session in (session, *shard_sessions.values()):
+            open_session.close()
+
+    spool.seek(0)
+    response = Response(
+        _bulk_response_body(spool, created, failed, ndjson),
+        mimetype='application/x-ndjson' if ndjson else 'application/json'
+    )
+    response.headers['X-Bulk-Created'] = str(created)
+    response.headers['X-Bulk-Failed'] = str(failed)
+    return response
+
+@api.get('/notes', tags=[note_tag], responses={"200": NotesSearchResponse, "400": ErrorSchema})
+def list_all_notes(query: NotesQuery):
+    """Lista as notas de todas as campanhas, paginadas por cursor
+
+    Args:
+        limit: Quantidade máxima de notas por página
+        cursor: Cursor retornado em next_cursor pela página anterior
+        stream: Transmite todas as notas a partir do cursor (ou envie Accept: application/x-ndjson)
+        fields: Campos de cada nota a retornar, separados por vírgula
+        excerpt: Retorna a prévia do conteúdo com até N caracteres no lugar do conteúdo
+        ids: Busca apenas as notas com estes IDs, em uma única consulta (sem paginação)
+        from: Apenas notas criadas a partir desta data/hora (inclusive)
+        to: Apenas notas criadas antes desta data/hora (exclusive)
+    """
+    fields = note_fields(query.fields, query.excerpt)
+    # com shards, as notas de cada arquivo são intercaladas em ordem (created_at, id)
+    sources = shards.shards()
+    sessions = [ReadSession(shard=shard) for shard in sources]
+    try:
+        queries = [
+            filter_created(select_notes(session.query, fields, query.excerpt), query.from_, query.to)
+            for session in sessions
+        ]
+
+        if query.ids is not None:
+            # uma consulta IN por banco, só com os IDs ainda não encontrados
+            rows = []
+            remaining = set(query.ids)
+            for notes_query in queries:
+                if not remaining:
+                    break
+                found = notes_query.filter(Notes.id.in_(remaining)).all()
+                remaining.difference_update(row.id for row in found)
+                rows.extend(found)
+            notes, missing = _in_request_order(rows, query.ids)
+            mimetype = negotiate_mimetype()
+            response = negotiated_response(notes_page_json(notes, fields=fields, mimetype=mimetype), mimetype)
+            return _with_missing_ids(response, missing)
+
+        fmt = stream_format(query.stream)
+        if fmt:
+            statements = [
+                (partial(ReadSession, shard=shard), order_notes(notes_query, query.cursor).limit(query.limit).statement)
+                for shard, notes_query in zip(sources, queries)
+            ]
+            partitions = iter_merged_partitions(statements, note_sort_key, limit=query.limit)
+            return streaming_response(stream_notes(partitions, fmt, fields=fields), fmt)
+
+        notes, next_cursor = paginate_notes_merged(queries, query.limit or DEFAULT_PAGE_SIZE, query.cursor)
+        mimetype = negotiate_mimetype()
+        return negotiated_response(notes_page_json(notes, next_cursor=next_cursor, fields=fields, mimetype=mimetype), mimetype)
         
+    except InvalidCursorError as e:
+        return ErrorSchema(message=str(e)).model_dump(mode='json'), 400
     except Exception as e:
-        print(f"Error listing notes: {e}")
-        traceback.print_exc()
+        logger.exception("Error listing notes: %s", e)
         return ErrorSchema(message=f"Erro ao listar notas: {str(e)}").model_dump(mode='json'), 500
     finally:
-        session.close()
+        for session in sessions:
+            session.close()
+
+@api.get('/notes/search', tags=[note_tag], responses={"200": NoteSearchResponse, "400": ErrorSchema})
+def search_all_notes(query: NoteSearchQuery):
+    """Busca textual nas notas, com resultados ordenados por relevância e trechos destacados
+
+    Args:
+        q: Termos de busca no título e no conteúdo
+        campaign_name: Nome da campanha para restringir a busca (opcional)
+        limit: Quantidade máxima de resultados
+    """
+    if query.campaign_name is not None:
+        sources = [shards.locate(name=query.campaign_name)]
+    else:
+        sources = shards.shards()
+    sessions = [ReadSession(shard=shard) for shard in sources]
+    try:
+        rows = []
+        for session in sessions:
+            rows.extend(search_notes(session, query.q, campaign_name=query.campaign_name, limit=query.limit))
+        if len(sessions) > 1:
+            # bm25 é calculado por shard; a intercalação é aproximada
+            rows = sorted(rows, key=lambda row: row['rank'])[:query.limit]
+        hits = [NoteSearchHit.model_validate(dict(row)) for row in rows]
+        response = NoteSearchResponse(hits=hits, total=len(hits), q=query.q)
+        return response.model_dump(mode='json')
+    except Exception as e:
+        logger.exception("Error searching notes: %s", e)
+        return ErrorSchema(message=f"Erro ao buscar notas: {str(e)}").model_dump(mode='json'), 500
+    finally:
+        for session in sessions:
+            session.close()
+
+def _changes_reader(limit, campaign_id=None):
+    """Função de leitura do feed de alterações
+
+    Cada chamada lê até limit + 1 alterações de cada banco, em sessões
+    próprias e curtas (o long-poll e o SSE não seguram conexões enquanto
+    aguardam), e as intercala; o shard da campanha é consultado a cada vez,
+    pois ela pode ser movida enquanto o cliente acompanha o feed.
+    """
+    def read(positions):
+        if campaign_id is None:
+            sources = shards.shards()
+        else:
+            sources = [shards.locate(campaign_id=campaign_id)]
+        pages = []
+        for shard in sources:
+            session = ReadSession(shard=shard)
+            try:
+                notes_query = changed_notes(select_notes(session.query), positions.get(shard, 0), campaign_id)
+                pages.append((shard, notes_query.limit(limit + 1).all()))
+            finally:
+                session.close()
+        return merge_changes(pages, positions, limit)
+    return read
+
+
+def _encode_changes(rows, positions, has_more, mimetype=JSON_MIMETYPE):
+    cursor = encode_change_cursor(positions)
+    return cursor, note_changes_json(rows, cursor, has_more, mimetype=mimetype)
 
-@app.get('/campaigns/<string:campaign_name>/notes', tags=[note_tag], responses={"200": NotesSearchResponse, "404": ErrorSchema, "400": ErrorSchema})
-def list_notes_by_campaign(path: CampaignNamePath):
-    """Lista todas as notas de uma campanha específica pelo nome da campanha
+
+@api.get('/notes/changes', tags=[note_tag], responses={"200": NoteChangesResponse, "400": ErrorSchema, "404": ErrorSchema})
+def list_note_changes(query: NoteChangesQuery):
+    """Feed das notas criadas ou alteradas desde o cursor
+
+    Cada nota aparece uma única vez, no estado atual. Sem alterações, responde
+    na hora ou aguarda até wait segundos pela próxima (long-poll). Com
+    Accept: text/event-stream transmite as alterações como Server-Sent Events,
+    retomando a partir do header Last-Event-ID ao reconectar.
+
+    Args:
+        since: Cursor retornado em cursor pela resposta anterior
+        campaign_name: Nome da campanha para restringir o feed (opcional)
+        limit: Quantidade máxima de notas por resposta (ou evento)
+        wait: Segundos a aguardar por alterações (long-poll)
+    """
+    try:
+        positions = decode_change_cursor(request.headers.get('Last-Event-ID') or query.since)
+
+        campaign_id = None
+        if query.campaign_name is not None:
+            session = ReadSession()
+            try:
+                campaign = session.query(Campaign.id).filter(
+                    Campaign.name == query.campaign_name
+                ).order_by(Campaign.id).first()
+            finally:
+                session.close()
+            if not campaign:
+                return ErrorSchema(message=f"Campanha '{query.campaign_name}' não encontrada.").model_dump(mode='json'), 404
+            campaign_id = campaign.id
+
+        read = _changes_reader(query.limit, campaign_id)
+        if request.accept_mimetypes.best_match((JSON_MIMETYPE, SSE_MIMETYPE)) == SSE_MIMETYPE:
+            return sse_response(iter_sse(read, positions, change_notifier, _encode_changes))
+
+        rows, positions, has_more = wait_for_changes(read, positions, query.wait, change_notifier)
+        mimetype = negotiate_mimetype()
+        _, body = _encode_changes(rows, positions, has_more, mimetype)
+        response = negotiated_response(body, mimetype)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    except InvalidCursorError as e:
+        return ErrorSchema(message=str(e)).model_dump(mode='json'), 400
+    except Exception as e:
+        logger.exception("Error reading note changes: %s", e)
+        return ErrorSchema(message=f"Erro ao ler alterações das notas: {str(e)}").model_dump(mode='json'), 500
+
+def _notes_last_modified(campaign):
+    """Data da última alteração nas notas da campanha (ou de sua criação)"""
+    if campaign.changed_at is not None:
+        return datetime.fromtimestamp(campaign.changed_at, timezone.utc)
+    return campaign.created_at.replace(tzinfo=timezone.utc)
+
+
+def _with_validators(response, etag, last_modified):
+    """Adiciona ETag e Last-Modified à resposta"""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response
+
+
+@api.get('/campaigns/<string:campaign_name>/notes', tags=[note_tag], responses={"200": NotesSearchResponse, "404": ErrorSchema, "400": ErrorSchema})
+def list_notes_by_campaign(path: CampaignNamePath, query: NotesQuery):
+    """Lista as notas de uma campanha específica pelo nome da campanha, paginadas por cursor
     
     Args:
         campaign_name: Nome da campanha para buscar as notas
+        limit: Quantidade máxima de notas por página
+        cursor: Cursor retornado em next_cursor pela página anterior
+        stream: Transmite todas as notas a partir do cursor (ou envie Accept: application/x-ndjson)
+        fields: Campos de cada nota a retornar, separados por vírgula
+        excerpt: Retorna a prévia do conteúdo com até N caracteres no lugar do conteúdo
+        from: Apenas notas criadas a partir desta data/hora (inclusive)
+        to: Apenas notas criadas antes desta data/hora (exclusive)
     """
     # Decodifica o nome da campanha da URL
     campaign_name = unquote(path.campaign_name)
-    
-    session = Session()
+
+    # com shards, a campanha e suas notas são lidas do arquivo dela
+    shard = shards.locate(name=campaign_name)
+    session = ReadSession(shard=shard)
     try:
-        # Verifica se a campanha existe
-        campaign = session.query(Campaign).filter_by(name=campaign_name).first()
+        # Verifica se a campanha existe e obtém a versão atual de suas notas
+        campaign = session.query(
+            Campaign.id, Campaign.created_at, CampaignNoteVersion.version, CampaignNoteVersion.changed_at
+        ).outerjoin(
+            CampaignNoteVersion, CampaignNoteVersion.campaign_id == Campaign.id
+        ).filter(Campaign.name == campaign_name).order_by(Campaign.id).first()
         if not campaign:
             return ErrorSchema(message=f"Campanha '{campaign_name}' não encontrada.").model_dump(mode='json'), 404
-        
-        # Busca todas as notas da campanha
-        notes = session.query(Notes).filter_by(campaign_name=campaign_name).all()
-        
-        # Converte as notas usando o método similar ao list_all_notes
-        note_list = []
-        for note in notes:
-            note_dict = {
-                'id': note.id,
-                'title': note.title,
-                'content': note.content,
-                'campaign_name': note.campaign_name,
-                'created_at': note.created_at,
-                'updated_at': note.updated_at
-            }
-            note_list.append(NoteResponse.model_validate(note_dict).model_dump(mode='json'))
-        
-        response = NotesSearchResponse(
-            notes=note_list,
-            total=len(note_list),
-            campaign_name=campaign_name
+
+        version = campaign.version or 0
+        last_modified = _notes_last_modified(campaign)
+        fmt = stream_format(query.stream)
+        fields = note_fields(query.fields, query.excerpt)
+        mimetype = negotiate_mimetype()
+        etag = make_etag(
+            campaign.id, campaign_name, version, campaign.changed_at, query.limit, query.cursor, fmt, fields, query.excerpt,
+            mimetype, query.from_, query.to
         )
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            return _with_validators(Response(status=304), etag, last_modified)
+
+        notes_query = filter_created(
+            select_notes(session.query, fields, query.excerpt).filter(Notes.campaign_id == campaign.id),
+            query.from_, query.to
+        )
+
+        if fmt:
+            statement = order_notes(notes_query, query.cursor).limit(query.limit).statement
+            partitions = iter_partitions(partial(ReadSession, shard=shard), statement)
+            body = stream_notes(partitions, fmt, campaign_name=campaign_name, fields=fields)
+            return _with_validators(streaming_response(body, fmt), etag, last_modified)
+
+        # Reaproveita a página serializada se as notas da campanha não mudaram
+        cache_key = (query.limit, query.cursor, fields, query.excerpt, mimetype, query.from_, query.to)
+        body = notes_cache.get(campaign.id, cache_key, version)
+        cache_status = 'HIT'
+        if body is None:
+            cache_status = 'MISS'
+            notes, next_cursor = paginate_notes(notes_query, query.limit or DEFAULT_PAGE_SIZE, query.cursor)
+            body = notes_page_json(
+                notes, campaign_name=campaign_name, next_cursor=next_cursor, fields=fields, mimetype=mimetype
+            )
+            notes_cache.put(campaign.id, cache_key, version, body)
+
+        response = _with_validators(negotiated_response(body, mimetype), etag, last_modified)
+        response.headers['X-Cache'] = cache_status
+        return response
         
-        return response.model_dump(mode='json')
-        
+    except InvalidCursorError as e:
+        return ErrorSchema(message=str(e)).model_dump(mode='json'), 400
     except Exception as e:
-        print(f"Error listing notes for campaign '{campaign_name}': {e}")
-        traceback.print_exc()
+        logger.exception("Error listing notes for campaign '%s': %s", campaign_name, e)
         return ErrorSchema(message=f"Erro ao listar notas da campanha: {str(e)}").model_dump(mode='json'), 500
     finally:
         session.close()
 
+
+# --- LOTE ---
+
+@api.post('/batch', tags=[batch_tag], responses={"200": BatchResponse})
+def run_batch_requests(body: BatchRequest):
+    """Executa várias requisições da API em uma única chamada HTTP
+
+    As requisições são despachadas em ordem para os handlers das rotas
+    correspondentes e cada uma recebe seu próprio status, headers e corpo;
+    uma falha (ex.: 404) não interrompe as demais. As leituras compartilham
+    uma sessão por banco e, até a primeira escrita do lote, o mesmo snapshot.
+    """
+    results = run_batch(current_app._get_current_object(), body.requests, request, request_id=g.get('rpg_request_id'))
+    return BatchResponse(responses=results).model_dump(mode='json')
+
+
+# --- DIAGNÓSTICO ---
+
+@api.get('/cache', tags=[diagnostic_tag])
+def cache_stats():
+    """Estatísticas do cache de listagens de notas por campanha: ocupação, hits e misses"""
+    return notes_cache.stats()
+
+
+@api.get('/metrics', tags=[diagnostic_tag])
+def metrics():
+    """Métricas por rota no formato de texto do Prometheus: tempo total, SQL e serialização"""
+    return metrics_response()
+
+
+# --- COMANDOS DE MANUTENÇÃO ---
+
+@api.cli.command('init-db')
+def init_db_command():
+    """Cria ou atualiza tabelas, índices e triggers do banco principal e dos shards"""
+    databases = migrate_schemas(shards)
+    click.echo(f"Esquema criado ou atualizado ({databases} banco(s)).")
+
+
+def _migrate_campaign_fk(batch_size, drop_orphans):
+    """Converte notes.campaign_name em notes.campaign_id no banco principal, se ainda preciso
+
+    Returns:
+        True se a migração foi feita, False se o banco já utilizava notes.campaign_id
+    """
+    engine = shards.directory.engine
+    if not needs_campaign_fk_migration(engine):
+        return False
+    try:
+        dropped = migrate_campaign_fk(
+            engine, batch_size=batch_size, drop_orphans=drop_orphans,
+            progress=lambda copied: click.echo(f"{copied} notas copiadas"),
+        )
+    except MigrationError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"notes.campaign_id migrado ({dropped} notas órfãs descartadas).")
+    return True
+
+
+@api.cli.command('migrate')
+@click.option('--batch-size', default=MIGRATION_BATCH_SIZE, show_default=True, help='Notas copiadas por transação')
+@click.option('--drop-orphans', is_flag=True, help='Descarta notas de campanhas inexistentes')
+def migrate_command(batch_size, drop_orphans):
+    """Aplica as migrações pendentes (dados e esquema) ao banco existente"""
+    _migrate_campaign_fk(batch_size, drop_orphans)
+    databases = migrate_schemas(shards)
+    click.echo(f"Migração concluída ({databases} banco(s)).")
+
+
+@api.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Reconstrói o índice de busca textual a partir das notas existentes"""
+    for database in shards.databases():
+        rebuild_search_index(database.engine)
+    click.echo("Índice de busca reconstruído.")
+
+
+@api.cli.command('check-campaign-stats')
+@click.option('--rebuild', is_flag=True, help='Recalcula a tabela a partir das notas antes de verificar')
+def check_campaign_stats_command(rebuild):
+    """Verifica campaign_stats contra as notas (e a reconstrói com --rebuild)"""
+    mismatches = []
+    for database in shards.databases():
+        if rebuild:
+            rebuild_campaign_stats(database.engine)
+        mismatches.extend(check_campaign_stats(database.engine))
+    if rebuild:
+        click.echo("Estatísticas das campanhas reconstruídas.")
+    for row in mismatches:
+        click.echo(f"campanha {row['campaign_id']}: {row['actual_count']} notas / {row['actual_bytes']} bytes, "
+                   f"esperado {row['expected_count']} notas / {row['expected_bytes']} bytes")
+    if mismatches:
+        raise click.ClickException(f"{len(mismatches)} campanha(s) divergente(s); execute com --rebuild")
+    click.echo("Estatísticas das campanhas conferem.")
+
+
+@api.cli.command('recompress-notes')
+@click.option('--batch-size', default=MIGRATION_BATCH_SIZE, show_default=True, help='Notas lidas por transação')
+def recompress_notes_command(batch_size):
+    """Regrava o conteúdo das notas conforme a compressão configurada (RPG_DB_CONTENT_COMPRESSION)"""
+    click.echo(f"Compressão: {compression_settings.codec}, a partir de {compression_settings.min_bytes} bytes")
+    changed = 0
+    for database in shards.databases():
+        changed += recompress_notes(
+            database.engine, batch_size=batch_size,
+            progress=lambda seen, changed: click.echo(f"{seen} notas percorridas, {changed} regravadas"),
+        )
+    click.echo(f"Recompressão concluída ({changed} notas regravadas).")
+
+
+@api.cli.command('migrate-campaign-fk')
+@click.option('--batch-size', default=MIGRATION_BATCH_SIZE, show_default=True, help='Notas copiadas por transação')
+@click.option('--drop-orphans', is_flag=True, help='Descarta notas de campanhas inexistentes')
+def migrate_campaign_fk_command(batch_size, drop_orphans):
+    """Converte notes.campaign_name em notes.campaign_id sem parar a aplicação"""
+    if not _migrate_campaign_fk(batch_size, drop_orphans):
+        click.echo("Banco já utiliza notes.campaign_id.")
+
+
+@api.cli.command('shard-notes')
+@click.option('--batch-size', default=MIGRATION_BATCH_SIZE, show_default=True, help='Notas movidas por transação')
+def shard_notes_command(batch_size):
+    """Move as notas do banco principal para os shards das campanhas (RPG_DB_SHARDS)"""
+    try:
+        campaigns, moved = migrate_to_shards(
+            shards, batch_size=batch_size,
+            progress=lambda campaign_id, moved: click.echo(f"campanha {campaign_id}: {moved} notas movidas"),
+        )
+    except MigrationError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Distribuição concluída ({campaigns} campanhas, {moved} notas movidas).")
+
+
+@api.cli.command('move-campaign')
+@click.argument('campaign_id', type=int)
+@click.argument('shard', type=int)
+@click.option('--batch-size', default=MIGRATION_BATCH_SIZE, show_default=True, help='Notas movidas por transação')
+def move_campaign_command(campaign_id, shard, batch_size):
+    """Move as notas de uma campanha para outro shard (rebalanceamento)"""
+    try:
+        moved = move_campaign(
+            shards, campaign_id, shard, batch_size=batch_size,
+            progress=lambda campaign_id, moved: click.echo(f"{moved} notas movidas"),
+        )
+    except MigrationError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Campanha {campaign_id} no shard {shard} ({moved} notas movidas).")
+
+
+# --- APLICAÇÃO ---
+
+def create_app():
+    """Cria a aplicação Flask com as rotas, hooks e comandos
+
+    Não abre o banco: cada processo (inclusive os workers do gunicorn, depois
+    do fork) abre as engines na primeira requisição, ver model/__init__.py.
+    """
+    app = OpenAPI(__name__, info=info)
+    CORS(app)
+
+    # correlaciona os logs de cada requisição pelo header X-Request-ID
+    init_request_logging(app)
+
+    # tempo por rota, SQL e serialização (header Server-Timing e GET /metrics);
+    # os bancos são abertos sob demanda, depois da inicialização
+    init_metrics(app)
+    shards.add_listener(_instrument_database)
+
+    # com RPG_ADMISSION=1, limita a concorrência por rota e a taxa por cliente,
+    # recusando com 429/503 em vez de enfileirar no lock do SQLite
+    init_admission(app, admission, exempt=ADMISSION_EXEMPT)
+
+    # gzip para clientes que enviam Accept-Encoding: gzip, inclusive em streaming
+    init_compression(app)
+
+    app.register_error_handler(500, internal_error)
+    app.register_api(api)
+
+    if _spec_cached:
+        app.spec_json = openapi_cache.load(_spec_path) or {}
+        if not app.spec_json:
+            logger.warning("Cache da especificação OpenAPI ilegível: %s", _spec_path)
+    elif _spec_path is not None:
+        openapi_cache.store(_spec_path, app.api_doc)
+    return app
+
+
+def __getattr__(name):
+    """app padrão do módulo (gunicorn app:app, flask run), criada no primeiro acesso"""
+    global app
+    if name == 'app':
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,240 @@
+"""Exportação e importação de campanhas em arquivos NDJSON comprimidos com gzip
+
+Cada linha do arquivo é um registro (ver schemas/archive.py):
+
+    {"type":"campaign", ...}    cabeçalho: formato, export_id e a campanha
+    {"type":"note", ...}        uma linha por nota, em ordem (created_at, id)
+    {"type":"end","notes":N}    fim do arquivo
+
+A exportação lê as notas em lotes (yield_per) e comprime à medida que envia,
+com memória constante. A importação lê o corpo da requisição linha a linha e
+grava as notas em transações de IMPORT_CHUNK_SIZE notas; cada transação
+avança o ponto de retomada da campanha (model/archive.py), de modo que
+reenviar o mesmo arquivo depois de uma falha continua de onde parou.
+"""
+import gzip
+import os
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import List
+
+from flask import Response
+from pydantic import TypeAdapter, ValidationError
+
+from model import Campaign, Notes, ReadSession, shards, write
+from model.archive import IMPORT_CHUNK_SIZE, import_checkpoint, write_import_chunk
+from response_compression import iter_gzip
+from schemas.archive import (
+    ARCHIVE_FORMAT, ArchiveCampaign, ArchiveEnd, ArchiveHeader, ArchiveNote, ArchiveRecord, CampaignImportResponse
+)
+from streaming import iter_ndjson
+
+
+ARCHIVE_MIMETYPE = 'application/gzip'
+ARCHIVE_MIMETYPES = (ARCHIVE_MIMETYPE, 'application/x-gzip')
+# nível do gzip dos arquivos exportados; o nível 6 reduz o arquivo em ~20% a
+# mais que o 1, mas exporta com menos da metade da vazão (benchmarks/archive.py)
+EXPORT_GZIP_LEVEL = int(os.environ.get('RPG_EXPORT_GZIP_LEVEL', 1))
+
+_header_adapter = TypeAdapter(ArchiveHeader)
+_note_adapter = TypeAdapter(ArchiveNote)
+_notes_adapter = TypeAdapter(List[ArchiveNote])
+_end_adapter = TypeAdapter(ArchiveEnd)
+_record_adapter = TypeAdapter(ArchiveRecord)
+
+
+class ArchiveError(ValueError):
+    """Arquivo de importação inválido, incompleto ou fora de ordem"""
+
+
+class ArchiveConflictError(ArchiveError):
+    """A campanha de destino já tem notas que não vieram desta exportação"""
+
+
+def iter_export(campaign, partitions, level=EXPORT_GZIP_LEVEL):
+    """Gera o arquivo comprimido de uma campanha
+
+    Args:
+        campaign: linha com name, description e created_at
+        partitions: lotes de linhas de export_statement, ver streaming.iter_partitions
+    """
+    header = ArchiveHeader(
+        export_id=uuid.uuid4().hex,
+        exported_at=datetime.now(timezone.utc),
+        campaign=ArchiveCampaign.model_validate(campaign, from_attributes=True),
+    )
+
+    def lines():
+        yield _header_adapter.dump_json(header) + b'\n'
+        count = 0
+        for rows in partitions:
+            notes = _notes_adapter.validate_python(rows, from_attributes=True)
+            count += len(notes)
+            yield b''.join(_note_adapter.dump_json(note) + b'\n' for note in notes)
+        yield _end_adapter.dump_json(ArchiveEnd(notes=count)) + b'\n'
+
+    return iter_gzip(lines(), level)
+
+
+def export_response(campaign, partitions):
+    """Resposta em streaming com o arquivo da campanha, para download"""
+    response = Response(iter_export(campaign, partitions), mimetype=ARCHIVE_MIMETYPE)
+    response.headers['Content-Disposition'] = f'attachment; filename="campaign-{campaign.id}.ndjson.gz"'
+    return response
+
+
+def iter_archive(stream, compressed=True):
+    """Percorre os registros de um arquivo de exportação sem carregá-lo na memória
+
+    Yields:
+        Tuplas (número da linha, registro validado)
+
+    Raises:
+        ArchiveError: linha inválida ou gzip corrompido/truncado
+    """
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    try:
+        for index, obj, error in iter_ndjson(stream):
+            if error is not None:
+                raise ArchiveError(f"Linha {index + 1}: {error}")
+            try:
+                yield index + 1, _record_adapter.validate_python(obj)
+            except ValidationError as e:
+                raise ArchiveError(f"Linha {index + 1}: registro inválido: {e.errors(include_url=False)}")
+    except (OSError, EOFError, zlib.error) as e:
+        raise ArchiveError(f"Arquivo gzip inválido ou truncado: {e}") from e
+
+
+def _target_campaign(name, campaign):
+    """Campanha de destino pelo nome, criada com os dados do arquivo se ainda não existir
+
+    Returns:
+        Tupla (id da campanha, shard)
+    """
+    session = ReadSession()
+    try:
+        existing = session.query(Campaign.id).filter(Campaign.name == name).order_by(Campaign.id).first()
+    finally:
+        session.close()
+    if existing:
+        return existing.id, shards.locate(campaign_id=existing.id)
+
+    def insert_campaign(session):
+        row = Campaign(name=name, description=campaign.description)
+        row.created_at = campaign.created_at
+        session.add(row)
+        session.flush()
+        shards.register(session, row.id)
+        session.flush()
+        shards.sync_campaign(row.id, session=session)
+        return row.id
+
+    campaign_id = write(insert_campaign)
+    return campaign_id, shards.locate(campaign_id=campaign_id)
+
+
+def import_archive(records, name=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Importa um arquivo de exportação, retomando uma importação anterior do mesmo arquivo
+
+    A campanha é criada (com name, ou o nome gravado no arquivo) se não
+    existir. Uma campanha existente só recebe as notas se estiver vazia ou
+    se a importação anterior for deste mesmo export_id; as notas já gravadas
+    por ela são puladas.
+
+    Args:
+        records: resultado de iter_archive
+
+    Returns:
+        CampaignImportResponse
+
+    Raises:
+        ArchiveConflictError: a campanha tem notas de outra origem
+        ArchiveError: arquivo inválido; os lotes gravados até o erro são
+            mantidos e a importação pode ser retomada
+    """
+    line, header = next(records, (1, None))
+    if not isinstance(header, ArchiveHeader):
+        raise ArchiveError("O arquivo deve começar pelo registro da campanha (type 'campaign').")
+    if header.format != ARCHIVE_FORMAT:
+        raise ArchiveError(f"Formato de arquivo {header.format} não suportado (esperado {ARCHIVE_FORMAT}).")
+
+    campaign_name = name or header.campaign.name
+    campaign_id, shard = _target_campaign(campaign_name, header.campaign)
+
+    session = ReadSession(shard=shard)
+    try:
+        checkpoint = import_checkpoint(session, campaign_id)
+        has_notes = session.query(Notes.id).filter(Notes.campaign_id == campaign_id).first() is not None
+    finally:
+        session.close()
+    if checkpoint is not None and checkpoint.export_id != header.export_id:
+        raise ArchiveConflictError(
+            f"A campanha '{campaign_name}' recebeu outra importação; use name= para importar em uma nova campanha."
+        )
+    if checkpoint is None and has_notes:
+        raise ArchiveConflictError(
+            f"A campanha '{campaign_name}' já tem notas; use name= para importar em uma nova campanha."
+        )
+
+    resume = checkpoint.last_key if checkpoint is not None else None
+    total = checkpoint.imported if checkpoint is not None else 0
+    result = CampaignImportResponse(
+        campaign_id=campaign_id, campaign_name=campaign_name, export_id=header.export_id,
+        imported=0, skipped=0, total=total, completed=checkpoint is not None and checkpoint.completed_at is not None,
+    )
+    if result.completed:
+        result.skipped = total
+        return result
+
+    def flush(chunk, completed_at=None):
+        write(lambda session: write_import_chunk(session, campaign_id, header.export_id, chunk, completed_at),
+              shard=shard)
+        result.imported += len(chunk)
+        result.total += len(chunk)
+
+    chunk = []
+    seen = 0
+    previous = None
+    end = None
+    try:
+        for line, record in records:
+            if end is not None:
+                raise ArchiveError(f"Linha {line}: conteúdo após o registro de fim.")
+            if isinstance(record, ArchiveEnd):
+                end = record
+                continue
+            if isinstance(record, ArchiveHeader):
+                raise ArchiveError(f"Linha {line}: registro de campanha repetido.")
+            key = (record.created_at, record.id)
+            if previous is not None and key <= previous:
+                raise ArchiveError(f"Linha {line}: notas fora da ordem (created_at, id).")
+            previous = key
+            seen += 1
+            if resume is not None and key <= resume:
+                result.skipped += 1
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+    except ArchiveError as e:
+        # o que foi lido até o erro é gravado, para a retomada não repetir o trabalho
+        flush(chunk)
+        raise ArchiveError(
+            f"{str(e).rstrip('.')}. {result.total} notas gravadas; reenvie o arquivo para retomar."
+        ) from e
+
+    if end is None:
+        flush(chunk)
+        raise ArchiveError(
+            f"Arquivo incompleto (sem o registro de fim). {result.total} notas gravadas; "
+            "reenvie o arquivo para retomar."
+        )
+    if end.notes != seen:
+        flush(chunk)
+        raise ArchiveError(f"O arquivo declara {end.notes} notas, mas contém {seen}.")
+    flush(chunk, completed_at=datetime.now(timezone.utc))
+    result.completed = True
+    return result
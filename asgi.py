@@ -0,0 +1,465 @@
+# Ponto de entrada ASGI da API: uvicorn asgi:app
+#
+# As leituras mais frequentes (listagens de campanhas e de notas) e o feed de
+# alterações são atendidos por rotas assíncronas, com AsyncSession sobre
+# aiosqlite: enquanto aguardam o banco ou novas alterações (long-poll e SSE),
+# as requisições não ocupam threads. As demais rotas, as escritas e as
+# listagens em streaming são repassadas à aplicação Flask de app.py, com as
+# mesmas validações e respostas. As rotas assíncronas passam pelo mesmo
+# controle de admissão e entram nas mesmas métricas que as rotas Flask
+# equivalentes. O modo WSGI (gunicorn app:app) continua disponível. Requer
+# starlette, aiosqlite, uvicorn e a2wsgi.
+import asyncio
+import gzip
+import os
+import uuid
+from contextlib import asynccontextmanager
+from functools import wraps
+from time import perf_counter
+from typing import get_args, get_origin
+from urllib.parse import unquote
+
+from a2wsgi import WSGIMiddleware
+from pydantic import ValidationError
+from sqlalchemy import select
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import http_date, parse_accept_header, quote_etag
+from werkzeug.sansio.http import is_resource_modified
+
+from admission import CLIENT_HEADER, Rejected
+from app import create_app, admission, ADMISSION_EXEMPT, _campaigns_query, _with_shard_stats, _in_request_order, _with_missing_ids
+from app import _notes_last_modified, _encode_changes
+from cache import notes_cache, make_etag
+from change_feed import wait_for_changes_async, aiter_sse, SSE_MIMETYPE
+from logger import logger, request_id_var
+from metrics import (
+    METRICS_ENABLED, RequestMetrics, MeteredASGIResponse, _current as _current_metrics, instrument_engine, observe,
+    server_timing,
+)
+from model import Campaign, CampaignNoteVersion, Notes, shards, change_notifier
+from model.async_session import AsyncReadSession
+from model.changes import changed_notes, merge_changes, decode_change_cursor
+from model.pagination import order_notes, merge_pages, filter_created, InvalidCursorError, DEFAULT_PAGE_SIZE
+from response_compression import GZIP_ENABLED, GZIP_LEVEL, GZIP_MIN_BYTES
+from schemas.campaign import CampaignListQuery, CampaignIncludeQuery, CampaignPath
+from schemas.erro import ErrorSchema
+from schemas.note import NotesQuery, NoteChangesQuery, CampaignNamePath
+from serialization import (
+    note_fields, select_notes, notes_page_json, campaigns_json, campaign_json, negotiate_mimetype, JSON_MIMETYPE
+)
+from streaming import stream_format
+
+
+# threads que executam as rotas repassadas à aplicação Flask
+ASGI_WSGI_THREADS = int(os.environ.get('RPG_ASGI_WSGI_THREADS', 16))
+
+flask_app = create_app()
+wsgi = WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+
+# regra de cada endpoint Flask, usada como rótulo nas métricas das rotas
+# assíncronas equivalentes para que os dois modos formem as mesmas séries
+_RULES = {rule.endpoint: rule.rule for rule in flask_app.url_map.iter_rules()}
+
+# o SQL das rotas assíncronas conta nas métricas da requisição, como nas síncronas
+AsyncReadSession.add_listener(lambda engine: instrument_engine(engine.sync_engine))
+
+
+def _is_list(annotation):
+    if get_origin(annotation) is list:
+        return True
+    return any(_is_list(arg) for arg in get_args(annotation))
+
+
+def _query(model, request):
+    """Valida os parâmetros de query com o mesmo schema Pydantic da rota Flask"""
+    data = {}
+    for name, field in model.model_fields.items():
+        # from= chega no campo from_
+        key = field.alias or name
+        values = request.query_params.getlist(key)
+        if values:
+            data[key] = values if _is_list(field.annotation) else values[0]
+    return model.model_validate(data)
+
+
+def _accept(request):
+    return parse_accept_header(request.headers.get('accept'), MIMEAccept)
+
+
+def _error(message, status):
+    return JSONResponse(ErrorSchema(message=message).model_dump(mode='json'), status)
+
+
+def _accepts_gzip(request):
+    return GZIP_ENABLED and parse_accept_header(request.headers.get('accept-encoding'))['gzip'] > 0
+
+
+def _respond(request, body, mimetype=JSON_MIMETYPE, etag=None, last_modified=None):
+    """Resposta de um corpo já serializado, com gzip e validadores como em app.py"""
+    gzip_accepted = _accepts_gzip(request)
+    if gzip_accepted and len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body, GZIP_LEVEL, mtime=0)
+        headers = {'Content-Encoding': 'gzip'}
+    else:
+        headers = {}
+    # fraco para quem aceita gzip, mesmo sem comprimir, como no 304
+    headers.update(_validators(etag, last_modified, weak=gzip_accepted))
+    return Response(body, headers=headers, media_type=mimetype)
+
+
+def _not_modified(request, etag, last_modified):
+    return Response(status_code=304, headers=_validators(etag, last_modified, weak=_accepts_gzip(request)))
+
+
+def _validators(etag, last_modified, weak=False):
+    headers = {'Vary': 'Accept, Accept-Encoding' if GZIP_ENABLED else 'Accept'}
+    if etag is not None:
+        headers['ETag'] = quote_etag(etag, weak)
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def _client_key(request):
+    """Cliente do token bucket, como em admission._client_key"""
+    if CLIENT_HEADER:
+        value = request.headers.get(CLIENT_HEADER)
+        if value:
+            return value
+    return request.client.host if request.client else '-'
+
+
+def _after_sent(response, callback):
+    """Resposta ASGI que chama callback ao terminar de ser enviada, ou ao ser interrompida"""
+    async def send_response(scope, receive, send):
+        try:
+            await response(scope, receive, send)
+        finally:
+            callback()
+    return send_response
+
+
+def native(handler):
+    """Rota assíncrona: id da requisição nos logs e na resposta, CORS, 422 para
+    query inválida, controle de admissão e métricas
+
+    A admissão usa o mesmo AdmissionControl, limitador e isenções da rota
+    Flask de mesmo nome, e as métricas o rótulo dela. Um handler que devolve
+    wsgi repassa a requisição à aplicação Flask, que cuida desses mesmos
+    detalhes: a vaga é liberada antes do repasse e nada é medido aqui.
+    """
+    name = handler.__name__
+    rule = _RULES[f'rpg.{name}']
+    exempt = f'rpg.{name}' in ADMISSION_EXEMPT
+
+    async def run(request, waited=0.0):
+        request_id = request.headers.get('x-request-id') or uuid.uuid4().hex
+        request_metrics = RequestMetrics() if METRICS_ENABLED else None
+        token = request_id_var.set(request_id)
+        metrics_token = _current_metrics.set(request_metrics)
+        try:
+            response = await handler(request)
+        except ValidationError as e:
+            response = Response(e.json(), 422, media_type=JSON_MIMETYPE)
+        finally:
+            _current_metrics.reset(metrics_token)
+            request_id_var.reset(token)
+        if not isinstance(response, Response):
+            return response
+
+        response.headers['X-Request-ID'] = request_id
+        if 'origin' in request.headers:
+            response.headers['Access-Control-Allow-Origin'] = '*'
+        timing = [f'queue;dur={waited * 1000:.2f}'] if waited else []
+        if request_metrics is not None:
+            # em streaming o header cobre só o trabalho feito antes do corpo
+            timing.append(server_timing(request_metrics, perf_counter() - request_metrics.start))
+        if timing:
+            response.headers['Server-Timing'] = ', '.join(timing)
+        if request_metrics is None:
+            return response
+        labels = (request.method, rule, str(response.status_code))
+        if isinstance(response, StreamingResponse):
+            return MeteredASGIResponse(response, request_metrics, labels)
+        observe(labels, request_metrics)
+        return response
+
+    @wraps(handler)
+    async def endpoint(request):
+        if admission is None or exempt:
+            return await run(request)
+        try:
+            limiter, waited = await admission.admit_async(name, _client_key(request))
+        except Rejected as e:
+            response = _error(e.message, e.status)
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        start = perf_counter()
+
+        def release():
+            admission.release(limiter, perf_counter() - start)
+
+        try:
+            response = await run(request, waited)
+        except BaseException:
+            release()
+            raise
+        if response is wsgi:
+            release()
+            return response
+        return _after_sent(response, release)
+    return endpoint
+
+
+async def _locate(name=None, campaign_id=None):
+    """Como shards.locate, consultando o banco principal pela sessão assíncrona"""
+    if not shards.enabled:
+        return None
+    session = AsyncReadSession()
+    try:
+        return await session.scalar(shards.locate_statement(name, campaign_id))
+    finally:
+        await session.close()
+
+
+@native
+async def list_campaigns(request):
+    query = _query(CampaignListQuery, request)
+    accept = _accept(request)
+    if query.ids is None and stream_format(query.stream, accept):
+        return wsgi
+
+    stats = query.include == 'stats'
+    session = AsyncReadSession()
+    try:
+        statement = _campaigns_query(select, query.include)
+        missing = None
+        if query.ids is not None:
+            rows = (await session.execute(statement.where(Campaign.id.in_(query.ids)))).all()
+            campaigns, missing = _in_request_order(rows, query.ids)
+        else:
+            campaigns = (await session.execute(statement)).all()
+        if stats and shards.enabled:
+            campaigns = await run_in_threadpool(_with_shard_stats, campaigns, query.include)
+        mimetype = negotiate_mimetype(accept)
+        response = _respond(request, campaigns_json(campaigns, stats=stats, mimetype=mimetype), mimetype)
+        return _with_missing_ids(response, missing)
+    except Exception as e:
+        logger.exception("Error listing campaigns: %s", e)
+        return _error(f"Erro ao listar campanhas: {str(e)}", 500)
+    finally:
+        await session.close()
+
+
+@native
+async def get_campaign(request):
+    path = CampaignPath.model_validate(request.path_params)
+    query = _query(CampaignIncludeQuery, request)
+    session = AsyncReadSession()
+    try:
+        statement = _campaigns_query(select, query.include).where(Campaign.id == path.campaign_id)
+        campaign = (await session.execute(statement)).first()
+        if not campaign:
+            return _error("Campanha não encontrada.", 404)
+        if query.include == 'stats' and shards.enabled:
+            campaign = (await run_in_threadpool(_with_shard_stats, [campaign], query.include))[0]
+        mimetype = negotiate_mimetype(_accept(request))
+        return _respond(request, campaign_json(campaign, stats=query.include == 'stats', mimetype=mimetype), mimetype)
+    except Exception as e:
+        logger.exception("Error getting campaign: %s", e)
+        return _error(f"Erro ao buscar campanha: {str(e)}", 500)
+    finally:
+        await session.close()
+
+
+@native
+async def list_all_notes(request):
+    query = _query(NotesQuery, request)
+    accept = _accept(request)
+    if query.ids is None and stream_format(query.stream, accept):
+        return wsgi
+
+    fields = note_fields(query.fields, query.excerpt)
+    # com shards, cada arquivo é consultado em paralelo, na sua própria conexão
+    sessions = [AsyncReadSession(shard=shard) for shard in shards.shards()]
+    try:
+        statement = filter_created(select_notes(select, fields, query.excerpt), query.from_, query.to)
+        mimetype = negotiate_mimetype(accept)
+
+        if query.ids is not None:
+            rows = []
+            remaining = set(query.ids)
+            for session in sessions:
+                if not remaining:
+                    break
+                found = (await session.execute(statement.where(Notes.id.in_(remaining)))).all()
+                remaining.difference_update(row.id for row in found)
+                rows.extend(found)
+            notes, missing = _in_request_order(rows, query.ids)
+            response = _respond(request, notes_page_json(notes, fields=fields, mimetype=mimetype), mimetype)
+            return _with_missing_ids(response, missing)
+
+        limit = query.limit or DEFAULT_PAGE_SIZE
+        page_statement = order_notes(statement, query.cursor).limit(limit + 1)
+        results = await asyncio.gather(*(session.execute(page_statement) for session in sessions))
+        notes, next_cursor = merge_pages([result.all() for result in results], limit)
+        return _respond(request, notes_page_json(notes, next_cursor=next_cursor, fields=fields, mimetype=mimetype), mimetype)
+
+    except InvalidCursorError as e:
+        return _error(str(e), 400)
+    except Exception as e:
+        logger.exception("Error listing notes: %s", e)
+        return _error(f"Erro ao listar notas: {str(e)}", 500)
+    finally:
+        for session in sessions:
+            await session.close()
+
+
+@native
+async def list_notes_by_campaign(request):
+    path = CampaignNamePath.model_validate(request.path_params)
+    query = _query(NotesQuery, request)
+    accept = _accept(request)
+    if stream_format(query.stream, accept):
+        return wsgi
+
+    campaign_name = unquote(path.campaign_name)
+    shard = await _locate(name=campaign_name)
+    session = AsyncReadSession(shard=shard)
+    try:
+        campaign = (await session.execute(
+            select(Campaign.id, Campaign.created_at, CampaignNoteVersion.version, CampaignNoteVersion.changed_at)
+            .outerjoin(CampaignNoteVersion, CampaignNoteVersion.campaign_id == Campaign.id)
+            .where(Campaign.name == campaign_name).order_by(Campaign.id).limit(1)
+        )).first()
+        if not campaign:
+            return _error(f"Campanha '{campaign_name}' não encontrada.", 404)
+
+        version = campaign.version or 0
+        last_modified = _notes_last_modified(campaign)
+        fields = note_fields(query.fields, query.excerpt)
+        mimetype = negotiate_mimetype(accept)
+        # mesmo ETag da rota Flask, que também atende esta listagem em streaming
+        etag = make_etag(
+            campaign.id, campaign_name, version, campaign.changed_at, query.limit, query.cursor, None, fields,
+            query.excerpt, mimetype, query.from_, query.to
+        )
+        if not is_resource_modified(
+            http_if_none_match=request.headers.get('if-none-match'),
+            http_if_modified_since=request.headers.get('if-modified-since'),
+            etag=etag, last_modified=last_modified,
+        ):
+            return _not_modified(request, etag, last_modified)
+
+        cache_key = (query.limit, query.cursor, fields, query.excerpt, mimetype, query.from_, query.to)
+        body = notes_cache.get(campaign.id, cache_key, version)
+        cache_status = 'HIT'
+        if body is None:
+            cache_status = 'MISS'
+            limit = query.limit or DEFAULT_PAGE_SIZE
+            statement = order_notes(filter_created(
+                select_notes(select, fields, query.excerpt).where(Notes.campaign_id == campaign.id),
+                query.from_, query.to
+            ), query.cursor).limit(limit + 1)
+            notes, next_cursor = merge_pages([(await session.execute(statement)).all()], limit)
+            body = notes_page_json(
+                notes, campaign_name=campaign_name, next_cursor=next_cursor, fields=fields, mimetype=mimetype
+            )
+            notes_cache.put(campaign.id, cache_key, version, body)
+
+        response = _respond(request, body, mimetype, etag=etag, last_modified=last_modified)
+        response.headers['X-Cache'] = cache_status
+        return response
+
+    except InvalidCursorError as e:
+        return _error(str(e), 400)
+    except Exception as e:
+        logger.exception("Error listing notes for campaign '%s': %s", campaign_name, e)
+        return _error(f"Erro ao listar notas da campanha: {str(e)}", 500)
+    finally:
+        await session.close()
+
+
+def _changes_reader(limit, campaign_id=None):
+    """Como app._changes_reader, com uma sessão assíncrona curta por banco a cada leitura"""
+    async def read(positions):
+        if campaign_id is None:
+            sources = shards.shards()
+        else:
+            sources = [await _locate(campaign_id=campaign_id)]
+        pages = []
+        for shard in sources:
+            session = AsyncReadSession(shard=shard)
+            try:
+                statement = changed_notes(select_notes(select), positions.get(shard, 0), campaign_id)
+                pages.append((shard, (await session.execute(statement.limit(limit + 1))).all()))
+            finally:
+                await session.close()
+        return merge_changes(pages, positions, limit)
+    return read
+
+
+@native
+async def list_note_changes(request):
+    query = _query(NoteChangesQuery, request)
+    try:
+        positions = decode_change_cursor(request.headers.get('last-event-id') or query.since)
+
+        campaign_id = None
+        if query.campaign_name is not None:
+            session = AsyncReadSession()
+            try:
+                campaign = (await session.execute(
+                    select(Campaign.id).where(Campaign.name == query.campaign_name).order_by(Campaign.id).limit(1)
+                )).first()
+            finally:
+                await session.close()
+            if not campaign:
+                return _error(f"Campanha '{query.campaign_name}' não encontrada.", 404)
+            campaign_id = campaign.id
+
+        read = _changes_reader(query.limit, campaign_id)
+        accept = _accept(request)
+        if accept.best_match((JSON_MIMETYPE, SSE_MIMETYPE)) == SSE_MIMETYPE:
+            return StreamingResponse(
+                aiter_sse(read, positions, change_notifier, _encode_changes),
+                media_type=SSE_MIMETYPE,
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+            )
+
+        rows, positions, has_more = await wait_for_changes_async(read, positions, query.wait, change_notifier)
+        mimetype = negotiate_mimetype(accept)
+        _, body = _encode_changes(rows, positions, has_more, mimetype)
+        response = _respond(request, body, mimetype)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    except InvalidCursorError as e:
+        return _error(str(e), 400)
+    except Exception as e:
+        logger.exception("Error reading note changes: %s", e)
+        return _error(f"Erro ao ler alterações das notas: {str(e)}", 500)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await AsyncReadSession.dispose()
+
+
+app = Starlette(
+    routes=[
+        Route('/campaigns', list_campaigns, methods=['GET']),
+        Route('/campaigns/{campaign_id:int}', get_campaign, methods=['GET']),
+        Route('/campaigns/{campaign_name}/notes', list_notes_by_campaign, methods=['GET']),
+        Route('/notes', list_all_notes, methods=['GET']),
+        Route('/notes/changes', list_note_changes, methods=['GET']),
+        # demais rotas e métodos: aplicação Flask
+        Mount('/', app=wsgi),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,89 @@
+import json
+
+from werkzeug.test import EnvironBuilder
+
+from model import shared_read_sessions
+
+
+# headers da requisição do lote repassados a cada sub-requisição
+FORWARDED_HEADERS = ('Authorization', 'Cookie', 'Accept-Language')
+# headers da sub-resposta que não fazem sentido dentro do corpo do lote
+DROPPED_HEADERS = {'Content-Length', 'Content-Encoding', 'Vary'}
+
+
+def _item_environ(item, index, parent, request_id):
+    headers = {name: parent.headers[name] for name in FORWARDED_HEADERS if name in parent.headers}
+    headers.update(item.headers or {})
+    # o corpo de cada resposta é embutido no JSON do lote
+    headers['Accept'] = 'application/json'
+    headers['Accept-Encoding'] = 'identity'
+    if request_id:
+        headers['X-Request-ID'] = f'{request_id}.{index}'
+    builder = EnvironBuilder(
+        path=item.path,
+        method=item.method,
+        base_url=parent.host_url,
+        headers=headers,
+        json=item.body if item.body is not None else None,
+    )
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+def _decode_body(response, data):
+    if not data:
+        return None
+    if response.is_json:
+        return json.loads(data)
+    return data.decode('utf-8', errors='replace')
+
+
+def run_batch(app, items, parent, request_id=None):
+    """Executa as requisições de um lote pelos handlers da própria aplicação
+
+    Cada item passa pelo despacho completo do Flask (validação, hooks de
+    métricas e logs, tratamento de erros), em um contexto de aplicação
+    próprio, e recebe o seu próprio status, inclusive 404 por item. As
+    leituras compartilham uma sessão por banco; depois de um item que
+    escreve, a transação de leitura é encerrada para que os itens
+    seguintes vejam a escrita.
+
+    Args:
+        app: aplicação Flask
+        items: lista de BatchItem
+        parent: requisição do lote (host e headers repassados)
+        request_id: id da requisição do lote; os itens recebem '<id>.<índice>'
+
+    Returns:
+        Lista de dicionários no formato de BatchItemResponse, na ordem dos itens
+    """
+    results = []
+    with shared_read_sessions() as sessions:
+        for index, item in enumerate(items):
+            if not item.path.startswith('/') or item.path.split('?', 1)[0].rstrip('/') == '/batch':
+                results.append({
+                    'status': 400, 'headers': {},
+                    'body': {'message': "path deve começar com '/' e não pode ser /batch"},
+                })
+                continue
+
+            environ = _item_environ(item, index, parent, request_id)
+            with app.app_context(), app.request_context(environ):
+                try:
+                    response = app.full_dispatch_request()
+                except Exception as e:
+                    response = app.handle_exception(e)
+                data = response.get_data()
+                response.close()
+
+            if item.method != 'GET':
+                for session in sessions.values():
+                    session.rollback()
+            results.append({
+                'status': response.status_code,
+                'headers': {name: value for name, value in response.headers.items() if name not in DROPPED_HEADERS},
+                'body': _decode_body(response, data),
+            })
+    return results
@@ -0,0 +1,310 @@
+"""Latência das requisições admitidas com carga oferecida acima da capacidade
+
+Gera um banco sintético (benchmarks/dataset.py), sobe o gunicorn (um worker
+gthread) e:
+
+  1. mede a capacidade: --concurrency conexões em laço fechado repetindo a
+     mistura de requisições (--writes de POST /notes, o resto listagens de
+     notas) com o controle de admissão desligado
+  2. oferece --factor vezes essa vazão em laço aberto (chegadas de Poisson,
+     sem esperar as anteriores, reaproveitando conexões keep-alive ociosas ou
+     abrindo novas), com o controle
+     desligado e ligado (RPG_ADMISSION=1), cada um em um servidor novo
+
+Para cada modo informa as requisições admitidas por segundo, p50/p99/máximo
+da latência das admitidas (contada do instante programado da chegada), as
+recusas 503/429 e quão rápido foram respondidas, e os timeouts do cliente.
+Os limites de admissão vêm das opções abaixo; a soma de limites e filas das
+rotas usadas deve ficar abaixo de --threads, senão a espera acontece na fila
+do gunicorn, onde o controle não a vê. Requer gunicorn.
+
+Uso:
+    python benchmarks/admission.py [--duration 10] [--factor 3] [--writes 0.5]
+        [--threads 64] [--route-concurrency 2] [--write-concurrency 2]
+        [--queue-size 8] [--queue-timeout 0.5]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import SCALES, campaign_name, populate  # noqa: E402
+
+REQUEST_TIMEOUT = 10.0
+WRITE_CAMPAIGNS = 10
+
+
+def _raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def _send(reader, writer, method, path, body=None):
+    """Envia uma requisição e lê a resposta inteira
+
+    Returns:
+        Status da resposta
+    """
+    head = f'{method} {path} HTTP/1.1\r\nHost: bench\r\nAccept-Encoding: identity\r\n'
+    payload = b''
+    if body is not None:
+        payload = json.dumps(body).encode('utf-8')
+        head += f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n'
+    writer.write(head.encode('ascii') + b'\r\n' + payload)
+    await writer.drain()
+    lines = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+
+class Mix:
+    """Escolhe a próxima requisição: uma escrita com probabilidade writes, senão uma listagem"""
+
+    def __init__(self, campaigns, writes, seed):
+        self.rng = random.Random(seed)
+        self.writes = writes
+        self.names = [campaign_name(n) for n in range(1, min(campaigns, WRITE_CAMPAIGNS) + 1)]
+        self.reads = [f'/campaigns/{quote(name)}/notes?limit=50' for name in self.names] + ['/notes?limit=50']
+
+    def next(self):
+        if self.rng.random() < self.writes:
+            body = {'title': 'carga', 'content': 'nota gerada pelo benchmark de admissão',
+                    'campaign_name': self.rng.choice(self.names)}
+            return 'POST', '/notes', body
+        return 'GET', self.rng.choice(self.reads), None
+
+
+class Stats:
+    def __init__(self):
+        self.admitted = []
+        self.rejected = {}
+        self.errors = 0
+        self.timeouts = 0
+
+    def add(self, status, latency):
+        if status in (429, 503):
+            self.rejected.setdefault(status, []).append(latency)
+        elif status >= 400:
+            self.errors += 1
+        else:
+            self.admitted.append(latency)
+
+
+async def _closed_loop(port, mix, stats, deadline):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while time.monotonic() < deadline:
+            method, path, body = mix.next()
+            start = time.perf_counter()
+            status = await asyncio.wait_for(_send(reader, writer, method, path, body), REQUEST_TIMEOUT)
+            stats.add(status, time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+class Pool:
+    """Conexões keep-alive ociosas, reaproveitadas pelas chegadas seguintes"""
+
+    def __init__(self, port):
+        self.port = port
+        self.idle = []
+        self.opened = 0
+
+    async def get(self):
+        if self.idle:
+            return self.idle.pop()
+        self.opened += 1
+        return await asyncio.open_connection('127.0.0.1', self.port)
+
+    def put(self, connection):
+        self.idle.append(connection)
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+
+
+async def _arrival(pool, request, scheduled, stats):
+    """Uma requisição em uma conexão do pool; a latência conta a partir da chegada programada"""
+    connection = None
+    try:
+        async def exchange():
+            nonlocal connection
+            connection = await pool.get()
+            return await _send(*connection, *request)
+        status = await asyncio.wait_for(exchange(), REQUEST_TIMEOUT)
+        stats.add(status, time.perf_counter() - scheduled)
+        pool.put(connection)
+        connection = None
+    except asyncio.TimeoutError:
+        stats.timeouts += 1
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        stats.errors += 1
+    finally:
+        if connection is not None:
+            connection[1].close()
+
+
+async def _open_loop(port, mix, rate, duration, seed):
+    """Chegadas de Poisson a rate requisições/s durante duration segundos, sem esperar as anteriores"""
+    stats = Stats()
+    pool = Pool(port)
+    rng = random.Random(seed)
+    tasks = []
+    start = time.perf_counter()
+    scheduled = start
+    while scheduled - start < duration:
+        scheduled += rng.expovariate(rate)
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(_arrival(pool, mix.next(), scheduled, stats)))
+    await asyncio.gather(*tasks)
+    pool.close()
+    return stats, len(tasks), pool.opened, time.perf_counter() - start
+
+
+def _percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+def _start_server(workdir, port, threads, env):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '-b', f'127.0.0.1:{port}', '-w', '1', '-k', 'gthread',
+         '--threads', str(threads), '--keep-alive', '60', '--backlog', '4096', '--log-level', 'warning'],
+        cwd=workdir, env=env, preexec_fn=_raise_fd_limit, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("servidor encerrou durante a inicialização")
+        try:
+            asyncio.run(_probe(port))
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("servidor não respondeu")
+
+
+async def _probe(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        await _send(reader, writer, 'GET', '/campaigns?ids=1')
+    finally:
+        writer.close()
+
+
+def _stop_server(process):
+    process.terminate()
+    process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='tiny')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--duration', type=float, default=10.0, help="segundos de cada medição")
+    parser.add_argument('--factor', type=float, default=3.0, help="carga oferecida em múltiplos da capacidade")
+    parser.add_argument('--writes', type=float, default=0.5, help="fração de POST /notes na mistura")
+    parser.add_argument('--concurrency', type=int, default=8, help="conexões da medição de capacidade")
+    parser.add_argument('--threads', type=int, default=64, help="threads do worker gthread")
+    parser.add_argument('--route-concurrency', type=int, default=2)
+    parser.add_argument('--write-concurrency', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=8)
+    parser.add_argument('--queue-timeout', type=float, default=0.5)
+    parser.add_argument('--port', type=int, default=8912)
+    args = parser.parse_args()
+
+    _raise_fd_limit()
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    os.environ['RPG_DB_DIR'] = os.path.join(workdir, 'database')
+    os.environ['RPG_OPENAPI_CACHE_DIR'] = ''
+    os.environ.setdefault('RPG_LOG_LEVEL', 'WARNING')
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from model import engine
+        campaigns, notes = SCALES[args.scale]
+        populate(engine, campaigns, notes, seed=args.seed)
+        engine.dispose()
+
+    base_env = dict(os.environ, PYTHONPATH=ROOT, RPG_ADMISSION='0')
+    admission_env = dict(
+        base_env, RPG_ADMISSION='1',
+        RPG_ADMISSION_CONCURRENCY=str(args.route_concurrency),
+        RPG_ADMISSION_WRITE_CONCURRENCY=str(args.write_concurrency),
+        RPG_ADMISSION_QUEUE_SIZE=str(args.queue_size),
+        RPG_ADMISSION_QUEUE_TIMEOUT=str(args.queue_timeout),
+    )
+
+    process = _start_server(workdir, args.port, args.threads, base_env)
+    try:
+        stats = Stats()
+        deadline = time.monotonic() + args.duration
+
+        async def measure():
+            await asyncio.gather(*[
+                _closed_loop(args.port, Mix(campaigns, args.writes, args.seed + n), stats, deadline)
+                for n in range(args.concurrency)
+            ])
+        asyncio.run(measure())
+    finally:
+        _stop_server(process)
+    capacity = len(stats.admitted) / args.duration
+    rate = capacity * args.factor
+    print(f"escala {args.scale}, {args.writes:.0%} escritas, gthread com {args.threads} threads; capacidade "
+          f"{capacity:.0f} req/s (p99 {_percentile(stats.admitted, 0.99):.1f} ms com {args.concurrency} conexões); "
+          f"carga oferecida {rate:.0f} req/s ({args.factor:g}x) por {args.duration:.0f}s")
+    print(f"admissão: {args.route_concurrency} por rota, {args.write_concurrency} escritas, fila {args.queue_size}, "
+          f"prazo {args.queue_timeout * 1000:.0f} ms")
+
+    for mode, env in (('sem admissão', base_env), ('com admissão', admission_env)):
+        process = _start_server(workdir, args.port, args.threads, env)
+        try:
+            stats, offered, connections, elapsed = asyncio.run(_open_loop(
+                args.port, Mix(campaigns, args.writes, args.seed), rate, args.duration, args.seed
+            ))
+        finally:
+            _stop_server(process)
+        rejected = sum(len(latencies) for latencies in stats.rejected.values())
+        shed = ' '.join(
+            f"{status}: {len(latencies)} (p99 {_percentile(latencies, 0.99):.1f} ms)"
+            for status, latencies in sorted(stats.rejected.items())
+        ) or '0'
+        print(f"{mode:>13}: {offered} oferecidas, {len(stats.admitted) / elapsed:6.0f} admitidas/s  "
+              f"p50 {_percentile(stats.admitted, 0.5):8.1f} ms  p99 {_percentile(stats.admitted, 0.99):8.1f} ms  "
+              f"máx {_percentile(stats.admitted, 1.0):8.1f} ms  recusadas {rejected} [{shed}]  "
+              f"timeouts {stats.timeouts}  erros {stats.errors}  conexões {connections}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Exportação/importação de campanhas e consultas por intervalo de created_at
+
+Gera uma campanha sintética com --notes notas (benchmarks/dataset.py, notas
+espalhadas por dois anos) e mede, pelo test client do Flask:
+
+  export     GET /campaigns/<id>/export consumido em streaming: MB/s, tamanho
+             do arquivo e pico de memória alocada (tracemalloc)
+  listagem   o que os clientes faziam antes: todas as páginas de
+             GET /campaigns/<nome>/notes?limit=1000 acumuladas em memória
+  import     POST /campaigns/import do arquivo exportado, lido de disco em
+             streaming: notas/s e pico de memória
+  retomada   importação de um arquivo truncado na metade seguida do arquivo
+             completo: notas puladas e gravadas na segunda requisição
+  intervalo  uma semana de notas com from/to contra a listagem inteira
+
+O pico de memória é medido em uma segunda execução, com o tracemalloc ligado,
+para não distorcer os tempos.
+
+Uso:
+    python benchmarks/archive.py [--notes 20000] [--chunk 500]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import EPOCH, campaign_name, populate  # noqa: E402
+
+
+def measure(function, memory=False):
+    """Executa function e devolve (segundos, pico de memória em MB ou None, resultado)"""
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = function()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=20_000)
+    parser.add_argument('--chunk', type=int, default=500, help="notas por transação na importação")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    os.environ['RPG_DB_DIR'] = os.path.join(workdir, 'database')
+    os.environ['RPG_OPENAPI_CACHE_DIR'] = ''
+    os.environ.setdefault('RPG_LOG_LEVEL', 'WARNING')
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from model import engine
+        populate(engine, 1, args.notes, seed=args.seed)
+        import archive
+        from app import create_app
+    archive.IMPORT_CHUNK_SIZE = args.chunk
+    client = create_app().test_client()
+    name = quote(campaign_name(1))
+    archive_path = os.path.join(workdir, 'campaign.ndjson.gz')
+
+    def export():
+        size = 0
+        response = client.get('/campaigns/1/export', buffered=False)
+        with open(archive_path, 'wb') as f:
+            for chunk in response.iter_encoded():
+                f.write(chunk)
+                size += len(chunk)
+        response.close()
+        return size
+
+    def listing():
+        notes, cursor = [], ''
+        while True:
+            page = client.get(f'/campaigns/{name}/notes?limit=1000&cursor={cursor}').json
+            notes.extend(page['notes'])
+            cursor = page['next_cursor']
+            if not cursor:
+                return len(notes)
+
+    def import_file(path, target, expect=200):
+        with open(path, 'rb') as f:
+            response = client.post(
+                f'/campaigns/import?name={quote(target)}', input_stream=f,
+                content_type='application/gzip', content_length=os.path.getsize(path),
+            )
+        assert response.status_code == expect, response.json
+        return response.json
+
+    runs = [0]
+
+    def import_copy():
+        runs[0] += 1
+        return import_file(archive_path, f'Cópia {runs[0]}')
+
+    for label, function in (('export', export), ('listagem', listing), ('import', import_copy)):
+        elapsed, _, result = measure(function)
+        _, peak, _ = measure(function, memory=True)
+        if label == 'export':
+            size = os.path.getsize(archive_path)
+            detail = f"{args.notes / elapsed:9.0f} notas/s  arquivo {size / 2 ** 20:6.1f} MB"
+        elif label == 'import':
+            detail = f"{result['imported'] / elapsed:9.0f} notas/s"
+        else:
+            detail = f"{result / elapsed:9.0f} notas/s"
+        print(f"{label:>9}: {elapsed * 1000:8.1f} ms  {detail}  pico de memória {peak:6.1f} MB")
+
+    # retomada: metade do arquivo, depois o arquivo inteiro
+    truncated = os.path.join(workdir, 'truncated.ndjson.gz')
+    with open(archive_path, 'rb') as source, open(truncated, 'wb') as target:
+        target.write(source.read(os.path.getsize(archive_path) // 2))
+    import_file(truncated, 'Retomada', expect=400)
+    resumed = import_file(archive_path, 'Retomada')
+    print(f"retomada: {resumed['skipped']} notas já gravadas puladas, {resumed['imported']} gravadas "
+          f"na segunda requisição (total {resumed['total']} de {args.notes})")
+
+    start = EPOCH + timedelta(days=365)
+    end = start + timedelta(days=7)
+    window = f'from={quote(start.isoformat())}&to={quote(end.isoformat())}'
+    elapsed_window, _, count = measure(
+        lambda: len(client.get(f'/campaigns/{name}/notes?limit=1000&{window}').json['notes'])
+    )
+    elapsed_full, _, total = measure(listing)
+    print(f"intervalo: uma semana ({count} notas) em {elapsed_window * 1000:.1f} ms; "
+          f"listagem inteira ({total} notas) em {elapsed_full * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
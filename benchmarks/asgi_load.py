@@ -0,0 +1,247 @@
+"""Modo WSGI (gunicorn gthread) x modo ASGI (uvicorn) com 1000 conexões simultâneas
+
+Gera um banco sintético (benchmarks/dataset.py), sobe o servidor de cada modo
+em um processo próprio (um worker em ambos) e abre as conexões HTTP/1.1
+keep-alive a partir de um cliente asyncio. Dois cenários:
+
+  leituras   todas as conexões repetem GETs das listagens (páginas de notas
+             de uma campanha e de todas as campanhas, lista de campanhas)
+  long-poll  quase todas as conexões ficam paradas em GET /notes/changes?wait=
+             (como clientes aguardando alterações) enquanto --active conexões
+             repetem as mesmas leituras; mede se as leituras continuam sendo
+             atendidas
+
+Informa leituras por segundo, latência p50/p99 das leituras e erros
+(timeouts, conexões recusadas); um long-poll que não é atendido dentro do
+timeout do cliente conta como erro. Requer gunicorn, uvicorn, starlette,
+aiosqlite e a2wsgi.
+
+Uso:
+    python benchmarks/asgi_load.py [--scale tiny|small] [--connections 1000]
+        [--duration 10] [--threads 32] [--active 20] [--modes wsgi,asgi]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import SCALES, campaign_name, is_populated, populate  # noqa: E402
+
+REQUEST_TIMEOUT = 30.0
+
+
+def _raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _server_command(mode, port, threads):
+    if mode == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'app:app', '-b', f'127.0.0.1:{port}', '-w', '1',
+            '-k', 'gthread', '--threads', str(threads), '--worker-connections', '4000',
+            '--keep-alive', '60', '--backlog', '4096', '--log-level', 'warning',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+        '--backlog', '4096', '--timeout-keep-alive', '60', '--log-level', 'warning',
+    ]
+
+
+async def _request(reader, writer, path):
+    """Envia um GET na conexão keep-alive e lê a resposta inteira
+
+    Returns:
+        Tupla (status, corpo)
+    """
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: bench\r\nAccept-Encoding: identity\r\n\r\n'.encode('ascii'))
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    body = b''
+    if 'content-length' in headers:
+        body = await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            body += (await reader.readexactly(size + 2))[:-2]
+            if size == 0:
+                break
+    return status, body
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.long_polls = 0
+
+
+async def _connection(port, paths, stats, deadline, measure=True):
+    """Uma conexão repetindo GETs de paths até o prazo, reconectando após erros"""
+    rng = random.Random()
+    writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), REQUEST_TIMEOUT)
+            path = rng.choice(paths)
+            start = time.perf_counter()
+            status, _ = await asyncio.wait_for(_request(reader, writer, path), REQUEST_TIMEOUT + 30)
+            if status >= 400:
+                stats.errors += 1
+            elif measure:
+                stats.latencies.append(time.perf_counter() - start)
+            else:
+                stats.long_polls += 1
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            stats.errors += 1
+            if writer is not None:
+                writer.close()
+                writer = None
+            await asyncio.sleep(0.1)
+    if writer is not None:
+        writer.close()
+
+
+async def _run_scenario(port, read_paths, long_poll_path, connections, active, duration):
+    stats = Stats()
+    deadline = time.monotonic() + duration
+    tasks = []
+    if long_poll_path is None:
+        tasks += [_connection(port, read_paths, stats, deadline) for _ in range(connections)]
+    else:
+        tasks += [_connection(port, [long_poll_path], stats, deadline, measure=False)
+                  for _ in range(connections - active)]
+        tasks += [_connection(port, read_paths, stats, deadline) for _ in range(active)]
+    await asyncio.gather(*tasks)
+    return stats
+
+
+def _wait_ready(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("servidor encerrou durante a inicialização")
+        try:
+            asyncio.run(_probe(port))
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("servidor não respondeu")
+
+
+async def _probe(port):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        await _request(reader, writer, '/campaigns?ids=1')
+    finally:
+        writer.close()
+
+
+def _report(mode, scenario, stats, duration):
+    latencies = sorted(stats.latencies)
+    if latencies:
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    else:
+        p50 = p99 = float('nan')
+    extra = f"  long-polls concluídos {stats.long_polls}" if scenario == 'long-poll' else ''
+    print(f"{mode:>5} {scenario:>9}: {len(latencies) / duration:8.1f} leituras/s  p50 {p50:8.1f} ms  "
+          f"p99 {p99:8.1f} ms  erros {stats.errors}{extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='tiny')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=10.0, help="segundos por cenário")
+    parser.add_argument('--threads', type=int, default=32, help="threads do worker gthread (modo WSGI)")
+    parser.add_argument('--active', type=int, default=20, help="conexões fazendo leituras no cenário long-poll")
+    parser.add_argument('--wait', type=int, default=20, help="wait= dos long-polls, em segundos")
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--port', type=int, default=8911)
+    args = parser.parse_args()
+
+    _raise_fd_limit()
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    db_dir = os.path.join(workdir, 'database')
+    os.environ['RPG_DB_DIR'] = db_dir
+    os.environ.setdefault('RPG_LOG_LEVEL', 'WARNING')
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from model import engine
+        campaigns, notes = SCALES[args.scale]
+        if not is_populated(engine):
+            populate(engine, campaigns, notes, seed=args.seed)
+        engine.dispose()
+
+    read_paths = [f'/campaigns/{quote(campaign_name(n))}/notes?limit=20' for n in range(1, min(campaigns, 10) + 1)]
+    read_paths += ['/notes?limit=20', '/campaigns?ids=1,2,3,4,5']
+    long_poll_campaign = quote(campaign_name(campaigns))
+
+    print(f"escala {args.scale}, {args.connections} conexões, {args.duration:.0f}s por cenário, 1 CPU por servidor "
+          f"(gthread com {args.threads} threads)")
+    # um único processo servidor: os commits acordam os long-polls na hora e a
+    # consulta periódica de cada um (ver change_feed.py) pode ser espaçada
+    env = dict(os.environ, PYTHONPATH=ROOT, RPG_CHANGES_POLL_INTERVAL='5')
+    for mode in args.modes.split(','):
+        process = subprocess.Popen(
+            _server_command(mode, args.port, args.threads), cwd=workdir, env=env,
+            preexec_fn=_raise_fd_limit, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_ready(args.port, process)
+            cursor = _feed_cursor(args.port, long_poll_campaign)
+            long_poll = f'/notes/changes?campaign_name={long_poll_campaign}&since={cursor}&wait={args.wait}'
+            for scenario, path in (('leituras', None), ('long-poll', long_poll)):
+                stats = asyncio.run(_run_scenario(
+                    args.port, read_paths, path, args.connections, args.active, args.duration
+                ))
+                _report(mode, scenario, stats, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def _feed_cursor(port, campaign):
+    """Cursor do fim do feed da campanha, para que os long-polls fiquem de fato aguardando"""
+    async def read():
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            cursor = ''
+            while True:
+                _, body = await _request(
+                    reader, writer, f'/notes/changes?campaign_name={campaign}&limit=1000&since={cursor}'
+                )
+                page = json.loads(body)
+                cursor = page['cursor']
+                if not page['has_more']:
+                    return cursor
+        finally:
+            writer.close()
+    return asyncio.run(read())
+
+
+if __name__ == '__main__':
+    main()
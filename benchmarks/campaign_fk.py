@@ -0,0 +1,142 @@
+"""Compara a FK textual (notes.campaign_name) com a FK inteira (notes.campaign_id)
+
+Gera um banco no esquema antigo, mede junções e varreduras por campanha,
+executa a migração online de model/migrations.py e repete as medições no
+esquema novo.
+
+Uso:
+    python benchmarks/campaign_fk.py [--notes 1000000] [--campaigns 200]
+        [--repeat 5] [--batch-size 5000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LEGACY_DDL = """
+    CREATE TABLE campaigns (
+        id INTEGER NOT NULL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        description TEXT,
+        created_at DATETIME NOT NULL
+    );
+    CREATE TABLE notes (
+        id INTEGER NOT NULL PRIMARY KEY,
+        campaign_name VARCHAR(150) NOT NULL REFERENCES campaigns (name),
+        title VARCHAR(150),
+        content TEXT NOT NULL,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL
+    );
+    CREATE INDEX ix_notes_created_at_id ON notes (created_at, id);
+    CREATE INDEX ix_notes_campaign_name_created_at_id ON notes (campaign_name, created_at, id);
+"""
+
+QUERIES = {
+    'legacy': {
+        'join (contagem por campanha)':
+            "SELECT c.id, count(*) FROM notes n JOIN campaigns c ON c.name = n.campaign_name GROUP BY c.id",
+        'varredura de uma campanha':
+            "SELECT count(*), sum(length(n.content)) FROM notes n "
+            "WHERE n.campaign_name = (SELECT name FROM campaigns WHERE id = :campaign)",
+        'página de uma campanha':
+            "SELECT n.id, n.title, c.name FROM notes n JOIN campaigns c ON c.name = n.campaign_name "
+            "WHERE c.id = :campaign ORDER BY n.created_at, n.id LIMIT 100",
+    },
+    'campaign_id': {
+        'join (contagem por campanha)':
+            "SELECT c.id, count(*) FROM notes n JOIN campaigns c ON c.id = n.campaign_id GROUP BY c.id",
+        'varredura de uma campanha':
+            "SELECT count(*), sum(length(n.content)) FROM notes n WHERE n.campaign_id = :campaign",
+        'página de uma campanha':
+            "SELECT n.id, n.title, c.name FROM notes n JOIN campaigns c ON c.id = n.campaign_id "
+            "WHERE c.id = :campaign ORDER BY n.created_at, n.id LIMIT 100",
+    },
+}
+
+
+def build_legacy_database(path, notes, campaigns, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_DDL)
+    now = '2024-01-01 00:00:00.000000'
+    # nomes longos, como os reais, tornam a comparação de texto representativa
+    conn.executemany(
+        "INSERT INTO campaigns (id, name, created_at) VALUES (?, ?, ?)",
+        [(i, f'Campanha de teste número {i:05d}', now) for i in range(1, campaigns + 1)],
+    )
+    batch = []
+    for i in range(1, notes + 1):
+        campaign = rng.randint(1, campaigns)
+        created = f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:{i % 60:02d}.000000'
+        batch.append((i, f'Campanha de teste número {campaign:05d}', f'Nota {i}', 'x' * rng.randint(50, 300),
+                      created, created))
+        if len(batch) == 50000:
+            conn.executemany("INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    conn.executemany("INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.close()
+
+
+def measure(path, schema, campaigns, repeat):
+    conn = sqlite3.connect(path)
+    results = {}
+    for label, sql in QUERIES[schema].items():
+        timings = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql, {'campaign': 1 + i % campaigns}).fetchall()
+            timings.append(time.perf_counter() - start)
+        results[label] = min(timings)
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=1_000_000)
+    parser.add_argument('--campaigns', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    db_dir = os.path.join(workdir, 'database')
+    os.makedirs(db_dir)
+    db_file = os.path.join(db_dir, 'db.sqlite3')
+    os.environ['RPG_DB_DIR'] = db_dir
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    print(f"Gerando {args.notes} notas em {args.campaigns} campanhas...")
+    build_legacy_database(db_file, args.notes, args.campaigns, args.seed)
+    before = measure(db_file, 'legacy', args.campaigns, args.repeat)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from model import engine
+        from model.migrations import migrate_campaign_fk
+    start = time.perf_counter()
+    migrate_campaign_fk(engine, batch_size=args.batch_size)
+    migration_time = time.perf_counter() - start
+    engine.dispose()
+
+    after = measure(db_file, 'campaign_id', args.campaigns, args.repeat)
+
+    print(f"Migração: {migration_time:.2f}s (lotes de {args.batch_size})")
+    print(f"{'consulta':<32}{'campaign_name':>16}{'campaign_id':>16}{'ganho':>10}")
+    for label in before:
+        print(f"{label:<32}{before[label] * 1000:>13.2f} ms{after[label] * 1000:>13.2f} ms"
+              f"{before[label] / after[label]:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
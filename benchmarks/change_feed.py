@@ -0,0 +1,92 @@
+"""Bytes e tempo por rodada de sincronização: recarregar a listagem inteira x feed de alterações
+
+Gera um banco sintético (benchmarks/dataset.py) e simula um cliente que, a
+cada rodada, precisa ver as notas criadas desde a rodada anterior em uma
+campanha: (a) recarregando a listagem da campanha em streaming e (b) lendo
+GET /notes/changes?campaign_name=...&since=<cursor>. Informa bytes e tempo
+médio por rodada. Ao final mede o tempo até um cliente em long-poll
+receber uma nota criada por outra thread.
+
+Uso:
+    python benchmarks/change_feed.py [--scale tiny|small] [--rounds 50] [--writes 5]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import SCALES, campaign_name, is_populated, populate  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='tiny')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--writes', type=int, default=5, help="notas criadas por rodada")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    os.environ['RPG_DB_DIR'] = os.path.join(workdir, 'database')
+    os.environ.setdefault('RPG_LOG_LEVEL', 'WARNING')
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from model import engine
+        campaigns, notes = SCALES[args.scale]
+        if not is_populated(engine):
+            populate(engine, campaigns, notes, seed=args.seed)
+        from app import app
+
+    client = app.test_client()
+    name = campaign_name(1)
+    headers = {'Accept-Encoding': 'identity'}
+    cursor = client.get(f'/notes/changes?campaign_name={name}&limit=1000', headers=headers).get_json()['cursor']
+
+    totals = {'listagem completa': [0, 0.0], 'feed de alterações': [0, 0.0]}
+    for round_number in range(args.rounds):
+        for i in range(args.writes):
+            client.post('/notes', json={'title': f'r{round_number}-{i}', 'content': 'x' * 500, 'campaign_name': name})
+
+        start = time.perf_counter()
+        body = client.get(f'/campaigns/{name}/notes?stream=1', headers=headers).data
+        totals['listagem completa'][0] += len(body)
+        totals['listagem completa'][1] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = client.get(f'/notes/changes?campaign_name={name}&since={cursor}&limit=1000', headers=headers)
+        totals['feed de alterações'][0] += len(response.data)
+        totals['feed de alterações'][1] += time.perf_counter() - start
+        cursor = response.get_json()['cursor']
+
+    print(f"escala {args.scale}, {args.rounds} rodadas com {args.writes} notas novas cada")
+    for label, (size, elapsed) in totals.items():
+        print(f"{label:>20}: {size / args.rounds:10.0f} bytes/rodada  {elapsed / args.rounds * 1000:7.2f} ms/rodada")
+
+    # long-poll: tempo entre o commit de uma nota e a resposta ao cliente em espera
+    delays = []
+    for i in range(10):
+        def writer():
+            time.sleep(0.05)
+            committed.append(time.perf_counter())
+            app.test_client().post('/notes', json={'title': f'lp{i}', 'content': 'x', 'campaign_name': name})
+        committed = []
+        thread = threading.Thread(target=writer)
+        thread.start()
+        response = client.get(f'/notes/changes?campaign_name={name}&since={cursor}&wait=5', headers=headers)
+        delays.append(time.perf_counter() - committed[0])
+        cursor = response.get_json()['cursor']
+        thread.join()
+    delays.sort()
+    print(f"long-poll: mediana {delays[len(delays) // 2] * 1000:.1f} ms entre o POST e a resposta")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Tamanho do banco e custo de escrita/leitura com e sem compressão do conteúdo
+
+Para cada codec (none, zlib e, se zstandard estiver instalado, zstd) cria um
+banco novo em um processo separado, insere notas longas no estilo de logs de
+sessão e mede o tempo de inserção, o tamanho final do arquivo e o tempo para
+ler todo o conteúdo de volta.
+
+Uso:
+    python benchmarks/compression.py [--notes 2000] [--min-kb 10] [--max-kb 60]
+        [--threshold 4096] [--level 6]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import text_of_length  # noqa: E402
+
+
+def session_log(rng, size):
+    """Texto com a cara de um log de sessão colado: falas, rolagens e narração"""
+    lines = []
+    total = 0
+    while total < size:
+        speaker = rng.choice(['Mestre', 'Aria', 'Borin', 'Kael', 'Lyra'])
+        roll = f" [d20: {rng.randint(1, 20)}]" if rng.random() < 0.3 else ''
+        line = f"[{rng.randint(19, 23):02d}:{rng.randint(0, 59):02d}] {speaker}: " \
+               f"{text_of_length(rng, rng.randint(30, 200))}{roll}"
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines)[:size]
+
+
+def child(args):
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    db_dir = os.path.join(workdir, 'database')
+    os.environ['RPG_DB_DIR'] = db_dir
+    os.environ.setdefault('RPG_LOG_LEVEL', 'WARNING')
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from sqlalchemy import select
+        from model import Campaign, Notes, ReadSession, compression_settings, engine
+
+    rng = random.Random(args.seed)
+    contents = [session_log(rng, rng.randint(args.min_kb * 1024, args.max_kb * 1024)) for _ in range(args.notes)]
+    raw_bytes = sum(len(content.encode('utf-8')) for content in contents)
+
+    with engine.begin() as conn:
+        conn.execute(Campaign.__table__.insert(), [{'name': 'Bench'}])
+
+    start = time.perf_counter()
+    for offset in range(0, args.notes, 100):
+        with engine.begin() as conn:
+            conn.execute(Notes.__table__.insert(), [
+                {'campaign_id': 1, 'title': f'Sessão {offset + i}', 'content': content}
+                for i, content in enumerate(contents[offset:offset + 100])
+            ])
+    insert_time = time.perf_counter() - start
+
+    # checkpoint fora das transações do engine (que abrem BEGIN IMMEDIATE)
+    engine.dispose()
+    db_path = os.path.join(db_dir, 'db.sqlite3')
+    with contextlib.closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    db_size = os.path.getsize(db_path)
+
+    session = ReadSession()
+    start = time.perf_counter()
+    read_back = session.scalars(select(Notes.content)).all()
+    read_time = time.perf_counter() - start
+    session.close()
+    assert read_back == contents
+
+    print(json.dumps({
+        'codec': compression_settings.codec,
+        'raw_mb': raw_bytes / 2 ** 20,
+        'db_mb': db_size / 2 ** 20,
+        'insert_ms_per_note': insert_time / args.notes * 1000,
+        'read_ms_per_note': read_time / args.notes * 1000,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=2000)
+    parser.add_argument('--min-kb', type=int, default=10)
+    parser.add_argument('--max-kb', type=int, default=60)
+    parser.add_argument('--threshold', type=int, default=4096, help="tamanho mínimo comprimido, em bytes")
+    parser.add_argument('--level', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    codecs = ['none', 'zlib']
+    try:
+        import zstandard  # noqa: F401
+        codecs.append('zstd')
+    except ImportError:
+        print("zstandard não instalado; zstd fica de fora.")
+
+    results = []
+    for codec in codecs:
+        env = dict(os.environ,
+                   RPG_DB_CONTENT_COMPRESSION=codec,
+                   RPG_DB_CONTENT_COMPRESSION_MIN_BYTES=str(args.threshold),
+                   RPG_DB_CONTENT_COMPRESSION_LEVEL=str(args.level))
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', '--notes', str(args.notes),
+             '--min-kb', str(args.min_kb), '--max-kb', str(args.max_kb), '--seed', str(args.seed)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{args.notes} notas de {args.min_kb}-{args.max_kb} KB ({results[0]['raw_mb']:.1f} MB de texto)")
+    print(f"{'codec':<8}{'banco MB':>10}{'inserção ms/nota':>19}{'leitura ms/nota':>18}")
+    for r in results:
+        print(f"{r['codec']:<8}{r['db_mb']:>10.1f}{r['insert_ms_per_note']:>19.3f}{r['read_ms_per_note']:>18.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Gerador determinístico de campanhas e notas sintéticas para benchmarks
+
+A mesma semente e escala produzem sempre o mesmo banco. Os tamanhos de
+conteúdo seguem uma distribuição log-normal (a maioria das notas curta, com
+uma cauda de notas longas) e a quantidade de notas por campanha segue uma
+distribuição de Zipf (poucas campanhas concentram muitas notas).
+
+Uso:
+    python benchmarks/dataset.py [--scale small|medium|large] [--seed 42]
+        [--db-dir database/]
+"""
+import argparse
+import contextlib
+import io
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (campanhas, notas)
+SCALES = {
+    'tiny': (20, 1_000),
+    'small': (100, 10_000),
+    'medium': (1_000, 100_000),
+    'large': (10_000, 1_000_000),
+}
+
+INSERT_CHUNK_SIZE = 5_000
+
+# mediana ~400 caracteres, p99 ~4 KB
+CONTENT_LOG_MEAN = 6.0
+CONTENT_LOG_SIGMA = 1.0
+CONTENT_MIN = 20
+CONTENT_MAX = 20_000
+ZIPF_EXPONENT = 0.8
+
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+WORDS = (
+    "dragão taverna espada masmorra feitiço elfo anão orc goblin tesouro mapa "
+    "cristal antigo rei rainha castelo floresta caverna ponte rio montanha "
+    "mercador guilda ladrão clérigo paladino mago bardo druida ranger bárbaro "
+    "poção pergaminho armadilha emboscada portal ruína templo culto profecia "
+    "lich necromante sombra luz fogo gelo tempestade trovão vila cidade porto "
+    "navio pirata ilha deserto pântano torre biblioteca runa amuleto anel "
+    "batalha iniciativa dado crítico falha acerto dano cura descanso sessão"
+).split()
+
+ADJECTIVES = "Épica Sombria Perdida Esquecida Eterna Proibida Dourada Carmesim Ancestral Selvagem".split()
+
+
+def campaign_name(number):
+    return f"Campanha {number:05d} {ADJECTIVES[number % len(ADJECTIVES)]}"
+
+
+def text_of_length(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)[:length]
+
+
+def content_length(rng):
+    length = int(rng.lognormvariate(CONTENT_LOG_MEAN, CONTENT_LOG_SIGMA))
+    return max(CONTENT_MIN, min(CONTENT_MAX, length))
+
+
+def iter_campaigns(rng, count):
+    for number in range(1, count + 1):
+        description = text_of_length(rng, rng.randint(0, 200)) or None
+        created_at = EPOCH + timedelta(minutes=number)
+        yield {'id': number, 'name': campaign_name(number), 'description': description, 'created_at': created_at}
+
+
+def iter_notes(rng, campaigns, count):
+    weights = list(accumulate(1.0 / math.pow(rank, ZIPF_EXPONENT) for rank in range(1, campaigns + 1)))
+    # embaralha para que as campanhas mais ativas não sejam sempre as de id baixo
+    ids = list(range(1, campaigns + 1))
+    rng.shuffle(ids)
+    # notas espalhadas por dois anos, em ordem de criação
+    step = timedelta(days=730) / max(count, 1)
+    for number in range(1, count + 1):
+        campaign_id = ids[rng.choices(range(campaigns), cum_weights=weights)[0]]
+        created_at = EPOCH + step * number
+        yield {
+            'id': number,
+            'campaign_id': campaign_id,
+            'title': f"Sessão {number}: {text_of_length(rng, rng.randint(5, 60))}",
+            'content': text_of_length(rng, content_length(rng)),
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+
+
+def _insert_chunks(conn, table, rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            conn.execute(table.insert(), chunk)
+            chunk = []
+    if chunk:
+        conn.execute(table.insert(), chunk)
+
+
+def populate(engine, campaigns, notes, seed=42, chunk_size=INSERT_CHUNK_SIZE):
+    """Insere as campanhas e notas sintéticas em um banco vazio
+
+    Returns:
+        Nomes das campanhas geradas, na ordem dos ids
+    """
+    from model import Campaign, Notes
+
+    rng = random.Random(seed)
+    with engine.begin() as conn:
+        _insert_chunks(conn, Campaign.__table__, iter_campaigns(rng, campaigns), chunk_size)
+        _insert_chunks(conn, Notes.__table__, iter_notes(rng, campaigns, notes), chunk_size)
+    return [campaign_name(number) for number in range(1, campaigns + 1)]
+
+
+def is_populated(engine):
+    from sqlalchemy import func, select
+    from model import Campaign
+
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(Campaign)).scalar() > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db-dir', default=None, help="diretório do banco (padrão: RPG_DB_DIR ou database/)")
+    args = parser.parse_args()
+
+    if args.db_dir:
+        os.environ['RPG_DB_DIR'] = args.db_dir
+    sys.path.insert(0, ROOT)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from model import engine
+
+    if is_populated(engine):
+        sys.exit("O banco já possui campanhas; use um diretório vazio.")
+    campaigns, notes = SCALES[args.scale]
+    start = time.perf_counter()
+    populate(engine, campaigns, notes, seed=args.seed)
+    print(f"{campaigns} campanhas e {notes} notas geradas em {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
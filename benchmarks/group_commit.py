@@ -0,0 +1,115 @@
+"""Vazão de escritas com e sem group commit
+
+Executa, em um processo separado para cada modo (RPG_DB_GROUP_COMMIT=0 e 1),
+clientes concorrentes criando notas via POST /notes sobre um banco novo e
+informa escritas por segundo e latência p50/p99.
+
+Uso:
+    python benchmarks/group_commit.py [--clients 32] [--requests 100]
+        [--profile production|default] [--max-rows 64] [--max-delay-ms 2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(args):
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    os.environ['RPG_DB_DIR'] = os.path.join(workdir, 'database')
+    os.environ.setdefault('RPG_LOG_LEVEL', 'WARNING')
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+        app.test_client().post('/campaigns', json={'name': 'Bench'})
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.clients + 1)
+
+    def client(number):
+        local = app.test_client()
+        timings = []
+        failures = 0
+        barrier.wait()
+        for i in range(args.requests):
+            start = time.perf_counter()
+            response = local.post('/notes', json={
+                'title': f'c{number}-{i}', 'content': 'x' * 300, 'campaign_name': 'Bench'
+            })
+            timings.append(time.perf_counter() - start)
+            failures += response.status_code != 201
+        with lock:
+            latencies.extend(timings)
+            errors.append(failures)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    from model import group_writer
+    latencies.sort()
+    print(json.dumps({
+        'writes_per_sec': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'errors': sum(errors),
+        'batches': group_writer.stats()['batches'] if group_writer else None,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=100, help="requisições por cliente")
+    parser.add_argument('--profile', default='production')
+    parser.add_argument('--max-rows', type=int, default=64)
+    parser.add_argument('--max-delay-ms', type=float, default=2.0)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    results = {}
+    for mode in ('0', '1'):
+        env = dict(os.environ,
+                   RPG_DB_PROFILE=args.profile,
+                   RPG_DB_GROUP_COMMIT=mode,
+                   RPG_DB_GROUP_COMMIT_MAX_ROWS=str(args.max_rows),
+                   RPG_DB_GROUP_COMMIT_MAX_DELAY_MS=str(args.max_delay_ms))
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child',
+             '--clients', str(args.clients), '--requests', str(args.requests)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"perfil {args.profile}, {args.clients} clientes x {args.requests} notas")
+    for mode, label in (('0', 'commit individual'), ('1', 'group commit')):
+        r = results[mode]
+        batches = f", {r['batches']} transações" if r['batches'] else ''
+        print(f"{label:>18}: {r['writes_per_sec']:8.1f} escritas/s  p50 {r['p50_ms']:6.1f} ms  "
+              f"p99 {r['p99_ms']:7.1f} ms  erros {r['errors']}{batches}")
+    print(f"ganho: {results['1']['writes_per_sec'] / results['0']['writes_per_sec']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
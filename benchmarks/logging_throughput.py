@@ -0,0 +1,88 @@
+"""Vazão de requisições com o logging ligado e desligado
+
+Cada modo roda em um processo separado (a configuração de logging é lida do
+ambiente na importação) sobre um banco temporário, disparando requisições
+de escrita e leitura em várias threads pelo test client do Flask. A saída de
+console dos logs vai para /dev/null; os arquivos de log ficam no diretório
+temporário.
+
+Uso:
+    python benchmarks/logging_throughput.py [--threads 8] [--requests 300]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'desligado': {'RPG_LOG_LEVEL': 'OFF'},
+    'info': {'RPG_LOG_LEVEL': 'INFO'},
+    'debug': {'RPG_LOG_LEVEL': 'DEBUG'},
+    'debug-amostrado': {'RPG_LOG_LEVEL': 'DEBUG', 'RPG_LOG_SAMPLE_DEBUG': '0.01'},
+    'debug-json': {'RPG_LOG_LEVEL': 'DEBUG', 'RPG_LOG_FORMAT': 'json'},
+}
+
+
+def run_child(threads, requests):
+    sys.path.insert(0, ROOT)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+    client = app.test_client()
+    client.post('/campaigns', json={'name': 'Bench'})
+
+    barrier = threading.Barrier(threads)
+
+    def worker(number):
+        local = app.test_client()
+        barrier.wait()
+        for i in range(requests):
+            if i % 2:
+                local.get('/campaigns/Bench/notes?limit=20')
+            else:
+                local.post('/notes', json={'title': f'{number}-{i}', 'content': 'x' * 200, 'campaign_name': 'Bench'})
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    began = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    return threads * requests / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=300, help="requisições por thread")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps({'rps': run_child(args.threads, args.requests)}), file=sys.stderr)
+        return
+
+    baseline = None
+    for mode, env in MODES.items():
+        workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+        child_env = dict(os.environ, RPG_DB_DIR=os.path.join(workdir, 'database'), RPG_METRICS='0', **env)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child',
+             '--threads', str(args.threads), '--requests', str(args.requests)],
+            cwd=workdir, env=child_env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True
+        )
+        rps = json.loads(proc.stderr.strip().splitlines()[-1])['rps']
+        baseline = baseline or rps
+        print(f"{mode:>16}: {rps:8.0f} req/s ({rps / baseline:.0%} do modo desligado)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Bytes enviados e custo de CPU da compressão das respostas por nível de gzip
+
+Gera um banco sintético (benchmarks/dataset.py), obtém as respostas das
+listagens sem compressão em JSON e nas codificações binárias disponíveis
+(msgpack, cbor) e mede, para cada nível de gzip, o tamanho comprimido e o
+tempo de CPU por resposta. A listagem em streaming é comprimida pedaço a
+pedaço, como faz o middleware, para mostrar o custo dos flushes.
+
+Uso:
+    python benchmarks/response_compression.py [--scale tiny|small]
+        [--levels 1,3,6,9] [--repeat 20]
+"""
+import argparse
+import contextlib
+import gzip
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import SCALES, campaign_name, is_populated, populate  # noqa: E402
+
+
+def cpu_ms(function, repeat):
+    """Tempo de CPU médio, em milissegundos, de uma chamada de function"""
+    start = time.process_time()
+    for _ in range(repeat):
+        result = function()
+    return (time.process_time() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='tiny')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--levels', default='1,3,6,9')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(',')]
+
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    os.environ['RPG_DB_DIR'] = os.path.join(workdir, 'database')
+    os.environ.setdefault('RPG_LOG_LEVEL', 'WARNING')
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from model import engine
+        campaigns, notes = SCALES[args.scale]
+        if not is_populated(engine):
+            populate(engine, campaigns, notes, seed=args.seed)
+        from app import app
+        from response_compression import iter_gzip
+        from serialization import BINARY_ENCODERS
+
+    client = app.test_client()
+    mimetypes = ['application/json'] + [m for m in ('application/msgpack', 'application/cbor') if m in BINARY_ENCODERS]
+    if len(mimetypes) == 1:
+        print("msgpack/cbor2 não instalados; apenas JSON.")
+
+    routes = [
+        '/notes?limit=100',
+        '/notes?limit=1000',
+        '/notes?limit=100&excerpt=200',
+        f'/campaigns/{campaign_name(1)}/notes?limit=100',
+        '/campaigns?include=stats',
+    ]
+
+    print(f"{'rota':<52}{'codificação':<22}{'nível':>6}{'bytes':>10}{'razão':>8}{'CPU ms':>9}")
+    for route in routes:
+        for mimetype in mimetypes:
+            body = client.get(route, headers={'Accept': mimetype, 'Accept-Encoding': 'identity'}).data
+            print(f"{route[:50]:<52}{mimetype:<22}{'-':>6}{len(body):>10}{1:>8.2f}{0:>9.3f}")
+            for level in levels:
+                elapsed, compressed = cpu_ms(lambda: gzip.compress(body, level, mtime=0), args.repeat)
+                print(f"{'':<52}{'':<22}{level:>6}{len(compressed):>10}"
+                      f"{len(body) / len(compressed):>8.2f}{elapsed:>9.3f}")
+
+    # streaming: os pedaços chegam em lotes de STREAM_BATCH_SIZE linhas
+    response = client.get('/notes?stream=1', headers={'Accept-Encoding': 'identity'})
+    chunks = list(response.response)
+    size = sum(len(chunk) for chunk in chunks)
+    print(f"\nstreaming /notes?stream=1: {len(chunks)} pedaços, {size} bytes")
+    for level in levels:
+        elapsed, compressed = cpu_ms(lambda: b''.join(iter_gzip(chunks, level)), max(1, args.repeat // 4))
+        print(f"  nível {level}: {len(compressed):>10} bytes, razão {size / len(compressed):.2f}, {elapsed:.3f} ms de CPU")
+
+
+if __name__ == '__main__':
+    main()
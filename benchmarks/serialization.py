@@ -0,0 +1,74 @@
+"""Micro-benchmark do custo de serialização por nota nas listagens
+
+Compara o caminho antigo das listagens (dict montado à mão, model_validate e
+model_dump por linha, nova validação do envelope NotesSearchResponse e
+serialização pelo Flask) com o caminho atual de serialization.py (uma
+validação por TypeAdapter a partir das tuplas e dump_json direto em bytes).
+
+Uso:
+    python benchmarks/serialization.py [--rows 1000] [--content-size 500]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import timeit
+from collections import namedtuple
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NoteRow = namedtuple('NoteRow', 'id title content campaign_name created_at updated_at')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--content-size', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault('RPG_DB_DIR', os.path.join(tempfile.mkdtemp(prefix='rpg-bench-'), 'database'))
+    sys.path.insert(0, ROOT)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from schemas.note import NoteResponse, NotesSearchResponse
+        from serialization import notes_page_json
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        NoteRow(i, f'Sessão {i}', 'x' * args.content_size, 'Campanha Épica', now, now)
+        for i in range(args.rows)
+    ]
+
+    def legacy():
+        note_list = []
+        for note in rows:
+            note_dict = {
+                'id': note.id,
+                'title': note.title,
+                'content': note.content,
+                'campaign_name': note.campaign_name,
+                'created_at': note.created_at,
+                'updated_at': note.updated_at
+            }
+            note_list.append(NoteResponse.model_validate(note_dict).model_dump(mode='json'))
+        response = NotesSearchResponse(notes=note_list, total=len(note_list), campaign_name=None)
+        # o Flask serializava o dicionário retornado com json.dumps
+        return json.dumps(response.model_dump(mode='json')).encode('utf-8')
+
+    def current():
+        return notes_page_json(rows)
+
+    results = {}
+    for name, func in (('legado', legacy), ('atual', current)):
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        results[name] = best / args.rows * 1e6
+        print(f"{name:>7}: {results[name]:.2f} µs/nota ({best * 1e3:.1f} ms para {args.rows} notas)")
+    print(f"ganho: {results['legado'] / results['atual']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Vazão de escritas com as notas em um único arquivo e distribuídas em shards
+
+Executa, em um processo separado para cada quantidade de shards
+(RPG_DB_SHARDS=0, 2, 4...), clientes concorrentes criando notas via
+POST /notes, cada um em uma campanha própria, sobre um banco novo, e informa
+escritas por segundo e latência p50/p99. Com shards, campanhas diferentes
+disputam locks de escrita de arquivos diferentes.
+
+Uso:
+    python benchmarks/sharding.py [--shards 0,2,4,8] [--clients 16]
+        [--requests 100] [--profile default|production]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(args):
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    os.environ['RPG_DB_DIR'] = os.path.join(workdir, 'database')
+    os.environ.setdefault('RPG_LOG_LEVEL', 'WARNING')
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+        setup = app.test_client()
+        for number in range(args.clients):
+            setup.post('/campaigns', json={'name': f'Bench {number}'})
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.clients + 1)
+
+    def client(number):
+        local = app.test_client()
+        timings = []
+        failures = 0
+        barrier.wait()
+        for i in range(args.requests):
+            start = time.perf_counter()
+            response = local.post('/notes', json={
+                'title': f'c{number}-{i}', 'content': 'x' * 300, 'campaign_name': f'Bench {number}'
+            })
+            timings.append(time.perf_counter() - start)
+            failures += response.status_code != 201
+        with lock:
+            latencies.extend(timings)
+            errors.append(failures)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    campaigns = app.test_client().get('/campaigns?include=stats').get_json()
+    total = sum(campaign['note_count'] for campaign in campaigns)
+    latencies.sort()
+    print(json.dumps({
+        'writes_per_sec': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        'errors': sum(errors),
+        'total': total,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', default='0,2,4,8', help="quantidades de shards, separadas por vírgula")
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=100, help="requisições por cliente")
+    parser.add_argument('--profile', default='default')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    counts = [int(count) for count in args.shards.split(',')]
+    results = {}
+    for count in counts:
+        env = dict(os.environ,
+                   RPG_DB_PROFILE=args.profile,
+                   RPG_DB_SHARDS=str(count),
+                   RPG_DB_GROUP_COMMIT='0')
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child',
+             '--clients', str(args.clients), '--requests', str(args.requests)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        results[count] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"perfil {args.profile}, {args.clients} clientes x {args.requests} notas, uma campanha por cliente")
+    for count in counts:
+        r = results[count]
+        label = f"{count} shards" if count else 'arquivo único'
+        print(f"{label:>14}: {r['writes_per_sec']:8.1f} escritas/s  p50 {r['p50_ms']:6.1f} ms  "
+              f"p99 {r['p99_ms']:7.1f} ms  erros {r['errors']}  notas {r['total']}")
+    base = results[counts[0]]['writes_per_sec']
+    for count in counts[1:]:
+        print(f"ganho com {count} shards: {results[count]['writes_per_sec'] / base:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Carga mista de leituras e escritas concorrentes contra a API
+
+Sobe a aplicação sobre um banco temporário e dispara threads escritoras
+(POST /notes) e leitoras (GET /notes, GET /campaigns/<nome>/notes) ao mesmo
+tempo, contando respostas de erro e falhas por "database is locked". Sai com
+código 1 se algum erro ocorrer.
+
+Uso:
+    python benchmarks/sqlite_concurrency.py [--profile production|default]
+        [--writers 8] [--readers 8] [--requests 200]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profile', default='production')
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help="requisições por thread")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    os.environ['RPG_DB_DIR'] = os.path.join(workdir, 'database')
+    os.environ['RPG_DB_PROFILE'] = args.profile
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+        app.test_client().post('/campaigns', json={'name': 'Bench'})
+
+    errors = []
+    lock = threading.Lock()
+    start = threading.Barrier(args.writers + args.readers)
+
+    def record(kind, response):
+        if response.status_code >= 400:
+            with lock:
+                errors.append((kind, response.status_code, response.get_data(as_text=True)[:200]))
+
+    def writer(number):
+        local = app.test_client()
+        start.wait()
+        for i in range(args.requests):
+            record('write', local.post('/notes', json={
+                'title': f'w{number}-{i}', 'content': 'x' * 500, 'campaign_name': 'Bench'
+            }))
+
+    def reader(number):
+        local = app.test_client()
+        start.wait()
+        for i in range(args.requests):
+            url = '/notes?limit=50' if i % 2 else '/campaigns/Bench/notes?limit=50'
+            record('read', local.get(url))
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(args.readers)]
+
+    began = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - began
+
+    total = len(threads) * args.requests
+    locked = sum(1 for _, _, body in errors if 'locked' in body)
+    print(f"perfil={args.profile} requisições={total} tempo={elapsed:.2f}s "
+          f"req/s={total / elapsed:.0f} erros={len(errors)} locked={locked}")
+    for kind, status, body in errors[:5]:
+        print(f"  {kind} {status}: {body}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
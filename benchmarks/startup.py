@@ -0,0 +1,147 @@
+"""Tempo de inicialização: import do módulo app, create_app() e primeira requisição
+
+Cada medição roda em um interpretador novo, em um diretório vazio:
+
+  import      python -X importtime -c "import app"; informa o total e os
+              módulos mais lentos (tempo próprio) e falha se o import criar
+              qualquer arquivo ou diretório (banco, logs, cache)
+  boot frio   import + create_app() + primeira requisição sem a especificação
+              OpenAPI em cache (primeiro deploy de um código novo)
+  boot quente o mesmo com a especificação gravada pelo boot frio (reinício
+              de workers)
+
+Com --budget-ms o script termina com código 1 se a mediana do boot quente
+(import + create_app) passar do orçamento, para uso na integração contínua.
+
+Uso:
+    python benchmarks/startup.py [--repeat 5] [--top 15] [--budget-ms 1000]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# executado no interpretador filho; imprime os tempos em JSON
+BOOT_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+status = flask_app.test_client().get('/campaigns').status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import': (imported - start) * 1000, 'create_app': (created - imported) * 1000,
+    'first_request': (served - created) * 1000, 'status': status,
+}))
+'''
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def _environment(workdir):
+    return dict(
+        os.environ, PYTHONPATH=ROOT, RPG_LOG_LEVEL='WARNING',
+        RPG_DB_DIR=os.path.join(workdir, 'database'),
+        RPG_OPENAPI_CACHE_DIR=os.path.join(workdir, 'openapi'),
+    )
+
+
+def _files(directory):
+    return sorted(
+        os.path.relpath(os.path.join(path, name), directory)
+        for path, dirs, files in os.walk(directory) for name in dirs + files
+    )
+
+
+def measure_import(workdir):
+    """Executa -X importtime em workdir vazio
+
+    Returns:
+        Tupla (total em ms, lista de (tempo próprio em ms, módulo), arquivos criados)
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=workdir, env=_environment(workdir), capture_output=True, text=True, check=True,
+    )
+    modules = []
+    total = None
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, name = match.groups()
+        modules.append((int(own) / 1000, name))
+        if name == 'app' and len(indent) == 1:
+            total = int(cumulative) / 1000
+    return total, sorted(modules, reverse=True), _files(workdir)
+
+
+def measure_boot(workdir):
+    """Tempos de import, create_app() e primeira requisição em um interpretador novo"""
+    result = subprocess.run(
+        [sys.executable, '-c', BOOT_SCRIPT],
+        cwd=workdir, env=_environment(workdir), capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _report(label, samples):
+    line = f"{label:>12}:"
+    for phase in ('import', 'create_app', 'first_request'):
+        line += f"  {phase} {statistics.median(s[phase] for s in samples):7.1f} ms"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="interpretadores por medição (mediana)")
+    parser.add_argument('--top', type=int, default=15, help="módulos mais lentos listados")
+    parser.add_argument('--budget-ms', type=float, help="orçamento do boot quente (import + create_app)")
+    args = parser.parse_args()
+
+    failed = False
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    try:
+        totals = []
+        for _ in range(args.repeat):
+            total, modules, created = measure_import(workdir)
+            totals.append(total)
+            if created:
+                print(f"ERRO: import app criou arquivos: {', '.join(created)}")
+                failed = True
+                shutil.rmtree(workdir)
+                os.makedirs(workdir)
+        print(f"import app (-X importtime): {statistics.median(totals):.1f} ms (mediana de {args.repeat})")
+        print("módulos mais lentos (tempo próprio, última execução):")
+        for own, name in modules[:args.top]:
+            print(f"  {own:8.1f} ms  {name}")
+
+        cold = []
+        for _ in range(args.repeat):
+            shutil.rmtree(os.path.join(workdir, 'openapi'), ignore_errors=True)
+            cold.append(measure_boot(workdir))
+        warm = [measure_boot(workdir) for _ in range(args.repeat)]
+        _report('boot frio', cold)
+        _report('boot quente', warm)
+
+        boot = statistics.median(s['import'] + s['create_app'] for s in warm)
+        if args.budget_ms is not None:
+            within = boot <= args.budget_ms
+            print(f"boot quente {boot:.1f} ms, orçamento {args.budget_ms:.0f} ms: {'ok' if within else 'ESTOURADO'}")
+            failed = failed or not within
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
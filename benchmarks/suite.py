@@ -0,0 +1,377 @@
+"""Suíte de benchmarks das rotas da API sobre um conjunto de dados sintético
+
+Gera (ou reaproveita) um banco com benchmarks/dataset.py e executa um cenário
+por rota, tanto pelo test client do Flask quanto por um servidor WSGI com
+threads acessado via HTTP. Para cada cenário registra latência p50/p95/p99,
+vazão e pico de memória (RSS) do processo em um arquivo JSON. O subcomando
+compare aponta regressões em relação a um resultado anterior e sai com
+código 1 se houver alguma.
+
+Uso:
+    python benchmarks/suite.py run [--scale small] [--seed 42] [--requests 500]
+        [--concurrency 4] [--mode client|wsgi|all] [--scenario NOME ...]
+        [--output bench.json] [--baseline baseline.json] [--tolerance 0.15]
+    python benchmarks/suite.py compare baseline.json bench.json [--tolerance 0.15]
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from dataset import SCALES, campaign_name, content_length, text_of_length, populate, is_populated  # noqa: E402
+
+DEFAULT_TOLERANCE = 0.15
+# métricas comparadas com o baseline: (chave, True se maior é pior)
+COMPARED_METRICS = (('p50_ms', True), ('p95_ms', True), ('p99_ms', True), ('throughput_rps', False))
+
+
+class Workload:
+    """Gera requisições aleatórias (mas reprodutíveis) contra o conjunto de dados"""
+
+    def __init__(self, campaigns, notes, seed):
+        self.campaigns = campaigns
+        self.notes = notes
+        self.seed = seed
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def create_campaign(self, rng):
+        number = self._next()
+        return 'POST', '/campaigns', {'name': f'Bench {self.seed}-{number}', 'description': text_of_length(rng, 80)}
+
+    def update_campaign(self, rng):
+        campaign_id = rng.randint(1, self.campaigns)
+        return 'PATCH', f'/campaigns/{campaign_id}', {'description': text_of_length(rng, 80)}
+
+    def list_campaigns(self, rng):
+        return 'GET', '/campaigns', None
+
+    def list_campaigns_stats(self, rng):
+        return 'GET', '/campaigns?include=stats', None
+
+    def get_campaign(self, rng):
+        return 'GET', f'/campaigns/{rng.randint(1, self.campaigns)}', None
+
+    def create_note(self, rng):
+        return 'POST', '/notes', self._note(rng)
+
+    def bulk_notes(self, rng):
+        return 'POST', '/notes/bulk', [self._note(rng) for _ in range(50)]
+
+    def list_notes(self, rng):
+        return 'GET', '/notes?limit=100', None
+
+    def list_notes_excerpt(self, rng):
+        return 'GET', '/notes?limit=100&fields=id,title,created_at&excerpt=120', None
+
+    def list_by_campaign(self, rng):
+        name = quote(campaign_name(rng.randint(1, self.campaigns)))
+        return 'GET', f'/campaigns/{name}/notes?limit=100', None
+
+    def search_notes(self, rng):
+        return 'GET', f'/notes/search?q={quote(text_of_length(rng, 12).split()[0])}', None
+
+    def multi_get_notes(self, rng):
+        ids = ','.join(str(rng.randint(1, self.notes)) for _ in range(20))
+        return 'GET', f'/notes?ids={ids}', None
+
+    def batch_session_screen(self, rng):
+        # a tela de sessão do frontend: campanha, últimas notas e notas citadas, em uma chamada
+        number = rng.randint(1, self.campaigns)
+        ids = ','.join(str(rng.randint(1, self.notes)) for _ in range(5))
+        return 'POST', '/batch', {'requests': [
+            {'path': f'/campaigns/{number}?include=stats'},
+            {'path': f'/campaigns/{quote(campaign_name(number))}/notes?limit=20'},
+            {'path': f'/notes?ids={ids}'},
+        ]}
+
+    def _note(self, rng):
+        return {
+            'title': text_of_length(rng, rng.randint(5, 60)),
+            'content': text_of_length(rng, content_length(rng)),
+            'campaign_name': campaign_name(rng.randint(1, self.campaigns)),
+        }
+
+
+# leituras antes das escritas, para que as leituras meçam o conjunto gerado
+SCENARIOS = [
+    'list_campaigns', 'list_campaigns_stats', 'get_campaign', 'list_notes', 'list_notes_excerpt', 'list_by_campaign', 'search_notes',
+    'multi_get_notes', 'batch_session_screen',
+    'create_campaign', 'update_campaign', 'create_note', 'bulk_notes',
+]
+
+
+class ClientTransport:
+    """Chama a aplicação em processo pelo test client do Flask"""
+    name = 'client'
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self):
+        client = self.app.test_client()
+
+        def send(method, path, body):
+            return client.open(path, method=method, json=body).status_code
+        return send
+
+    def close(self):
+        pass
+
+
+class WsgiTransport:
+    """Sobe a aplicação em um servidor WSGI com threads e a chama via HTTP"""
+    name = 'wsgi'
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def session(self):
+        def send(method, path, body):
+            conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            try:
+                headers = {}
+                payload = None
+                if body is not None:
+                    payload = json.dumps(body).encode('utf-8')
+                    headers['Content-Type'] = 'application/json'
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                return response.status
+            finally:
+                conn.close()
+        return send
+
+    def close(self):
+        self.server.shutdown()
+        self.thread.join()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def peak_rss_mb():
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_scenario(transport, workload, scenario, requests, concurrency, seed):
+    """Executa requests requisições do cenário repartidas entre concurrency threads"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(concurrency + 1)
+    factory = getattr(workload, scenario)
+
+    def worker(number, count):
+        rng = random.Random(f'{seed}-{scenario}-{number}')
+        send = transport.session()
+        local = []
+        failures = 0
+        barrier.wait()
+        for _ in range(count):
+            method, path, body = factory(rng)
+            start = time.perf_counter()
+            try:
+                status = send(method, path, body)
+            except Exception:
+                status = None
+            local.append(time.perf_counter() - start)
+            if status is None or status >= 400:
+                failures += 1
+        with lock:
+            latencies.extend(local)
+            errors.append(failures)
+
+    shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(i, share)) for i, share in enumerate(shares)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def compare(baseline, current, tolerance):
+    """Lista as métricas de current que pioraram mais que tolerance em relação a baseline"""
+    regressions = []
+    for key, result in current['results'].items():
+        reference = baseline['results'].get(key)
+        if reference is None:
+            continue
+        for metric, higher_is_worse in COMPARED_METRICS:
+            before, after = reference.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if (change if higher_is_worse else -change) > tolerance:
+                regressions.append({'scenario': key, 'metric': metric, 'baseline': before, 'current': after,
+                                    'change_pct': round(change * 100, 1)})
+    return regressions
+
+
+def print_results(results):
+    print(f"{'cenário':<26}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'erros':>7}{'RSS MB':>9}")
+    for key, r in results.items():
+        print(f"{key:<26}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['throughput_rps']:>10.1f}{r['errors']:>7}{r['peak_rss_mb']:>9.1f}")
+
+
+def print_regressions(regressions, tolerance):
+    if not regressions:
+        print(f"Nenhuma regressão acima de {tolerance:.0%}.")
+        return
+    print(f"{len(regressions)} regressão(ões) acima de {tolerance:.0%}:")
+    for r in regressions:
+        print(f"  {r['scenario']} {r['metric']}: {r['baseline']} -> {r['current']} ({r['change_pct']:+.1f}%)")
+
+
+def command_run(args):
+    if args.db_dir:
+        db_dir = os.path.abspath(args.db_dir)
+    else:
+        db_dir = os.path.join(tempfile.mkdtemp(prefix='rpg-bench-'), 'database')
+    os.environ['RPG_DB_DIR'] = db_dir
+    os.environ.setdefault('RPG_LOG_LEVEL', 'WARNING')
+    workdir = tempfile.mkdtemp(prefix='rpg-bench-')
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from model import engine
+    campaigns, notes = SCALES[args.scale]
+    if not is_populated(engine):
+        start = time.perf_counter()
+        populate(engine, campaigns, notes, seed=args.seed)
+        print(f"Conjunto '{args.scale}' gerado em {time.perf_counter() - start:.1f}s ({db_dir})")
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+
+    scenarios = args.scenario or SCENARIOS
+    modes = ['client', 'wsgi'] if args.mode == 'all' else [args.mode]
+    results = {}
+    for mode in modes:
+        transport = ClientTransport(app) if mode == 'client' else WsgiTransport(app)
+        workload = Workload(campaigns, notes, f'{args.seed}-{mode}')
+        try:
+            for scenario in scenarios:
+                results[f'{mode}/{scenario}'] = run_scenario(
+                    transport, workload, scenario, args.requests, args.concurrency, args.seed
+                )
+        finally:
+            transport.close()
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'scale': args.scale,
+            'campaigns': campaigns,
+            'notes': notes,
+            'seed': args.seed,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'db_profile': os.environ.get('RPG_DB_PROFILE', 'production'),
+        },
+        'results': results,
+    }
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados gravados em {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        print_regressions(regressions, args.tolerance)
+        return 1 if regressions else 0
+    return 0
+
+
+def command_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.tolerance)
+    print_regressions(regressions, args.tolerance)
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="executa os cenários")
+    run.add_argument('--scale', choices=SCALES, default='small')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--requests', type=int, default=500, help="requisições por cenário")
+    run.add_argument('--concurrency', type=int, default=4)
+    run.add_argument('--mode', choices=['client', 'wsgi', 'all'], default='all')
+    run.add_argument('--scenario', action='append', choices=SCENARIOS)
+    run.add_argument('--db-dir', help="reaproveita um banco já gerado (ou gera nele)")
+    run.add_argument('--output', help="arquivo JSON de resultados")
+    run.add_argument('--baseline', help="JSON de uma execução anterior para comparação")
+    run.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    run.set_defaults(func=command_run)
+
+    diff = commands.add_parser('compare', help="compara dois arquivos de resultados")
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    diff.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    diff.set_defaults(func=command_compare)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
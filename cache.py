@@ -0,0 +1,95 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Cache LRU de corpos de resposta já serializados
+
+    Cada entrada guarda a versão dos dados com que foi gerada; uma leitura com
+    versão diferente é tratada como ausência. O cache é limitado tanto pelo
+    número de entradas quanto pelo total de bytes armazenados.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._keys_by_group = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, group, key, version):
+        """Retorna o corpo guardado para (group, key) se ainda for da versão informada"""
+        with self._lock:
+            entry = self._entries.get((group, key))
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((group, key))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, group, key, version, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._discard((group, key))
+            self._entries[(group, key)] = (version, body)
+            self._keys_by_group.setdefault(group, set()).add(key)
+            self.bytes += len(body)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, group):
+        """Remove todas as entradas de um grupo (ex.: de uma campanha)"""
+        with self._lock:
+            for key in list(self._keys_by_group.get(group, ())):
+                self._discard((group, key))
+            self.invalidations += 1
+
+    def _discard(self, full_key):
+        entry = self._entries.pop(full_key, None)
+        if entry is None:
+            return
+        self.bytes -= len(entry[1])
+        group, key = full_key
+        keys = self._keys_by_group.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_group[group]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def make_etag(*parts):
+    """ETag forte derivado das partes que identificam a representação"""
+    raw = '\x1f'.join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+# cache das listagens de notas por campanha; tamanho configurável pelo ambiente
+notes_cache = ResponseCache(
+    max_entries=int(os.environ.get('RPG_NOTES_CACHE_ENTRIES', 1024)),
+    max_bytes=int(os.environ.get('RPG_NOTES_CACHE_BYTES', 64 * 1024 * 1024)),
+)
@@ -0,0 +1,113 @@
+import os
+import time
+
+from flask import Response
+
+
+# intervalo máximo entre consultas ao banco enquanto um cliente aguarda; commits
+# deste processo acordam os clientes na hora, os de outros processos (workers
+# do gunicorn, comandos flask) são percebidos nessa consulta periódica
+CHANGES_POLL_INTERVAL = float(os.environ.get('RPG_CHANGES_POLL_INTERVAL', 1.0))
+# comentário enviado às conexões SSE ociosas para que proxies não as encerrem
+CHANGES_HEARTBEAT = float(os.environ.get('RPG_CHANGES_HEARTBEAT', 15))
+# duração máxima de uma conexão SSE; o cliente reconecta com Last-Event-ID
+CHANGES_SSE_MAX_SECONDS = float(os.environ.get('RPG_CHANGES_SSE_MAX_SECONDS', 300))
+
+SSE_MIMETYPE = 'text/event-stream'
+
+
+def wait_for_changes(read, positions, wait, notifier, poll_interval=CHANGES_POLL_INTERVAL):
+    """Lê as alterações desde positions, aguardando até wait segundos se não houver nenhuma
+
+    Args:
+        read: função (positions) -> (linhas, novas posições, has_more)
+        positions: dicionário shard -> último seq entregue
+        wait: tempo máximo de espera (long-poll); 0 responde na hora
+        notifier: ChangeNotifier acordado a cada commit
+
+    Returns:
+        O resultado da última chamada a read
+    """
+    deadline = time.monotonic() + wait
+    while True:
+        generation = notifier.generation
+        result = read(positions)
+        remaining = deadline - time.monotonic()
+        if result[0] or remaining <= 0:
+            return result
+        notifier.wait(generation, min(remaining, poll_interval))
+
+
+def iter_sse(read, positions, notifier, encode, poll_interval=CHANGES_POLL_INTERVAL,
+             heartbeat=CHANGES_HEARTBEAT, max_seconds=CHANGES_SSE_MAX_SECONDS):
+    """Gera um fluxo Server-Sent Events com as alterações a partir de positions
+
+    Cada lote é um evento 'changes' cujo id é o cursor seguinte, de modo que
+    o EventSource reenvia Last-Event-ID ao reconectar e retoma de onde parou.
+    Sem alterações, a conexão fica parada em notifier e recebe apenas um
+    comentário a cada heartbeat segundos.
+
+    Args:
+        read: função (positions) -> (linhas, novas posições, has_more)
+        encode: função (linhas, posições, has_more) -> (cursor, corpo JSON)
+    """
+    deadline = time.monotonic() + max_seconds
+    last_sent = time.monotonic()
+    yield b'retry: %d\n\n' % int(poll_interval * 1000)
+    while time.monotonic() < deadline:
+        generation = notifier.generation
+        rows, positions, has_more = read(positions)
+        now = time.monotonic()
+        if rows:
+            cursor, body = encode(rows, positions, has_more)
+            yield b'event: changes\nid: %s\ndata: %s\n\n' % (cursor.encode('ascii'), body)
+            last_sent = now
+            if has_more:
+                continue
+        elif now - last_sent >= heartbeat:
+            yield b': keepalive\n\n'
+            last_sent = now
+        notifier.wait(generation, min(poll_interval, max(deadline - now, 0)))
+
+
+async def wait_for_changes_async(read, positions, wait, notifier, poll_interval=CHANGES_POLL_INTERVAL):
+    """Versão de wait_for_changes para o modo ASGI: read é uma corrotina e a
+    espera acontece no event loop, sem ocupar uma thread por cliente"""
+    deadline = time.monotonic() + wait
+    while True:
+        generation = notifier.generation
+        result = await read(positions)
+        remaining = deadline - time.monotonic()
+        if result[0] or remaining <= 0:
+            return result
+        await notifier.wait_async(generation, min(remaining, poll_interval))
+
+
+async def aiter_sse(read, positions, notifier, encode, poll_interval=CHANGES_POLL_INTERVAL,
+                    heartbeat=CHANGES_HEARTBEAT, max_seconds=CHANGES_SSE_MAX_SECONDS):
+    """Versão de iter_sse para o modo ASGI: read é uma corrotina"""
+    deadline = time.monotonic() + max_seconds
+    last_sent = time.monotonic()
+    yield b'retry: %d\n\n' % int(poll_interval * 1000)
+    while time.monotonic() < deadline:
+        generation = notifier.generation
+        rows, positions, has_more = await read(positions)
+        now = time.monotonic()
+        if rows:
+            cursor, body = encode(rows, positions, has_more)
+            yield b'event: changes\nid: %s\ndata: %s\n\n' % (cursor.encode('ascii'), body)
+            last_sent = now
+            if has_more:
+                continue
+        elif now - last_sent >= heartbeat:
+            yield b': keepalive\n\n'
+            last_sent = now
+        await notifier.wait_async(generation, min(poll_interval, max(deadline - now, 0)))
+
+
+def sse_response(body):
+    """Resposta Flask de um fluxo SSE, sem cache nem buffer em proxies"""
+    response = Response(body, mimetype=SSE_MIMETYPE)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,71 +1,240 @@
-from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+import random
+import sys
+import uuid
 
 
+# diretório dos arquivos de log, criado na primeira escrita (ver LazyRotatingFileHandler)
 log_path = "log/"
-# Verifica se o diretorio para armexanar os logs não existe
-if not os.path.exists(log_path):
-   # então cria o diretorio
-   os.makedirs(log_path)
-
-
-dictConfig({
-    "version": 1,
-    "disable_existing_loggers": True,
-    "formatters": {
-        "default": {
-            "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s",
-        },
-        "detailed": {
-            "format": "[%(asctime)s] %(levelname)-4s %(funcName)s() L%(lineno)-4d %(message)s - call_trace=%(pathname)s L%(lineno)-4d",
-        }
-    },
-    "handlers": {
-        "console": {
-            "class": "logging.StreamHandler",
-            "formatter": "default",
-            "stream": "ext://sys.stdout",
-        },
-        # "email": {
-        #     "class": "logging.handlers.SMTPHandler",
-        #     "formatter": "default",
-        #     "level": "ERROR",
-        #     "mailhost": ("smtp.example.com", 587),
-        #     "fromaddr": "devops@example.com",
-        #     "toaddrs": ["receiver@example.com", "receiver2@example.com"],
-        #     "subject": "Error Logs",
-        #     "credentials": ("username", "password"),
-        # },
-        "error_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
-            "filename": "log/gunicorn.error.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
-        },
-        "detailed_file": {
-            "class": "logging.handlers.RotatingFileHandler",
-            "formatter": "detailed",
-            "filename": "log/gunicorn.detailed.log",
-            "maxBytes": 10000,
-            "backupCount": 10,
-            "delay": "True",
-        }
-    },
-    "loggers": {
-        "gunicorn.error": {
-            "handlers": ["console", "error_file"],  #, email],
-            "level": "INFO",
-            "propagate": False,
+
+# configuração por variáveis de ambiente
+LOG_LEVEL = os.environ.get('RPG_LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('RPG_LOG_FORMAT', 'text').lower()   # 'text' ou 'json'
+LOG_MAX_BYTES = int(os.environ.get('RPG_LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('RPG_LOG_BACKUP_COUNT', 5))
+LOG_QUEUE_SIZE = int(os.environ.get('RPG_LOG_QUEUE_SIZE', 10000))
+# loggers de bibliotecas silenciados, com seus filhos; os da aplicação nunca são
+SILENCED_LOGGERS = [name for name in os.environ.get('RPG_LOG_SILENCE', 'sqlalchemy').split(',') if name]
+# fração das mensagens mantida por nível, ex.: RPG_LOG_SAMPLE_DEBUG=0.01 mantém 1% dos debugs
+SAMPLE_RATES = {
+    level: float(os.environ.get(f'RPG_LOG_SAMPLE_{logging.getLevelName(level)}', 1.0))
+    for level in (logging.DEBUG, logging.INFO)
+}
+
+# identificador da requisição em andamento, anexado a cada registro de log
+request_id_var = ContextVar('rpg_request_id', default='-')
+
+DEFAULT_FORMAT = "[%(asctime)s] %(levelname)-4s [%(request_id)s] %(funcName)s() L%(lineno)-4d %(message)s"
+DETAILED_FORMAT = DEFAULT_FORMAT + " - call_trace=%(pathname)s L%(lineno)-4d"
+
+
+class RequestIdFilter(logging.Filter):
+    """Anexa ao registro o id da requisição corrente
+
+    Precisa rodar na thread que emitiu o log, antes do registro entrar na fila.
+    """
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Descarta aleatoriamente parte das mensagens dos níveis configurados"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {level: rate for level, rate in rates.items() if rate < 1.0}
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        return rate is None or random.random() < rate
+
+
+class LoggerNameFilter(logging.Filter):
+    """Aceita (ou, com exclude=True, rejeita) registros de um logger específico"""
+
+    def __init__(self, name, exclude=False):
+        super().__init__()
+        self.logger_name = name
+        self.exclude = exclude
+
+    def filter(self, record):
+        return (record.name == self.logger_name) != self.exclude
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata cada registro como um objeto JSON por linha"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'func': record.funcName,
+            'line': record.lineno,
+            'message': record.getMessage(),
         }
-    },
-    "root": {
-        "handlers": ["console", "detailed_file"],
-        "level": "INFO",
-    }
-})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+_exception_formatter = logging.Formatter()
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler que descarta o registro, em vez de bloquear, se a fila estiver cheia"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # resolve a mensagem e o traceback na thread de origem, mantendo o
+        # traceback separado para que cada formatter decida como exibi-lo
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler que cria o diretório do arquivo ao abri-lo
+
+    Com delay=True o arquivo só é aberto no primeiro registro, na thread do
+    QueueListener; importar o módulo não cria nada em disco.
+    """
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def _formatter(detailed=False):
+    if LOG_FORMAT == 'json':
+        return JsonFormatter()
+    return logging.Formatter(DETAILED_FORMAT if detailed else DEFAULT_FORMAT)
+
+
+def _file_handler(filename, name_filter):
+    handler = LazyRotatingFileHandler(
+        os.path.join(log_path, filename), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, delay=True
+    )
+    handler.setFormatter(_formatter(detailed=True))
+    handler.addFilter(name_filter)
+    return handler
+
+
+def _configure():
+    """Liga todos os loggers a uma fila consumida por uma thread dedicada
+
+    As threads das requisições só formatam o registro e o colocam na fila; a
+    escrita em console e arquivos (incluindo a rotação) acontece somente na
+    thread do QueueListener.
+    """
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(_formatter())
+    # gunicorn.error vai para o arquivo de erros, os demais para o detalhado
+    error_file = _file_handler("gunicorn.error.log", LoggerNameFilter("gunicorn.error"))
+    detailed_file = _file_handler("gunicorn.detailed.log", LoggerNameFilter("gunicorn.error", exclude=True))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(SAMPLE_RATES))
+    queue_handler.addFilter(RequestIdFilter())
+
+    listener = QueueListener(log_queue, console, error_file, detailed_file, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    # silencia apenas as bibliotecas listadas; desabilitar todos os loggers já
+    # existentes (como fazia disable_existing_loggers) calaria também os
+    # módulos da aplicação importados antes deste, como model.schema
+    for name in SILENCED_LOGGERS:
+        logging.getLogger(name).setLevel(logging.CRITICAL + 1)
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL if LOG_LEVEL != 'OFF' else logging.CRITICAL + 1)
+
+    gunicorn_error = logging.getLogger("gunicorn.error")
+    gunicorn_error.disabled = False
+    gunicorn_error.handlers = [queue_handler]
+    gunicorn_error.setLevel(logging.INFO)
+    gunicorn_error.propagate = False
+
+    return queue_handler, listener
+
+
+queue_handler, listener = _configure()
+
+
+def _restart_after_fork():
+    """Recria a fila e a thread do QueueListener no processo filho
+
+    A thread do listener não sobrevive ao fork (ex.: gunicorn --preload) e a
+    fila herdada pode estar com o lock travado; sem isso os logs do worker
+    ficariam presos na fila.
+    """
+    global listener
+    atexit.unregister(listener.stop)
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler.queue = log_queue
+    listener = QueueListener(log_queue, *listener.handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def init_request_logging(app):
+    """Correlaciona os logs de cada requisição por um id
+
+    Usa o header X-Request-ID recebido (ou gera um novo) e o devolve na resposta.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _bind_request_id():
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.rpg_request_id = request_id
+        g.rpg_request_id_token = request_id_var.set(request_id)
+
+    @app.after_request
+    def _expose_request_id(response):
+        request_id = g.get('rpg_request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        return response
+
+    @app.teardown_request
+    def _unbind_request_id(exc):
+        token = g.pop('rpg_request_id_token', None)
+        if token is not None:
+            request_id_var.reset(token)
 
 
-logger = logging.getLogger(__name__)
\ No newline at end of file
+logger = logging.getLogger(__name__)
@@ -0,0 +1,286 @@
+import os
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+
+from flask import Response, g, request
+from sqlalchemy import event
+
+
+# liga/desliga a instrumentação sem alterar código (RPG_METRICS=0 desliga)
+METRICS_ENABLED = os.environ.get('RPG_METRICS', '1').lower() not in ('0', 'false', 'off', 'no')
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+# métricas da requisição em andamento na thread/contexto corrente
+_current = ContextVar('rpg_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Acumuladores de uma única requisição"""
+    __slots__ = ('start', 'sql_count', 'sql_time', 'serialization_time')
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serialization_time = 0.0
+
+
+class Histogram:
+    """Histograma com rótulos no formato de exposição de texto do Prometheus"""
+
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # contagens por bucket (+Inf no fim), soma e total
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = [(labels, list(s[0]), s[1], s[2]) for labels, s in self._series.items()]
+        for labels, counts, total, count in sorted(snapshot):
+            base = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.label_names, labels))
+            prefix = base + ',' if base else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f'{{{base}}}' if base else ''
+            lines.append(f'{self.name}_sum{suffix} {total}')
+            lines.append(f'{self.name}_count{suffix} {count}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_LABELS = ('method', 'route', 'status')
+
+request_duration = Histogram(
+    'rpg_request_duration_seconds', 'Tempo total de processamento da requisição', DURATION_BUCKETS, REQUEST_LABELS)
+sql_queries = Histogram(
+    'rpg_request_sql_queries', 'Quantidade de comandos SQL por requisição', COUNT_BUCKETS, REQUEST_LABELS)
+sql_duration = Histogram(
+    'rpg_request_sql_duration_seconds', 'Tempo gasto em SQL por requisição', DURATION_BUCKETS, REQUEST_LABELS)
+serialization_duration = Histogram(
+    'rpg_request_serialization_duration_seconds', 'Tempo gasto serializando a resposta', DURATION_BUCKETS,
+    REQUEST_LABELS)
+
+HISTOGRAMS = [request_duration, sql_queries, sql_duration, serialization_duration]
+
+# coletores adicionais (ex.: estatísticas do cache) que devolvem linhas já formatadas
+_collectors = []
+
+
+def register_collector(collector):
+    _collectors.append(collector)
+
+
+def render_gauges(prefix, values, help_text):
+    """Formata um dicionário de valores numéricos como gauges do Prometheus"""
+    lines = []
+    for key, value in values.items():
+        name = f'{prefix}_{key}'
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+    return lines
+
+
+def timed_serialization(func):
+    """Decorador que soma à requisição corrente o tempo gasto na função"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return func(*args, **kwargs)
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.serialization_time += perf_counter() - start
+    return wrapper
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # o início fica no contexto de execução, descartado com ele: um comando que
+    # falha (ex.: IntegrityError) não deixa nada para trás que distorça os próximos
+    if context is not None and _current.get() is not None:
+        context._rpg_query_start = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = _current.get()
+    start = getattr(context, '_rpg_query_start', None)
+    if metrics is None or start is None:
+        return
+    metrics.sql_count += 1
+    metrics.sql_time += perf_counter() - start
+
+
+def _before_request():
+    g.rpg_metrics_token = _current.set(RequestMetrics())
+
+
+def observe(labels, metrics):
+    """Registra nos histogramas uma requisição encerrada"""
+    request_duration.observe(labels, perf_counter() - metrics.start)
+    sql_queries.observe(labels, metrics.sql_count)
+    sql_duration.observe(labels, metrics.sql_time)
+    serialization_duration.observe(labels, metrics.serialization_time)
+
+
+class MeteredStream:
+    """Corpo em streaming que continua somando às métricas da sua requisição
+
+    O corpo é gerado depois do after_request e do teardown, fora do contexto
+    da requisição; cada pedaço é produzido com as métricas dela de volta no
+    contexto, e os histogramas só são registrados quando o corpo é fechado.
+    """
+
+    def __init__(self, iterable, metrics, labels):
+        self.iterable = iterable
+        self.metrics = metrics
+        self.labels = labels
+        self.closed = False
+
+    def __iter__(self):
+        iterator = iter(self.iterable)
+        while True:
+            token = _current.set(self.metrics)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current.reset(token)
+            yield chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        token = _current.set(self.metrics)
+        try:
+            if hasattr(self.iterable, 'close'):
+                self.iterable.close()
+        finally:
+            _current.reset(token)
+            observe(self.labels, self.metrics)
+
+
+class MeteredASGIResponse:
+    """Como MeteredStream, para as respostas em streaming das rotas assíncronas (asgi.py)
+
+    O corpo é enviado por uma tarefa criada durante o envio, que herda as
+    métricas da requisição de volta no contexto; os histogramas são
+    registrados quando o envio termina ou é interrompido.
+    """
+
+    def __init__(self, response, metrics, labels):
+        self.response = response
+        self.metrics = metrics
+        self.labels = labels
+
+    async def __call__(self, scope, receive, send):
+        token = _current.set(self.metrics)
+        try:
+            await self.response(scope, receive, send)
+        finally:
+            _current.reset(token)
+            observe(self.labels, self.metrics)
+
+
+def server_timing(metrics, elapsed):
+    """Valor do header Server-Timing: tempo total, SQL e serialização da requisição"""
+    return ', '.join([
+        f'app;dur={elapsed * 1000:.2f}',
+        f'db;dur={metrics.sql_time * 1000:.2f};desc="{metrics.sql_count} queries"',
+        f'ser;dur={metrics.serialization_time * 1000:.2f}',
+    ])
+
+
+def _after_request(response):
+    metrics = _current.get()
+    if metrics is None:
+        return response
+    elapsed = perf_counter() - metrics.start
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    labels = (request.method, rule, str(response.status_code))
+
+    # em streaming o header cobre só o trabalho feito antes do corpo
+    response.headers.add('Server-Timing', server_timing(metrics, elapsed))
+    if response.is_streamed:
+        response.response = MeteredStream(response.response, metrics, labels)
+    else:
+        observe(labels, metrics)
+    return response
+
+
+def _teardown_request(exc):
+    token = g.pop('rpg_metrics_token', None)
+    if token is not None:
+        _current.reset(token)
+
+
+def render_metrics():
+    """Todas as métricas no formato de exposição de texto do Prometheus"""
+    parts = [histogram.render() for histogram in HISTOGRAMS]
+    for collector in _collectors:
+        parts.extend(collector())
+    return '\n'.join(parts) + '\n'
+
+
+def init_metrics(app, engines=()):
+    """Instala os hooks de medição na aplicação e nas engines, se habilitados
+
+    Engines abertas depois (como os bancos abertos no primeiro uso, ver
+    model/sharding.py) são instrumentadas com instrument_engine.
+
+    Cada requisição acumula tempo total, quantidade/tempo de SQL (via eventos
+    do SQLAlchemy) e tempo de serialização; os valores são devolvidos no header
+    Server-Timing e agregados em histogramas expostos em GET /metrics.
+
+    Respostas em streaming entram nos histogramas ao fim da transmissão, com o
+    SQL e a serialização feitos durante o envio do corpo. O SQL das escritas
+    do group commit é contado na requisição que as enviou (a thread escritora
+    as executa no contexto dela, ver model/group_commit.py), exceto o commit
+    compartilhado pelo lote.
+    """
+    if not METRICS_ENABLED:
+        return
+    for engine in engines:
+        instrument_engine(engine)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def instrument_engine(engine):
+    """Mede os comandos SQL da engine (útil para engines criadas depois de init_metrics)"""
+    if not METRICS_ENABLED:
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def metrics_response():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
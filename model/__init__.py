@@ -1,29 +1,95 @@
-from sqlalchemy_utils import database_exists, create_database
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
 import os
 from model.base import Base
 from model.campaign import Campaign  # Changed from Comment to Campaign
 from model.notes import Notes
+from model.versions import CampaignNoteVersion
+from model.stats import CampaignStats
+from model.changes import NoteChange, ChangeNotifier, watch_commits
+from model.archive import CampaignImport
+from model.engine import load_profile
+from model.compression import settings as compression_settings
+from model.schema import init_schema, ensure_schema
+from model.group_commit import WriteTimeoutError, WriterClosedError
+from model.sharding import CampaignShard, Database, ShardRouter, RoutedSessionFactory, shared_read_sessions
 
-db_path = "database/"
-# Verifica se o diretorio não existe
-if not os.path.exists(db_path):
-   # então cria o diretorio
-   os.makedirs(db_path)
+# o submódulo model.engine não pode ocultar a engine do banco principal,
+# servida sob demanda por __getattr__ (from model import engine)
+del engine
 
-# url de acesso ao banco (essa é uma url de acesso ao sqlite local)
-db_url = 'sqlite:///%s/db.sqlite3' % db_path
+# importar o pacote não cria diretórios, engines nem tabelas: o banco é aberto
+# no primeiro uso em cada processo (depois do fork dos workers do gunicorn)
+db_path = os.environ.get('RPG_DB_DIR', "database/")
 
-# cria a engine de conexão com o banco
-engine = create_engine(db_url, echo=False)
+# arquivo do banco sqlite local
+db_file = os.path.join(db_path, 'db.sqlite3')
 
-# Instancia um criador de seção com o banco
-Session = sessionmaker(bind=engine)
+# perfil de configuração do SQLite (WAL, PRAGMAs e pools), ver model/engine.py
+db_profile = load_profile()
 
-# cria o banco se ele não existir 
-if not database_exists(engine.url):
-    create_database(engine.url) 
+# cria ou atualiza o esquema ao abrir o banco, se ele estiver desatualizado;
+# com RPG_DB_AUTO_INIT=0 o esquema fica a cargo de 'flask init-db' e 'flask migrate'
+DB_AUTO_INIT = os.environ.get('RPG_DB_AUTO_INIT', '1').lower() not in ('0', 'false', 'off', 'no')
 
-# cria as tabelas do banco, caso não existam
-Base.metadata.create_all(engine)
\ No newline at end of file
+# compressão do conteúdo das notas gravadas a partir de agora, ver model/compression.py
+compression_settings.configure(
+    db_profile['content_compression'],
+    db_profile['content_compression_min_bytes'],
+    db_profile['content_compression_level'],
+)
+
+
+def open_main_db(create_schema=DB_AUTO_INIT):
+    """Abre o banco principal: campanhas, diretório de shards e, sem sharding, todas as notas"""
+    os.makedirs(db_path, exist_ok=True)
+    database = Database(db_file, db_profile)
+    ensure_schema(database.engine, create=create_schema)
+    return database
+
+
+# notas distribuídas em um arquivo por grupo de campanhas (RPG_DB_SHARDS=n),
+# ver model/sharding.py; com 0 tudo fica no banco principal
+shards = ShardRouter(
+    open_main_db,
+    os.path.join(db_path, 'shards'),
+    db_profile['shards'],
+    db_profile,
+    max_open=db_profile['shard_max_open'],
+)
+
+# Instancia os criadores de sessão com o banco; handlers que apenas leem usam
+# ReadSession e nunca disputam o lock de escrita. Sem argumentos as sessões
+# usam o banco principal; com shard=shards.locate(...) usam o shard da campanha
+Session = RoutedSessionFactory(shards, 'Session')
+ReadSession = RoutedSessionFactory(shards, 'ReadSession')
+
+
+def write(work, shard=None):
+    """Executa work(session) e faz o commit no banco do shard
+
+    Com o group commit ligado (RPG_DB_GROUP_COMMIT=1) as escritas
+    concorrentes no mesmo banco compartilham a transação. Se o shard foi
+    descartado do cache entre a escolha do banco e a escrita, ela é repetida
+    no shard reaberto (a escrita recusada nunca foi executada).
+    """
+    try:
+        return shards.get(shard).write(work)
+    except WriterClosedError:
+        if shard is None:
+            raise
+        return shards.get(shard).write(work)
+
+
+# acorda as requisições do feed de alterações (long-poll e SSE) a cada commit
+change_notifier = ChangeNotifier()
+watch_commits(change_notifier)
+
+
+def __getattr__(name):
+    """engine, read_engine, group_writer e main_db do banco principal do processo, abertos no primeiro acesso"""
+    if name == 'main_db':
+        return shards.directory
+    if name in ('engine', 'read_engine'):
+        return getattr(shards.directory, name)
+    if name == 'group_writer':
+        return shards.directory.writer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,89 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from model.base import Base
+from model.notes import Notes
+from model.pagination import filter_created
+
+
+# notas gravadas por transação na importação; cada lote grava também o ponto
+# de retomada, de modo que uma falha perde no máximo o lote em andamento
+IMPORT_CHUNK_SIZE = 500
+
+
+class CampaignImport(Base):
+    """
+    Importação de uma exportação de campanha - guarda a chave (created_at, id
+    na origem) da última nota gravada, no mesmo banco e na mesma transação das
+    notas, para retomar uma importação interrompida sem duplicar notas
+    """
+    __tablename__ = 'campaign_imports'
+
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), primary_key=True)
+    export_id = Column(String(64), nullable=False)
+    last_created_at = Column(DateTime, nullable=True)
+    last_source_id = Column(Integer, nullable=True)
+    imported = Column(Integer, nullable=False, default=0)
+    # preenchido quando o arquivo é lido até o fim
+    completed_at = Column(DateTime, nullable=True)
+
+    @property
+    def last_key(self):
+        if self.last_created_at is None:
+            return None
+        return self.last_created_at, self.last_source_id
+
+    def __repr__(self):
+        return f'<CampaignImport {self.campaign_id}: {self.export_id} ({self.imported} notas)>'
+
+
+def export_statement(campaign_id, start=None, end=None):
+    """Notas completas da campanha em ordem (created_at, id), para exportação
+
+    Percorre o índice (campaign_id, created_at, id) apenas no intervalo pedido.
+    """
+    statement = select(
+        Notes.id, Notes.title, Notes.content, Notes.created_at, Notes.updated_at
+    ).where(Notes.campaign_id == campaign_id)
+    return filter_created(statement, start, end).order_by(Notes.created_at, Notes.id)
+
+
+def import_checkpoint(session, campaign_id):
+    """Registro de importação da campanha, ou None"""
+    return session.get(CampaignImport, campaign_id)
+
+
+def write_import_chunk(session, campaign_id, export_id, notes, completed_at=None):
+    """Grava um lote de notas importadas e avança o ponto de retomada
+
+    Deve rodar dentro da transação de escrita do banco da campanha; as notas
+    recebem novos ids e mantêm as datas de criação e alteração da origem.
+
+    Args:
+        notes: lista de ArchiveNote, em ordem (created_at, id) da origem
+        completed_at: marca a importação como concluída
+    """
+    if notes:
+        session.execute(insert(Notes), [
+            {
+                'campaign_id': campaign_id,
+                'title': note.title,
+                'content': note.content,
+                'created_at': note.created_at,
+                'updated_at': note.updated_at,
+            }
+            for note in notes
+        ])
+    values = {'campaign_id': campaign_id, 'export_id': export_id, 'imported': len(notes), 'completed_at': completed_at}
+    if notes:
+        values['last_created_at'] = notes[-1].created_at
+        values['last_source_id'] = notes[-1].id
+    stmt = sqlite_insert(CampaignImport).values(**values)
+    updates = {
+        'imported': CampaignImport.imported + stmt.excluded.imported,
+        'completed_at': stmt.excluded.completed_at,
+    }
+    if notes:
+        updates['last_created_at'] = stmt.excluded.last_created_at
+        updates['last_source_id'] = stmt.excluded.last_source_id
+    session.execute(stmt.on_conflict_do_update(index_elements=[CampaignImport.campaign_id], set_=updates))
@@ -0,0 +1,69 @@
+import threading
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from model import shards, db_file, db_profile
+from model.engine import create_async_read_engine
+from model.sharding import shard_file
+
+
+class AsyncReadSessionFactory:
+    """Fábrica de AsyncSession de leitura, com uma engine aiosqlite por banco
+
+    Equivalente assíncrono de ReadSession, usado pelo modo ASGI: sem
+    argumentos abre no banco principal e com shard=n no shard n. As engines
+    são criadas no primeiro uso de cada banco; as escritas continuam pelas
+    sessões síncronas (Session e write).
+    """
+
+    def __init__(self, router, db_file, profile):
+        self.router = router
+        self.db_file = db_file
+        self.profile = profile
+        self._engines = {}
+        self._makers = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def __call__(self, shard=None):
+        maker = self._makers.get(shard)
+        if maker is None:
+            maker = self._open(shard)
+        return maker()
+
+    def add_listener(self, listener):
+        """Chama listener(engine) para cada engine assíncrona aberta, atual ou futura"""
+        with self._lock:
+            if listener in self._listeners:
+                return
+            self._listeners.append(listener)
+            engines = list(self._engines.values())
+        for engine in engines:
+            listener(engine)
+
+    def _open(self, shard):
+        with self._lock:
+            if shard not in self._makers:
+                if shard is None:
+                    path = self.db_file
+                else:
+                    # o roteador síncrono cria o arquivo e o esquema do shard, se preciso
+                    self.router.get(shard)
+                    path = shard_file(self.router.shard_dir, shard)
+                engine = create_async_read_engine(path, self.profile)
+                for listener in self._listeners:
+                    listener(engine)
+                self._engines[shard] = engine
+                self._makers[shard] = async_sessionmaker(engine, expire_on_commit=False)
+            return self._makers[shard]
+
+    async def dispose(self):
+        """Fecha as conexões de todas as engines abertas"""
+        with self._lock:
+            engines, self._engines, self._makers = list(self._engines.values()), {}, {}
+        for engine in engines:
+            await engine.dispose()
+
+
+# compartilhada por todas as rotas assíncronas, como ReadSession nas síncronas
+AsyncReadSession = AsyncReadSessionFactory(shards, db_file, db_profile)
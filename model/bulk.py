@@ -0,0 +1,104 @@
+from itertools import islice
+
+from sqlalchemy import insert, select
+
+from model.campaign import Campaign
+from model.notes import Notes
+
+
+# quantidade de notas enviadas por executemany
+BULK_CHUNK_SIZE = 500
+
+
+class CampaignResolver:
+    """Resolve nomes de campanha para ids em lote, guardando os já consultados
+
+    Cada lote faz no máximo uma consulta IN com os nomes ainda desconhecidos,
+    e o cache cresce com o número de campanhas distintas, não com o de notas.
+    Com um ShardRouter, também guarda o shard de cada campanha encontrada.
+    """
+
+    def __init__(self, session, router=None):
+        self.session = session
+        self.router = router
+        self.known = {}
+        self.missing = set()
+        self.shards = {}
+
+    def resolve(self, names):
+        """Retorna o mapa nome -> id de todas as campanhas já encontradas"""
+        unknown = set(names) - self.known.keys() - self.missing
+        if unknown:
+            rows = self.session.execute(
+                select(Campaign.name, Campaign.id).where(Campaign.name.in_(unknown)).order_by(Campaign.id)
+            )
+            found = []
+            for name, campaign_id in rows:
+                if name not in self.known:
+                    self.known[name] = campaign_id
+                    found.append(campaign_id)
+            self.missing |= unknown - self.known.keys()
+            if self.router is not None:
+                self.shards.update(self.router.locate_many(found))
+        return self.known
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ingest_notes(session, rows, chunk_size=BULK_CHUNK_SIZE, resolver=None, session_for=None):
+    """Insere notas em lotes dentro da transação corrente da sessão
+
+    Args:
+        session: sessão cuja transação receberá todos os lotes; o commit fica a
+            cargo de quem chama
+        rows: iterável de tuplas (índice, NoteCreate ou None, mensagem de erro ou None)
+        chunk_size: quantidade de notas por executemany
+        resolver: CampaignResolver a reutilizar, útil para saber ao final
+            quais campanhas receberam notas
+        session_for: com shards, session_for(shard) devolve a sessão que recebe
+            as notas das campanhas do shard (no lugar de session)
+
+    Yields:
+        Um dicionário de resultado por linha, na ordem de entrada
+    """
+    resolver = resolver or CampaignResolver(session)
+    stmt = insert(Notes).returning(Notes.id, sort_by_parameter_order=True)
+
+    for chunk in _chunked(rows, chunk_size):
+        known = resolver.resolve(note.campaign_name for _, note, _ in chunk if note is not None)
+
+        results = []
+        pending = []
+        for index, note, error in chunk:
+            if error is not None:
+                results.append({'index': index, 'status': 'error', 'error': error})
+            elif note.campaign_name not in known:
+                results.append({'index': index, 'status': 'error',
+                                'error': f"Campanha '{note.campaign_name}' não encontrada."})
+            else:
+                result = {'index': index, 'status': 'created'}
+                results.append(result)
+                pending.append((result, {
+                    'title': note.title,
+                    'content': note.content,
+                    'campaign_id': known[note.campaign_name],
+                }))
+
+        # um executemany por shard, preservando a ordem dentro de cada um
+        by_shard = {}
+        for item in pending:
+            by_shard.setdefault(resolver.shards.get(item[1]['campaign_id']), []).append(item)
+        for shard, items in by_shard.items():
+            target = session_for(shard) if session_for is not None else session
+            ids = target.scalars(stmt, [values for _, values in items]).all()
+            for (result, _), note_id in zip(items, ids):
+                result['id'] = note_id
+
+        yield from results
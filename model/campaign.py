@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, Index
 from datetime import datetime, timezone
 from sqlalchemy.orm import relationship
 from model import Base
@@ -16,6 +16,11 @@ class Campaign(Base):
 
     notes = relationship('Notes', backref='campaign', lazy=True, cascade='all, delete-orphan')
 
+    # as rotas recebem a campanha pelo nome; as notas referenciam o id
+    __table_args__ = (
+        Index('ix_campaigns_name', 'name'),
+    )
+
     def __init__(self, name, description=None):
         self.name = name
         self.description = description
@@ -0,0 +1,222 @@
+import asyncio
+import base64
+import heapq
+import json
+import threading
+from itertools import islice
+
+from sqlalchemy import Column, Integer, Index, event, text
+from sqlalchemy.orm import Session
+
+from model.base import Base
+from model.notes import Notes
+from model.pagination import InvalidCursorError
+
+
+class NoteChange(Base):
+    """
+    Sequência de alterações das notas - uma linha por nota, regravada por
+    triggers com um seq novo a cada inclusão ou alteração. Com AUTOINCREMENT
+    o seq nunca é reutilizado, então "seq > último visto" entrega apenas o que
+    mudou desde então, cada nota uma única vez no seu estado atual.
+    """
+    __tablename__ = 'note_changes'
+
+    seq = Column(Integer, primary_key=True)
+    note_id = Column(Integer, nullable=False, unique=True)
+    campaign_id = Column(Integer, nullable=False)
+
+    # o feed de uma campanha percorre só as alterações dela, em ordem de seq
+    __table_args__ = (
+        Index('ix_note_changes_campaign_id_seq', 'campaign_id', 'seq'),
+        {'sqlite_autoincrement': True},
+    )
+
+    def __repr__(self):
+        return f'<NoteChange {self.seq}: nota {self.note_id}>'
+
+
+# DELETE + INSERT em vez de INSERT OR REPLACE: dentro de um trigger, o
+# tratamento de conflito do comando externo (ex.: o INSERT OR IGNORE da
+# cópia entre shards) substituiria o REPLACE
+_RECORD = """
+    DELETE FROM note_changes WHERE note_id = new.id;
+    INSERT INTO note_changes (note_id, campaign_id) VALUES (new.id, new.campaign_id);
+"""
+
+CHANGE_TRIGGERS_DDL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_changes_ai AFTER INSERT ON notes BEGIN
+        {_RECORD}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_changes_ad AFTER DELETE ON notes BEGIN
+        DELETE FROM note_changes WHERE note_id = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_changes_au AFTER UPDATE ON notes BEGIN
+        {_RECORD}
+    END
+    """,
+]
+
+
+def create_change_triggers(engine):
+    """Cria os triggers que mantêm note_changes e registra as notas já existentes
+
+    Em bancos anteriores ao feed, as notas entram na sequência na ordem de
+    updated_at, na mesma transação que cria os triggers.
+    """
+    with engine.begin() as conn:
+        for ddl in CHANGE_TRIGGERS_DDL:
+            conn.execute(text(ddl))
+        empty = conn.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM notes) AND NOT EXISTS (SELECT 1 FROM note_changes)"
+        )).scalar()
+        if empty:
+            conn.execute(text(
+                "INSERT INTO note_changes (note_id, campaign_id) "
+                "SELECT id, campaign_id FROM notes ORDER BY updated_at, id"
+            ))
+
+
+def encode_change_cursor(positions):
+    """Gera um cursor opaco a partir do último seq visto em cada banco
+
+    Args:
+        positions: dicionário shard -> seq (None para o banco principal)
+    """
+    raw = json.dumps(
+        {'main' if shard is None else str(shard): seq for shard, seq in positions.items()},
+        separators=(',', ':'), sort_keys=True,
+    )
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_change_cursor(cursor):
+    """Recupera o dicionário shard -> seq de um cursor gerado por encode_change_cursor"""
+    if not cursor:
+        return {}
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return {None if key == 'main' else int(key): int(seq) for key, seq in raw.items()}
+    except (ValueError, TypeError, AttributeError, UnicodeError) as e:
+        raise InvalidCursorError(f"Cursor inválido: {cursor}") from e
+
+
+def changed_notes(query, since=0, campaign_id=None):
+    """Restringe uma query de notas às alteradas depois de since, em ordem de seq
+
+    Cada linha ganha a coluna change_seq, usada para avançar o cursor.
+    """
+    query = query.join(NoteChange, NoteChange.note_id == Notes.id).add_columns(
+        NoteChange.seq.label('change_seq')
+    ).filter(NoteChange.seq > since)
+    if campaign_id is not None:
+        query = query.filter(NoteChange.campaign_id == campaign_id)
+    return query.order_by(NoteChange.seq)
+
+
+def _tagged(shard, rows):
+    for row in rows:
+        yield shard, row
+
+
+def merge_changes(pages, positions, limit):
+    """Intercala as alterações lidas de cada banco e avança o cursor
+
+    As páginas de cada banco vêm em ordem de seq e são intercaladas por
+    updated_at; heapq.merge preserva a ordem de cada página, então o que é
+    entregue de cada banco é sempre um prefixo dela e o seq do último item
+    entregue basta como posição.
+
+    Args:
+        pages: pares (shard, linhas com change_seq), até limit + 1 por shard
+        positions: dicionário shard -> último seq já entregue
+        limit: máximo de notas a devolver
+
+    Returns:
+        Tupla (linhas, novas posições, se ainda há alterações a entregar)
+    """
+    positions = dict(positions)
+    streams = [_tagged(shard, rows) for shard, rows in pages]
+    merged = list(islice(heapq.merge(*streams, key=lambda item: item[1].updated_at), limit))
+    for shard, row in merged:
+        positions[shard] = row.change_seq
+    has_more = sum(len(rows) for _, rows in pages) > len(merged)
+    return [row for _, row in merged], positions, has_more
+
+
+class ChangeNotifier:
+    """Acorda as requisições que aguardam novas alterações (long-poll e SSE)
+
+    Cada commit de uma sessão neste processo incrementa uma geração; quem
+    aguarda lê a geração antes de consultar o banco e só dorme se ela ainda
+    não mudou, de modo que nenhum commit é perdido entre a consulta e a
+    espera. Escritas de outros processos são percebidas pela consulta
+    periódica feita por quem aguarda.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._generation = 0
+        # esperas das rotas assíncronas: pares (event loop, future)
+        self._async_waiters = set()
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def notify(self, *args):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:  # event loop já encerrado
+                pass
+
+    def wait(self, generation, timeout):
+        """Aguarda até timeout segundos por um commit posterior à geração informada
+
+        Returns:
+            True se houve commit
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._generation != generation, timeout)
+
+    async def wait_async(self, generation, timeout):
+        """Como wait, mas aguarda no event loop em vez de bloquear a thread
+
+        Returns:
+            True se houve commit
+        """
+        loop = asyncio.get_running_loop()
+        waiter = (loop, loop.create_future())
+        with self._condition:
+            if self._generation != generation:
+                return True
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self._generation != generation
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def watch_commits(notifier):
+    """Notifica notifier depois de cada commit de sessão, em qualquer banco"""
+    event.listen(Session, 'after_commit', notifier.notify)
@@ -0,0 +1,121 @@
+import logging
+import struct
+import zlib
+
+from sqlalchemy import Text, event
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import zstandard
+except ImportError:  # dependência opcional
+    zstandard = None
+
+
+logger = logging.getLogger(__name__)
+
+# valores comprimidos são gravados como BLOB com um cabeçalho de 5 bytes:
+# codec (1 byte) e tamanho original em bytes UTF-8 (4 bytes, big-endian).
+# Valores em TEXT (linhas antigas ou abaixo do limite) são lidos como estão.
+_HEADER = struct.Struct('>cI')
+ZLIB = b'z'
+ZSTD = b's'
+
+CODECS = ('none', 'zlib', 'zstd')
+
+
+class CompressionSettings:
+    """Configuração corrente da compressão, definida pelo perfil do banco"""
+
+    def __init__(self):
+        self.codec = 'zlib'
+        self.min_bytes = 4096
+        self.level = 6
+
+    def configure(self, codec, min_bytes, level):
+        if codec not in CODECS:
+            raise ValueError(f"Compressão de conteúdo desconhecida: {codec}")
+        if codec == 'zstd' and zstandard is None:
+            logger.warning("zstandard não está instalado; usando zlib para comprimir o conteúdo das notas")
+            codec = 'zlib'
+        self.codec = codec
+        self.min_bytes = min_bytes
+        self.level = level
+
+
+settings = CompressionSettings()
+
+
+def compress(text):
+    """Forma gravada do texto: BLOB comprimido ou o próprio texto
+
+    O texto fica sem compressão abaixo de settings.min_bytes, com o codec
+    'none' ou quando a compressão não reduz o tamanho.
+    """
+    if text is None or settings.codec == 'none':
+        return text
+    raw = text.encode('utf-8')
+    if len(raw) < settings.min_bytes:
+        return text
+    if settings.codec == 'zstd':
+        codec, payload = ZSTD, zstandard.ZstdCompressor(level=settings.level).compress(raw)
+    else:
+        codec, payload = ZLIB, zlib.compress(raw, settings.level)
+    if len(payload) + _HEADER.size >= len(raw):
+        return text
+    return _HEADER.pack(codec, len(raw)) + payload
+
+
+def decompress(value):
+    """Texto original a partir da forma gravada (BLOB comprimido ou TEXT)"""
+    if not isinstance(value, bytes):
+        return value
+    codec, _ = _HEADER.unpack_from(value)
+    payload = memoryview(value)[_HEADER.size:]
+    if codec == ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Conteúdo comprimido com zstd, mas zstandard não está instalado")
+        return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+    raise ValueError(f"Codec de conteúdo desconhecido: {codec!r}")
+
+
+def content_size(value):
+    """Tamanho do texto original em bytes UTF-8, sem descomprimir"""
+    if value is None:
+        return 0
+    if isinstance(value, bytes):
+        return _HEADER.unpack_from(value)[1]
+    return len(value.encode('utf-8'))
+
+
+def stored_codec(value):
+    """Codec da forma gravada ('none' para TEXT)"""
+    if isinstance(value, bytes):
+        return 'zstd' if value[:1] == ZSTD else 'zlib'
+    return 'none'
+
+
+class CompressedText(TypeDecorator):
+    """Texto comprimido de forma transparente acima de um tamanho mínimo"""
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return compress(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress(value)
+
+
+def register_functions(engine):
+    """Disponibiliza rpg_decompress() e rpg_content_size() ao SQL de cada conexão
+
+    Usadas pelos triggers e views (busca textual e estatísticas), que leem
+    notes.content diretamente no banco.
+    """
+
+    @event.listens_for(engine, 'connect')
+    def create_functions(dbapi_connection, connection_record):
+        dbapi_connection.create_function('rpg_decompress', 1, decompress, deterministic=True)
+        dbapi_connection.create_function('rpg_content_size', 1, content_size, deterministic=True)
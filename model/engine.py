@@ -0,0 +1,155 @@
+import os
+
+from sqlalchemy import create_engine, event
+
+from model.compression import register_functions
+
+
+# perfis de configuração do SQLite; qualquer chave pode ser sobrescrita por
+# variável de ambiente RPG_DB_<CHAVE>, ex.: RPG_DB_BUSY_TIMEOUT=10000
+PROFILES = {
+    # adequado a servidores com vários workers/threads (gunicorn)
+    'production': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,        # ms
+        'cache_size': -16000,        # negativo = KiB por conexão
+        'mmap_size': 268435456,      # bytes
+        'read_pool_size': 8,
+        'read_max_overflow': 16,
+        'write_pool_size': 1,
+        'pool_timeout': 30,          # s
+        'group_commit': 0,           # 1 agrupa as escritas em transações compartilhadas
+        'group_commit_max_rows': 64,
+        'group_commit_max_delay_ms': 2.0,
+        'group_commit_timeout_ms': 30000,     # espera máxima pelo commit; depois, 503
+        'content_compression': 'zlib',        # 'none', 'zlib' ou 'zstd' (requer zstandard)
+        'content_compression_min_bytes': 4096,
+        'content_compression_level': 6,
+        'shards': 0,                 # arquivos de notas por campanha; 0 = banco único
+        'shard_max_open': 64,        # shards abertos ao mesmo tempo (LRU)
+    },
+    # comportamento padrão do SQLite, útil para comparação
+    'default': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+        'cache_size': -2000,
+        'mmap_size': 0,
+        'read_pool_size': 5,
+        'read_max_overflow': 10,
+        'write_pool_size': 5,
+        'pool_timeout': 30,
+        'group_commit': 0,
+        'group_commit_max_rows': 64,
+        'group_commit_max_delay_ms': 2.0,
+        'group_commit_timeout_ms': 30000,
+        'content_compression': 'none',
+        'content_compression_min_bytes': 4096,
+        'content_compression_level': 6,
+        'shards': 0,
+        'shard_max_open': 64,
+    },
+}
+
+DEFAULT_PROFILE = 'production'
+
+
+def load_profile(name=None):
+    """Carrega o perfil pedido (ou RPG_DB_PROFILE) aplicando as sobrescritas do ambiente"""
+    name = name or os.environ.get('RPG_DB_PROFILE', DEFAULT_PROFILE)
+    if name not in PROFILES:
+        raise ValueError(f"Perfil de banco desconhecido: {name}")
+
+    profile = dict(PROFILES[name])
+    for key, value in profile.items():
+        override = os.environ.get(f'RPG_DB_{key.upper()}')
+        if override is not None:
+            profile[key] = type(value)(override)
+    return profile
+
+
+def _install_pragmas(engine, profile, begin, journal_mode=False):
+    """Aplica os PRAGMAs a cada nova conexão e assume o controle do BEGIN
+
+    O driver sqlite3 abre transações por conta própria e de forma tardia, o que
+    quebra SAVEPOINTs e faz escritas em WAL falharem com SQLITE_BUSY sem
+    respeitar o busy_timeout. Desligando esse comportamento e emitindo o BEGIN
+    aqui, o SQLAlchemy passa a controlar as transações.
+    """
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout'])}")
+        cursor.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+        cursor.execute(f"PRAGMA cache_size = {int(profile['cache_size'])}")
+        cursor.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])}")
+        if journal_mode:
+            # persistente no arquivo; só pode ser alterado fora de transação
+            cursor.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def do_begin(conn):
+        conn.exec_driver_sql(begin)
+
+
+def create_engines(db_file, profile):
+    """Cria as engines de escrita e de leitura para o arquivo SQLite informado
+
+    A engine de escrita abre transações com BEGIN IMMEDIATE, de modo que os
+    escritores aguardam o lock na entrada (respeitando busy_timeout) em vez de
+    falhar no meio da transação. A engine de leitura abre o arquivo em modo
+    somente leitura; em WAL os leitores não bloqueiam nem são bloqueados pelo
+    escritor.
+
+    Returns:
+        Tupla (engine de escrita, engine de leitura)
+    """
+    write_engine = create_engine(
+        f'sqlite:///{db_file}',
+        echo=False,
+        pool_size=profile['write_pool_size'],
+        max_overflow=0,
+        pool_timeout=profile['pool_timeout'],
+        connect_args={'check_same_thread': False},
+    )
+    _install_pragmas(write_engine, profile, 'BEGIN IMMEDIATE', journal_mode=True)
+    register_functions(write_engine)
+
+    read_engine = create_engine(
+        f'sqlite:///file:{os.path.abspath(db_file)}?mode=ro&uri=true',
+        echo=False,
+        pool_size=profile['read_pool_size'],
+        max_overflow=profile['read_max_overflow'],
+        pool_timeout=profile['pool_timeout'],
+        connect_args={'check_same_thread': False},
+    )
+    _install_pragmas(read_engine, profile, 'BEGIN')
+    register_functions(read_engine)
+
+    return write_engine, read_engine
+
+
+def create_async_read_engine(db_file, profile):
+    """Cria a engine de leitura assíncrona (aiosqlite) para o arquivo SQLite informado
+
+    Usada pelo modo ASGI (asgi.py): mesmos PRAGMAs, funções SQL e modo somente
+    leitura da engine de leitura síncrona. Cada conexão aiosqlite executa o
+    SQLite na sua própria thread, então as consultas não bloqueiam o event loop.
+    Requer o pacote aiosqlite.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    read_engine = create_async_engine(
+        f'sqlite+aiosqlite:///file:{os.path.abspath(db_file)}?mode=ro&uri=true',
+        echo=False,
+        pool_size=profile['read_pool_size'],
+        max_overflow=profile['read_max_overflow'],
+        pool_timeout=profile['pool_timeout'],
+    )
+    _install_pragmas(read_engine.sync_engine, profile, 'BEGIN')
+    register_functions(read_engine.sync_engine)
+    return read_engine
@@ -0,0 +1,219 @@
+import atexit
+import contextvars
+import logging
+import queue
+import threading
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+from functools import partial
+from time import monotonic
+
+
+logger = logging.getLogger(__name__)
+
+
+class WriteTimeoutError(Exception):
+    """A escrita entregue ao group commit não foi confirmada dentro do prazo"""
+
+
+class WriterClosedError(Exception):
+    """O banco (ou o seu group commit) foi encerrado e não aceita novas escritas
+
+    A escrita recusada nunca foi executada e pode ser repetida em um banco aberto.
+    """
+
+
+def run_in_transaction(session_factory, work):
+    """Executa work(session) em uma transação própria e devolve seu resultado"""
+    session = session_factory()
+    try:
+        result = work(session)
+        session.commit()
+        return result
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+class GroupCommitWriter:
+    """Agrupa as escritas de várias requisições em uma única transação (group commit)
+
+    Cada requisição entrega uma função work(session) e fica bloqueada até o
+    commit. Uma thread dedicada junta as escritas que chegam em até max_delay
+    segundos (ou até max_rows escritas), executa cada uma dentro de um
+    SAVEPOINT, para que a falha de uma não desfaça as demais, e faz um único
+    commit. Só então cada requisição recebe o resultado de sua função (ids e
+    timestamps já preenchidos pelo flush), com a mesma garantia de
+    durabilidade de um commit individual.
+
+    Uma escrita que passa timeout segundos ainda na fila é descartada e a
+    requisição recebe WriteTimeoutError; uma que já entrou em um lote aguarda
+    o resultado real dele. Um erro inesperado em um lote (ex.: ao abrir a
+    sessão) falha as escritas desse lote, e a thread segue atendendo as
+    próximas. Depois de stop() as novas escritas recebem WriterClosedError.
+    """
+
+    def __init__(self, session_factory, max_rows=64, max_delay=0.002, timeout=30.0):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.closed = False
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.largest_batch = 0
+
+    def submit(self, work):
+        """Enfileira work(session) e aguarda o commit do lote em que foi incluída
+
+        Raises:
+            WriteTimeoutError: se a escrita passar self.timeout segundos na
+                fila; ela é descartada, nunca gravada, e pode ser repetida
+            WriterClosedError: se o escritor já foi encerrado por stop()
+        """
+        future = Future()
+        # a thread escritora executa work no contexto de quem a enviou, com o
+        # id da requisição nos logs e o SQL contado nas métricas dela
+        item = (partial(contextvars.copy_context().run, work), future)
+        with self._lock:
+            # sob o lock, nada entra na fila depois do sinal de parada
+            if self.closed:
+                raise WriterClosedError("O group commit deste banco foi encerrado")
+            self._start()
+            self._queue.put(item)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            if not future.cancel():
+                # o lote já executou work: o commit pode acontecer, então
+                # desistir agora faria o cliente repetir uma escrita gravada
+                return future.result()
+            self._count(timeouts=1)
+            raise WriteTimeoutError(
+                f"Escrita descartada após {self.timeout:g}s na fila; o group commit está sobrecarregado"
+            ) from None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'writes': self.writes,
+                'failed': self.failed,
+                'timeouts': self.timeouts,
+                'largest_batch': self.largest_batch,
+            }
+
+    def _count(self, batches=0, writes=0, failed=0, timeouts=0, batch_size=0):
+        # atualizados pela thread escritora e pelas threads das requisições
+        with self._lock:
+            self.batches += batches
+            self.writes += writes
+            self.failed += failed
+            self.timeouts += timeouts
+            self.largest_batch = max(self.largest_batch, batch_size)
+
+    def stop(self):
+        """Processa as escritas pendentes, encerra a thread e passa a recusar novas escritas"""
+        with self._lock:
+            self.closed = True
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+        atexit.unregister(self.stop)
+
+    def _start(self):
+        # iniciada sob demanda, já no processo do worker (após o fork do
+        # gunicorn); chamada com self._lock adquirido
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='rpg-group-commit', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _collect(self):
+        """Aguarda a primeira escrita e junta as que chegarem até o prazo ou o limite"""
+        first = self._queue.get()
+        if first is None:
+            return None, True
+        batch = [first]
+        deadline = monotonic() + self.max_delay
+        while len(batch) < self.max_rows:
+            remaining = deadline - monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._commit_or_fail(batch)
+        # escritas enfileiradas depois do pedido de parada
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self._commit_or_fail([item])
+
+    def _commit_or_fail(self, batch):
+        """Executa o lote; um erro fora do tratamento de _commit falha as escritas pendentes do lote
+
+        Sem isso a exceção encerraria a thread, e as requisições deste lote e
+        das seguintes ficariam esperando um commit que nunca acontece.
+        """
+        try:
+            self._commit(batch)
+        except Exception as e:
+            logger.exception("Erro inesperado no group commit de %d escritas", len(batch))
+            for _, future in batch:
+                if future.done():
+                    continue
+                try:
+                    future.set_exception(e)
+                except InvalidStateError:
+                    continue
+                self._count(failed=1)
+
+    def _commit(self, batch):
+        session = self.session_factory()
+        done = []
+        try:
+            for work, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with session.begin_nested():
+                        result = work(session)
+                except Exception as e:
+                    self._count(failed=1)
+                    future.set_exception(e)
+                else:
+                    done.append((future, result))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self._count(failed=len(done))
+            for future, _ in done:
+                future.set_exception(e)
+            return
+        finally:
+            session.close()
+
+        self._count(batches=1, writes=len(done), batch_size=len(batch))
+        for future, result in done:
+            future.set_result(result)
@@ -0,0 +1,248 @@
+from contextlib import contextmanager
+
+from sqlalchemy import MetaData, inspect, text
+from sqlalchemy.schema import CreateTable
+
+from model.campaign import Campaign
+from model.notes import Notes, EXCERPT_LENGTH
+from model.compression import compress, decompress
+from model.search import create_search_index, rebuild_search_index, SEARCH_INDEX_DDL
+from model.versions import CampaignNoteVersion, create_version_triggers, VERSION_TRIGGERS_DDL
+from model.stats import create_stats_triggers, STATS_TRIGGERS_DDL
+from model.changes import create_change_triggers, CHANGE_TRIGGERS_DDL
+
+
+# notas copiadas por transação; cada lote segura o lock de escrita por pouco tempo
+MIGRATION_BATCH_SIZE = 5000
+
+
+class MigrationError(RuntimeError):
+    """Migração não pode prosseguir sem intervenção"""
+
+
+def needs_campaign_fk_migration(engine):
+    """Indica se a tabela notes ainda referencia a campanha pelo nome"""
+    inspector = inspect(engine)
+    if not inspector.has_table('notes'):
+        return False
+    columns = {column['name'] for column in inspector.get_columns('notes')}
+    return 'campaign_name' in columns and 'campaign_id' not in columns
+
+
+def needs_excerpt_column(engine):
+    """Indica se a tabela notes ainda não tem a coluna excerpt"""
+    inspector = inspect(engine)
+    if not inspector.has_table('notes'):
+        return False
+    return 'excerpt' not in {column['name'] for column in inspector.get_columns('notes')}
+
+
+# triggers de UPDATE em notes e a definição de cada um
+_UPDATE_TRIGGERS = {
+    'notes_version_au': VERSION_TRIGGERS_DDL[-1],
+    'notes_stats_au': STATS_TRIGGERS_DDL[-1],
+    'notes_fts_au': SEARCH_INDEX_DDL[-1],
+    'notes_changes_au': CHANGE_TRIGGERS_DDL[-1],
+}
+
+
+@contextmanager
+def _suspended_update_triggers(conn):
+    """Desliga os triggers de UPDATE de notes dentro da transação de conn
+
+    Para regravações que não alteram as notas do ponto de vista da aplicação:
+    não mudam versões, estatísticas nem o índice de busca. Como DDL é
+    transacional no SQLite, outras conexões nunca veem os triggers ausentes.
+    """
+    existing = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'"))}
+    for name in _UPDATE_TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    yield
+    for name, ddl in _UPDATE_TRIGGERS.items():
+        if name in existing:
+            conn.execute(text(ddl))
+
+
+def add_excerpt_column(engine):
+    """Adiciona notes.excerpt e a preenche a partir do conteúdo das notas existentes
+
+    Em bancos antigos a coluna fica depois de content; bancos novos (ou
+    reescritos por migrate_campaign_fk) a têm antes, o que evita ler
+    conteúdos longos ao listar apenas a prévia.
+    """
+    with engine.begin() as conn:
+        # outro processo pode ter adicionado a coluna enquanto este aguardava o lock
+        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(notes)"))}
+        if 'excerpt' in columns:
+            return
+        conn.execute(text(f"ALTER TABLE notes ADD COLUMN excerpt VARCHAR({EXCERPT_LENGTH})"))
+        with _suspended_update_triggers(conn):
+            conn.execute(text(f"UPDATE notes SET excerpt = substr(rpg_decompress(content), 1, {EXCERPT_LENGTH})"))
+
+
+def recompress_notes(engine, batch_size=MIGRATION_BATCH_SIZE, progress=None):
+    """Regrava o conteúdo das notas existentes conforme a compressão configurada
+
+    Comprime as notas antigas acima do limite, troca o codec ou volta a gravar
+    texto puro (com content_compression='none'), em lotes de transações
+    curtas. Notas já na forma desejada não são reescritas.
+
+    Args:
+        engine: engine de escrita
+        batch_size: notas lidas por transação
+        progress: função chamada com (notas percorridas, notas regravadas)
+
+    Returns:
+        Quantidade de notas regravadas
+    """
+    last = 0
+    seen = 0
+    changed = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text("SELECT id, content FROM notes WHERE id > :last ORDER BY id LIMIT :batch"),
+                {'last': last, 'batch': batch_size},
+            ).all()
+            if not rows:
+                break
+            updates = []
+            for note_id, stored in rows:
+                target = compress(decompress(stored))
+                if type(target) is not type(stored) or target != stored:
+                    updates.append({'id': note_id, 'content': target})
+            if updates:
+                with _suspended_update_triggers(conn):
+                    conn.execute(text("UPDATE notes SET content = :content WHERE id = :id"), updates)
+        last = rows[-1][0]
+        seen += len(rows)
+        changed += len(updates)
+        if progress:
+            progress(seen, changed)
+    return changed
+
+
+# resolve o id da campanha a partir do nome (a menor, se houver nomes repetidos)
+_CAMPAIGN_ID = "(SELECT min(c.id) FROM campaigns c WHERE c.name = {name})"
+
+# mantêm notes_new em dia com as escritas feitas na tabela antiga durante a cópia
+_SYNC_TRIGGERS_DDL = [
+    f"""
+    CREATE TRIGGER notes_migration_ai AFTER INSERT ON notes
+    WHEN {_CAMPAIGN_ID.format(name='new.campaign_name')} IS NOT NULL BEGIN
+        INSERT OR REPLACE INTO notes_new (id, campaign_id, title, excerpt, content, created_at, updated_at)
+        VALUES (new.id, {_CAMPAIGN_ID.format(name='new.campaign_name')},
+                new.title, substr(rpg_decompress(new.content), 1, {EXCERPT_LENGTH}), new.content, new.created_at, new.updated_at);
+    END
+    """,
+    f"""
+    CREATE TRIGGER notes_migration_au AFTER UPDATE ON notes
+    WHEN {_CAMPAIGN_ID.format(name='new.campaign_name')} IS NOT NULL BEGIN
+        INSERT OR REPLACE INTO notes_new (id, campaign_id, title, excerpt, content, created_at, updated_at)
+        VALUES (new.id, {_CAMPAIGN_ID.format(name='new.campaign_name')},
+                new.title, substr(rpg_decompress(new.content), 1, {EXCERPT_LENGTH}), new.content, new.created_at, new.updated_at);
+    END
+    """,
+    """
+    CREATE TRIGGER notes_migration_ad AFTER DELETE ON notes BEGIN
+        DELETE FROM notes_new WHERE id = old.id;
+    END
+    """,
+]
+
+_NEXT_BATCH_SQL = """
+    SELECT max(id) FROM (SELECT id FROM notes WHERE id > :last ORDER BY id LIMIT :batch)
+"""
+
+_COPY_BATCH_SQL = f"""
+    INSERT OR IGNORE INTO notes_new (id, campaign_id, title, excerpt, content, created_at, updated_at)
+    SELECT id, campaign_id, title, substr(rpg_decompress(content), 1, {EXCERPT_LENGTH}), content, created_at, updated_at FROM (
+        SELECT n.id, {_CAMPAIGN_ID.format(name='n.campaign_name')} AS campaign_id,
+               n.title, n.content, n.created_at, n.updated_at
+        FROM notes n
+        WHERE n.id > :last AND n.id <= :upper
+    )
+    WHERE campaign_id IS NOT NULL
+"""
+
+
+def _new_notes_ddl(engine):
+    """DDL da tabela notes no esquema atual do modelo, sob o nome notes_new"""
+    metadata = MetaData()
+    Campaign.__table__.to_metadata(metadata)
+    table = Notes.__table__.to_metadata(metadata, name='notes_new')
+    return str(CreateTable(table).compile(engine))
+
+
+def migrate_campaign_fk(engine, batch_size=MIGRATION_BATCH_SIZE, drop_orphans=False, progress=None):
+    """Migra notes.campaign_name (FK textual) para notes.campaign_id (FK inteira)
+
+    A tabela é reescrita em lotes sem carregar as notas na memória e sem
+    bloquear a aplicação: as notas são copiadas para notes_new em transações
+    curtas, enquanto triggers na tabela antiga replicam as escritas feitas no
+    meio do caminho. Ao final, uma única transação curta troca as tabelas e
+    recria índices e triggers. Reexecutar após uma falha recomeça a cópia.
+
+    Args:
+        engine: engine de escrita
+        batch_size: notas copiadas por transação
+        drop_orphans: descarta notas cuja campanha não existe, em vez de abortar
+        progress: função chamada com a quantidade de notas já percorridas
+
+    Returns:
+        Quantidade de notas descartadas por não terem campanha
+    """
+    if not needs_campaign_fk_migration(engine):
+        return 0
+
+    with engine.begin() as conn:
+        # o nome passa a ser só um atributo da campanha, mas ainda é usado nas buscas
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_campaigns_name ON campaigns (name)"))
+        orphans = conn.execute(text(
+            "SELECT count(*) FROM notes n WHERE NOT EXISTS (SELECT 1 FROM campaigns c WHERE c.name = n.campaign_name)"
+        )).scalar()
+        if orphans and not drop_orphans:
+            raise MigrationError(
+                f"{orphans} nota(s) referenciam campanhas inexistentes; use drop_orphans para descartá-las"
+            )
+
+        conn.execute(text("DROP TRIGGER IF EXISTS notes_migration_ai"))
+        conn.execute(text("DROP TRIGGER IF EXISTS notes_migration_au"))
+        conn.execute(text("DROP TRIGGER IF EXISTS notes_migration_ad"))
+        conn.execute(text("DROP TABLE IF EXISTS notes_new"))
+        conn.execute(text(_new_notes_ddl(engine)))
+        for ddl in _SYNC_TRIGGERS_DDL:
+            conn.execute(text(ddl))
+
+    last = 0
+    copied = 0
+    while True:
+        with engine.begin() as conn:
+            upper = conn.execute(text(_NEXT_BATCH_SQL), {'last': last, 'batch': batch_size}).scalar()
+            if upper is None:
+                break
+            result = conn.execute(text(_COPY_BATCH_SQL), {'last': last, 'upper': upper})
+        copied += result.rowcount
+        last = upper
+        if progress:
+            progress(copied)
+
+    with engine.begin() as conn:
+        # remove também os triggers da tabela antiga (busca, versões e sincronização);
+        # a view da busca impediria renomear notes_new e é recriada em seguida
+        conn.execute(text("DROP VIEW IF EXISTS notes_text"))
+        conn.execute(text("DROP TABLE notes"))
+        conn.execute(text("ALTER TABLE notes_new RENAME TO notes"))
+        for index in Notes.__table__.indexes:
+            index.create(conn, checkfirst=True)
+        # as versões eram indexadas pelo nome da campanha; recomeçam zeradas
+        conn.execute(text("DROP TABLE IF EXISTS campaign_note_versions"))
+        CampaignNoteVersion.__table__.create(conn)
+
+    create_search_index(engine)
+    if orphans:
+        rebuild_search_index(engine)
+    create_version_triggers(engine)
+    create_stats_triggers(engine)
+    create_change_triggers(engine)
+    return orphans
@@ -2,9 +2,75 @@ from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
 from datetime import datetime
 from typing import Union
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, text
+from sqlalchemy.orm import relationship, validates
 from  model import Base
+from model.compression import CompressedText
+
+
+# tamanho da prévia do conteúdo gravada em notes.excerpt
+EXCERPT_LENGTH = 200
+
+
+def make_excerpt(content):
+    """Prévia do conteúdo; equivale a substr(content, 1, EXCERPT_LENGTH) no SQLite"""
+    return content[:EXCERPT_LENGTH] if content is not None else None
+
+
+def _excerpt_default(context):
+    return make_excerpt(context.get_current_parameters().get('content'))
+
+
+# largura da faixa de ids de cada banco: o banco principal aloca em
+# (0, NOTE_ID_SPAN) e cada shard na sua própria faixa (ver model/sharding.py),
+# de modo que os ids continuam únicos quando as notas são distribuídas
+NOTE_ID_SPAN = 10 ** 12
+
+
+class NoteSequence(Base):
+    """
+    Sequência dos ids de notas do banco - último id entregue e a faixa
+    exclusiva (low, high) em que este arquivo aloca ids
+    """
+    __tablename__ = 'note_sequence'
+
+    id = Column(Integer, primary_key=True)
+    last_id = Column(Integer, nullable=False)
+    low = Column(Integer, nullable=False)
+    high = Column(Integer, nullable=False)
+
+
+# reserva :n ids; considera também notas gravadas com id explícito na faixa e
+# nunca volta atrás, mesmo depois que notas são apagadas ou movidas de shard
+_ALLOCATE_NOTE_IDS = text("""
+    UPDATE note_sequence
+    SET last_id = max(last_id, coalesce(
+        (SELECT n.id FROM notes n WHERE n.id > note_sequence.low AND n.id < note_sequence.high
+         ORDER BY n.id DESC LIMIT 1),
+        low)) + :n
+    WHERE id = 1
+    RETURNING last_id
+""")
+
+
+def init_note_sequence(engine, low=0, high=NOTE_ID_SPAN):
+    """Cria a linha da sequência de ids do banco, se ainda não existir"""
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT OR IGNORE INTO note_sequence (id, last_id, low, high) VALUES (1, :low, :low, :high)"),
+            {'low': low, 'high': high},
+        )
+
+
+def _note_id_default(context):
+    # os ids de todas as linhas do comando (executemany inclusive) são
+    # reservados de uma vez, dentro da transação de escrita
+    ids = getattr(context, '_rpg_note_ids', None)
+    if ids is None:
+        count = len(context.compiled_parameters)
+        last = context.connection.execute(_ALLOCATE_NOTE_IDS, {'n': count}).scalar_one()
+        ids = context._rpg_note_ids = iter(range(last - count + 1, last + 1))
+    return next(ids)
 
 
 class Notes(Base):
@@ -13,17 +79,39 @@ class Notes(Base):
     """
     __tablename__ = 'notes'
     
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    campaign_name = Column(String(150), ForeignKey('campaigns.name'), nullable=False)
+    # alocado pela tabela note_sequence do banco em que a nota é gravada
+    id = Column(Integer, primary_key=True, default=_note_id_default)
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), nullable=False)
     title = Column(String(150), nullable=True)
-    content = Column(Text, nullable=False)
+    # antes de content: listagens que leem só a prévia não percorrem as
+    # páginas de overflow de conteúdos longos
+    excerpt = Column(String(EXCERPT_LENGTH), nullable=True, default=_excerpt_default)
+    # comprimido acima de um tamanho mínimo, ver model/compression.py
+    content = Column(CompressedText, nullable=False)
     created_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
-    def __init__(self, campaign_name, content, title=None):
-        self.campaign_name = campaign_name
+    # índices que sustentam a paginação por cursor ordenada por (created_at, id),
+    # geral e por campanha
+    __table_args__ = (
+        Index('ix_notes_created_at_id', 'created_at', 'id'),
+        Index('ix_notes_campaign_id_created_at_id', 'campaign_id', 'created_at', 'id'),
+    )
+
+    def __init__(self, campaign_id, content, title=None):
+        self.campaign_id = campaign_id
         self.content = content
         self.title = title
+
+    @validates('content')
+    def _update_excerpt(self, key, content):
+        self.excerpt = make_excerpt(content)
+        return content
+
+    @property
+    def campaign_name(self):
+        """Nome da campanha, resolvido pelo relacionamento"""
+        return self.campaign.name if self.campaign else None
     
     def __repr__(self):
         return f'<Notes {self.id}: {self.title or "Sem título"}>'
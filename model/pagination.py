@@ -0,0 +1,108 @@
+import base64
+import heapq
+import json
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import tuple_
+
+from model.notes import Notes
+
+
+# tamanho de página usado quando o cliente não informa limit
+DEFAULT_PAGE_SIZE = 100
+
+
+class InvalidCursorError(ValueError):
+    """Cursor de paginação malformado ou adulterado"""
+
+
+def encode_cursor(created_at, note_id):
+    """Gera um cursor opaco a partir da chave de ordenação (created_at, id)"""
+    raw = json.dumps([created_at.isoformat(), note_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Recupera a chave (created_at, id) de um cursor gerado por encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, note_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(note_id)
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise InvalidCursorError(f"Cursor inválido: {cursor}") from e
+
+
+def filter_created(query, start=None, end=None):
+    """Restringe uma query de notas a created_at no intervalo [start, end)
+
+    Filtrada por campanha, a faixa é percorrida no índice (campaign_id,
+    created_at, id); sem a campanha, no índice (created_at, id).
+    """
+    if start is not None:
+        query = query.filter(Notes.created_at >= start)
+    if end is not None:
+        query = query.filter(Notes.created_at < end)
+    return query
+
+
+def order_notes(query, cursor=None):
+    """Ordena uma query de notas por (created_at, id), começando após o cursor"""
+    if cursor:
+        created_at, note_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Notes.created_at, Notes.id) > tuple_(created_at, note_id))
+    return query.order_by(Notes.created_at, Notes.id)
+
+
+def note_sort_key(row):
+    """Chave de ordenação das listagens de notas, (created_at, id)"""
+    return row.created_at, row.id
+
+
+def _page(rows, limit):
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
+def paginate_notes(query, limit, cursor=None):
+    """Aplica paginação keyset a uma query de notas
+
+    A query é ordenada por (created_at, id) e filtrada a partir da última
+    chave vista, de modo que o custo de cada página depende apenas de `limit`
+    e não da profundidade da paginação (sem OFFSET).
+
+    Returns:
+        Tupla (linhas da página, cursor da próxima página ou None)
+    """
+    return _page(order_notes(query, cursor).limit(limit + 1).all(), limit)
+
+
+def paginate_notes_merged(queries, limit, cursor=None):
+    """Paginação keyset sobre várias queries de notas, uma por shard
+
+    Cada query traz no máximo limit + 1 linhas a partir do cursor e as
+    listas são intercaladas pela chave (created_at, id); como os ids são
+    únicos entre os shards, o cursor continua valendo para todos eles.
+
+    Returns:
+        Tupla (linhas da página, cursor da próxima página ou None)
+    """
+    if len(queries) == 1:
+        return paginate_notes(queries[0], limit, cursor)
+    return merge_pages([order_notes(query, cursor).limit(limit + 1).all() for query in queries], limit)
+
+
+def merge_pages(pages, limit):
+    """Intercala páginas já lidas de cada shard (até limit + 1 linhas em ordem de
+    (created_at, id), a partir do mesmo cursor) e corta a página final
+
+    Returns:
+        Tupla (linhas da página, cursor da próxima página ou None)
+    """
+    if len(pages) == 1:
+        return _page(pages[0], limit)
+    return _page(list(islice(heapq.merge(*pages, key=note_sort_key), limit + 1)), limit)
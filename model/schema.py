@@ -0,0 +1,104 @@
+import logging
+import zlib
+
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy_utils import database_exists, create_database
+
+from model.base import Base
+from model.changes import create_change_triggers, CHANGE_TRIGGERS_DDL
+from model.migrations import needs_campaign_fk_migration, needs_excerpt_column, add_excerpt_column
+from model.notes import NOTE_ID_SPAN, init_note_sequence
+from model.search import create_search_index, SEARCH_INDEX_DDL
+from model.stats import create_stats_triggers, STATS_TRIGGERS_DDL
+from model.versions import create_version_triggers, VERSION_TRIGGERS_DDL
+
+
+logger = logging.getLogger(__name__)
+
+
+def init_schema(engine, tables=None, note_ids=(0, NOTE_ID_SPAN)):
+    """Cria ou atualiza as tabelas, índices e triggers do banco da engine
+
+    Args:
+        engine: engine de escrita do banco
+        tables: tabelas a criar; todas as do modelo por padrão
+        note_ids: faixa exclusiva (low, high) dos ids de notas deste banco
+    """
+    # cria o banco se ele não existir
+    if not database_exists(engine.url):
+        create_database(engine.url)
+
+    # cria as tabelas do banco, caso não existam
+    Base.metadata.create_all(engine, tables=tables)
+    init_note_sequence(engine, *note_ids)
+
+    if needs_campaign_fk_migration(engine):
+        # banco anterior à FK inteira: índices e triggers dependem de notes.campaign_id
+        logger.warning("notes ainda referencia campanhas pelo nome; execute 'flask migrate-campaign-fk'")
+        return
+
+    # create_all não adiciona colunas novas em tabelas já existentes
+    if needs_excerpt_column(engine):
+        add_excerpt_column(engine)
+
+    # create_all não adiciona índices novos em tabelas já existentes
+    for table in tables or Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+    # cria o índice de busca textual (FTS5) e os triggers que o mantêm atualizado
+    create_search_index(engine)
+
+    # cria os triggers que versionam as notas de cada campanha (ETag e cache)
+    create_version_triggers(engine)
+
+    # cria os triggers que mantêm as estatísticas por campanha
+    create_stats_triggers(engine)
+
+    # cria os triggers que registram a sequência de alterações (GET /notes/changes)
+    create_change_triggers(engine)
+
+    # marca o banco como atualizado; ensure_schema não refaz o trabalho acima
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version = {schema_version(tables, note_ids)}")
+
+
+def schema_version(tables=None, note_ids=(0, NOTE_ID_SPAN)):
+    """Assinatura do esquema criado por init_schema, gravada em PRAGMA user_version
+
+    Calculada a partir do DDL das tabelas, índices, busca textual e triggers e
+    da faixa de ids de notas; qualquer mudança no modelo gera outro valor.
+    """
+    dialect = sqlite.dialect()
+    parts = [repr(tuple(note_ids))]
+    for table in tables or Base.metadata.sorted_tables:
+        parts.append(str(CreateTable(table).compile(dialect=dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            parts.append(str(CreateIndex(index).compile(dialect=dialect)))
+    parts += SEARCH_INDEX_DDL + VERSION_TRIGGERS_DDL + STATS_TRIGGERS_DDL + CHANGE_TRIGGERS_DDL
+    # user_version é um inteiro de 32 bits com sinal; 0 é o valor de um banco novo
+    return zlib.crc32('\n'.join(parts).encode('utf-8')) & 0x7fffffff or 1
+
+
+def ensure_schema(engine, tables=None, note_ids=(0, NOTE_ID_SPAN), create=True):
+    """Executa init_schema apenas se o banco não estiver na versão atual do esquema
+
+    Usada na abertura dos bancos em cada processo: com o esquema em dia custa
+    uma leitura de PRAGMA, em vez de todo o DDL de init_schema.
+
+    Args:
+        create: False apenas avisa, no log, que o esquema está desatualizado
+
+    Returns:
+        True se o esquema já estava (ou ficou) atualizado
+    """
+    with engine.connect() as conn:
+        current = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    if current == schema_version(tables, note_ids):
+        return True
+    if not create:
+        logger.warning("Esquema do banco desatualizado; execute 'flask init-db' ou 'flask migrate'")
+        return False
+    init_schema(engine, tables=tables, note_ids=note_ids)
+    return True
@@ -0,0 +1,151 @@
+import html
+import re
+
+from sqlalchemy import text
+
+
+# índice FTS5 com conteúdo externo: o texto fica apenas na tabela notes e o
+# índice guarda só os tokens, mantidos em sincronia pelos triggers abaixo. O
+# conteúdo pode estar comprimido, por isso o índice lê as notas pela view
+# notes_text e os triggers descomprimem com rpg_decompress()
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIEW IF NOT EXISTS notes_text AS
+    SELECT id, title, rpg_decompress(content) AS content FROM notes
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+        title, content,
+        content='notes_text', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, rpg_decompress(new.content));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, rpg_decompress(old.content));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF title, content ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, rpg_decompress(old.content));
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, rpg_decompress(new.content));
+    END
+    """,
+]
+
+SEARCH_TRIGGERS = ('notes_fts_ai', 'notes_fts_ad', 'notes_fts_au')
+
+# peso do título em relação ao conteúdo no ranking bm25
+TITLE_WEIGHT = 4.0
+CONTENT_WEIGHT = 1.0
+
+SEARCH_SQL = """
+    SELECT n.id, n.title, c.name AS campaign_name, n.created_at,
+           highlight(notes_fts, 0, :open, :close) AS title_highlight,
+           snippet(notes_fts, 1, :open, :close, '…', :snippet_tokens) AS snippet,
+           bm25(notes_fts, :title_weight, :content_weight) AS rank
+    FROM notes_fts
+    JOIN notes n ON n.id = notes_fts.rowid
+    JOIN campaigns c ON c.id = n.campaign_id
+    WHERE notes_fts MATCH :match
+    {campaign_filter}
+    ORDER BY rank
+    LIMIT :limit
+"""
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# delimitadores internos passados ao highlight()/snippet(): o texto da nota é
+# escapado para HTML e só depois eles viram as marcas, de modo que o conteúdo
+# gravado pelo usuário nunca chega ao cliente como HTML
+_OPEN_SENTINEL = '\x02'
+_CLOSE_SENTINEL = '\x03'
+
+
+def create_search_index(engine):
+    """Cria (ou atualiza) o índice FTS5 e seus triggers, populando-o quando necessário"""
+    with engine.begin() as conn:
+        current = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")
+        ).scalar()
+        # índices antigos liam a tabela notes diretamente, sem descomprimir
+        outdated = current is not None and 'notes_text' not in current
+        if outdated:
+            conn.execute(text("DROP TABLE notes_fts"))
+        # recriados a cada inicialização para acompanhar a definição atual
+        for name in SEARCH_TRIGGERS:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        for ddl in SEARCH_INDEX_DDL:
+            conn.execute(text(ddl))
+        if current is None or outdated:
+            conn.execute(text("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')"))
+
+
+def rebuild_search_index(engine):
+    """Reconstrói o índice a partir da tabela notes (backfill de bancos existentes)"""
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')"))
+
+
+def build_match_expression(q):
+    """Converte o texto digitado pelo usuário em uma expressão MATCH segura
+
+    Cada palavra vira uma frase entre aspas, de modo que operadores e aspas
+    soltas não geram erro de sintaxe; as palavras são combinadas com AND e a
+    última aceita prefixo para permitir busca enquanto se digita.
+    """
+    tokens = _TOKEN_RE.findall(q)
+    if not tokens:
+        return None
+    terms = ['"%s"' % token for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def escape_highlight(value, open_mark='<mark>', close_mark='</mark>'):
+    """Escapa para HTML um trecho de highlight()/snippet() e troca os delimitadores pelas marcas"""
+    if value is None:
+        return None
+    return html.escape(value).replace(_OPEN_SENTINEL, open_mark).replace(_CLOSE_SENTINEL, close_mark)
+
+
+def search_notes(session, q, campaign_name=None, limit=20, snippet_tokens=16,
+                 open_mark='<mark>', close_mark='</mark>'):
+    """Busca notas pelo título e conteúdo, ordenadas por relevância
+
+    title_highlight e snippet vêm escapados para HTML, com os termos
+    encontrados entre open_mark e close_mark.
+    """
+    match = build_match_expression(q)
+    if match is None:
+        return []
+
+    params = {
+        'match': match,
+        'limit': limit,
+        'open': _OPEN_SENTINEL,
+        'close': _CLOSE_SENTINEL,
+        'snippet_tokens': snippet_tokens,
+        'title_weight': TITLE_WEIGHT,
+        'content_weight': CONTENT_WEIGHT,
+    }
+    campaign_filter = ''
+    if campaign_name is not None:
+        campaign_filter = 'AND c.name = :campaign_name'
+        params['campaign_name'] = campaign_name
+
+    sql = text(SEARCH_SQL.format(campaign_filter=campaign_filter))
+    hits = []
+    for row in session.execute(sql, params).mappings():
+        hit = dict(row)
+        hit['title_highlight'] = escape_highlight(hit['title_highlight'], open_mark, close_mark)
+        hit['snippet'] = escape_highlight(hit['snippet'], open_mark, close_mark)
+        hits.append(hit)
+    return hits
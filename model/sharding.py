@@ -0,0 +1,567 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from sqlalchemy import Column, Integer, ForeignKey, event, select, text
+from sqlalchemy.orm import sessionmaker
+
+from model.base import Base
+from model.campaign import Campaign
+from model.engine import create_engines
+from model.group_commit import GroupCommitWriter, WriterClosedError, run_in_transaction
+from model.notes import NOTE_ID_SPAN
+from model.migrations import MIGRATION_BATCH_SIZE, MigrationError, needs_campaign_fk_migration
+from model.schema import ensure_schema, init_schema
+from model.stats import CampaignStats
+
+
+SHARD_FILE_RE = re.compile(r'^shard-(\d{4})\.sqlite3$')
+
+
+class CampaignShard(Base):
+    """
+    Diretório de shards - em qual arquivo ficam as notas de cada campanha.
+    Campanhas sem linha aqui continuam no banco principal.
+    """
+    __tablename__ = 'campaign_shards'
+
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), primary_key=True)
+    shard = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<CampaignShard {self.campaign_id}: {self.shard}>'
+
+
+def note_id_range(shard):
+    """Faixa exclusiva (low, high) dos ids de notas do shard, acima da do banco principal"""
+    return (shard + 1) * NOTE_ID_SPAN, (shard + 2) * NOTE_ID_SPAN
+
+
+def shard_file(shard_dir, shard):
+    return os.path.join(shard_dir, f'shard-{shard:04d}.sqlite3')
+
+
+class Database:
+    """Engines, fábricas de sessão e função de escrita de um arquivo SQLite
+
+    Um banco descartado do cache de shards é aposentado por retire(): ele só
+    é fechado quando a última conexão em uso (de uma requisição que o obteve
+    antes do descarte) volta ao pool. Um banco fechado recusa novas escritas
+    com WriterClosedError.
+    """
+
+    def __init__(self, db_file, profile, number=None):
+        self.number = number
+        self.engine, self.read_engine = create_engines(db_file, profile)
+        self.Session = sessionmaker(bind=self.engine)
+        self.ReadSession = sessionmaker(bind=self.read_engine)
+        self.closed = False
+        self._retired = False
+        self._in_use = 0
+        self._state_lock = threading.Lock()
+        for engine in (self.engine, self.read_engine):
+            event.listen(engine, 'checkout', self._checkout)
+            event.listen(engine, 'checkin', self._checkin)
+
+        # write(work) executa work(session) e faz o commit; com o group commit
+        # ligado as escritas concorrentes compartilham a transação
+        write_factory = sessionmaker(bind=self.engine, expire_on_commit=False)
+        if profile['group_commit']:
+            self.writer = GroupCommitWriter(
+                write_factory,
+                max_rows=profile['group_commit_max_rows'],
+                max_delay=profile['group_commit_max_delay_ms'] / 1000,
+                timeout=profile['group_commit_timeout_ms'] / 1000,
+            )
+            self._write = self.writer.submit
+        else:
+            self.writer = None
+            self._write = partial(run_in_transaction, write_factory)
+
+    def write(self, work):
+        """Executa work(session) e faz o commit
+
+        Raises:
+            WriterClosedError: se o banco já foi fechado; work não é executada
+        """
+        if self.closed:
+            raise WriterClosedError(f"O banco {self._label()} foi fechado")
+        return self._write(work)
+
+    def retire(self):
+        """Fecha o banco assim que nenhuma conexão dele estiver em uso"""
+        with self._state_lock:
+            self._retired = True
+            idle = self._in_use == 0
+        if idle:
+            self.close()
+
+    def close(self):
+        with self._state_lock:
+            if self.closed:
+                return
+            self.closed = True
+        if self.writer is not None:
+            self.writer.stop()
+        self.engine.dispose()
+        self.read_engine.dispose()
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._state_lock:
+            self._in_use += 1
+
+    def _checkin(self, dbapi_connection, connection_record):
+        with self._state_lock:
+            self._in_use -= 1
+            idle = self._retired and not self._in_use and not self.closed
+        if idle:
+            # fora da thread que devolveu a conexão, que pode ser a do group
+            # commit, à espera da qual close() ficaria parado
+            threading.Thread(target=self.close, name='rpg-shard-close', daemon=True).start()
+
+    def _label(self):
+        return 'principal' if self.number is None else f'do shard {self.number}'
+
+
+def _init_shard(engine, shard, force=False):
+    """Cria ou atualiza o esquema de um shard, sem o diretório, com a sua faixa de ids de notas"""
+    tables = [table for table in Base.metadata.sorted_tables if table is not CampaignShard.__table__]
+    (init_schema if force else ensure_schema)(engine, tables=tables, note_ids=note_id_range(shard))
+
+
+class ShardRouter:
+    """Distribui as notas das campanhas em arquivos SQLite separados
+
+    O SQLite admite um único escritor por arquivo; com as notas de cada
+    campanha em um shard, escritas em campanhas de shards diferentes não
+    disputam o mesmo lock. O banco principal guarda as campanhas e o
+    diretório campaign_shards; cada shard guarda uma cópia das suas
+    campanhas (para joins, versões, estatísticas e busca) e as notas delas.
+
+    Novas campanhas vão para o shard id % count e a escolha fica gravada no
+    diretório, de modo que mudar a quantidade de shards não move campanhas
+    existentes. Os shards são abertos sob demanda e mantidos em um cache LRU
+    de até max_open arquivos abertos.
+
+    Com count = 0 não há shards: todas as operações usam o banco principal.
+
+    Nenhum banco é aberto na criação do roteador: o principal é aberto por
+    open_directory() no primeiro uso e, como engines, pools e a thread do
+    group commit não sobrevivem a um fork, um processo filho descarta os
+    bancos herdados e abre os seus.
+    """
+
+    def __init__(self, open_directory, shard_dir, count, profile, max_open=64):
+        self.open_directory = open_directory
+        self.shard_dir = shard_dir
+        self.count = count
+        self.profile = profile
+        self.max_open = max_open
+        self._directory = None
+        self._pid = os.getpid()
+        self._open = OrderedDict()
+        self._initialized = set()
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.known = set(range(count))
+        if count and os.path.isdir(shard_dir):
+            for name in os.listdir(shard_dir):
+                match = SHARD_FILE_RE.match(name)
+                if match:
+                    self.known.add(int(match.group(1)))
+
+    @property
+    def enabled(self):
+        return self.count > 0
+
+    def _after_fork(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._directory = None
+            self._open = OrderedDict()
+
+    @property
+    def directory(self):
+        """Banco principal do processo atual, aberto sob demanda"""
+        self._after_fork()
+        if self._directory is None:
+            with self._lock:
+                if self._directory is None:
+                    database = self.open_directory()
+                    for listener in self._listeners:
+                        listener(database)
+                    self._directory = database
+        return self._directory
+
+    def add_listener(self, listener):
+        """Chama listener(database) para cada banco aberto, atual ou futuro, inclusive o principal"""
+        self._after_fork()
+        with self._lock:
+            if listener in self._listeners:
+                return
+            self._listeners.append(listener)
+            databases = [db for db in (self._directory, *self._open.values()) if db is not None]
+        for database in databases:
+            listener(database)
+
+    def get(self, shard=None):
+        """Banco do shard informado (None para o banco principal), aberto sob demanda"""
+        if shard is None:
+            return self.directory
+        self._after_fork()
+        with self._lock:
+            database = self._open.get(shard)
+            if database is not None:
+                self._open.move_to_end(shard)
+                return database
+
+            os.makedirs(self.shard_dir, exist_ok=True)
+            database = Database(shard_file(self.shard_dir, shard), self.profile, number=shard)
+            if shard not in self._initialized:
+                _init_shard(database.engine, shard)
+                self._initialized.add(shard)
+            for listener in self._listeners:
+                listener(database)
+            self._open[shard] = database
+            self.known.add(shard)
+
+            evicted = []
+            while len(self._open) > self.max_open:
+                evicted.append(self._open.popitem(last=False)[1])
+        # fora do lock: fechar espera o group commit, e requisições que ainda
+        # usam um banco descartado o mantêm aberto até devolverem as conexões
+        for old in evicted:
+            old.retire()
+        return database
+
+    def shards(self):
+        """Bancos com notas a consultar em leituras que atravessam os shards
+
+        Inclui o banco principal (None), que guarda as notas das campanhas
+        ainda não migradas.
+        """
+        if not self.enabled:
+            return [None]
+        with self._lock:
+            return [None, *sorted(self.known)]
+
+    def databases(self):
+        """Todos os bancos com notas, abertos, para os comandos de manutenção"""
+        return [self.get(shard) for shard in self.shards()]
+
+    def locate(self, name=None, campaign_id=None):
+        """Shard das notas da campanha, pelo nome ou pelo id
+
+        Returns:
+            Número do shard, ou None para o banco principal (sem shards, campanha
+            inexistente ou ainda não migrada)
+        """
+        if not self.enabled:
+            return None
+        session = self.directory.ReadSession()
+        try:
+            return session.scalar(self.locate_statement(name, campaign_id))
+        finally:
+            session.close()
+
+    def locate_statement(self, name=None, campaign_id=None):
+        """SELECT do shard de uma campanha no banco principal (usado também pelo modo ASGI)"""
+        statement = select(CampaignShard.shard).select_from(Campaign).outerjoin(
+            CampaignShard, CampaignShard.campaign_id == Campaign.id
+        )
+        if campaign_id is not None:
+            return statement.where(Campaign.id == campaign_id)
+        return statement.where(Campaign.name == name).order_by(Campaign.id).limit(1)
+
+    def locate_many(self, campaign_ids):
+        """Mapa id -> shard das campanhas (ausentes ficam no banco principal)"""
+        if not self.enabled or not campaign_ids:
+            return {}
+        session = self.directory.ReadSession()
+        try:
+            return dict(session.execute(
+                select(CampaignShard.campaign_id, CampaignShard.shard)
+                .where(CampaignShard.campaign_id.in_(campaign_ids))
+            ).all())
+        finally:
+            session.close()
+
+    def register(self, session, campaign_id):
+        """Grava o shard de uma campanha nova, na transação da sessão do banco principal"""
+        if self.enabled:
+            session.add(CampaignShard(campaign_id=campaign_id, shard=campaign_id % self.count))
+
+    def sync_campaign(self, campaign_id, session=None):
+        """Copia nome, descrição e data da campanha para o seu shard
+
+        Com session (de escrita no banco principal) a cópia é lida dela, com
+        as linhas ainda não confirmadas, e deve ser feita antes do commit: se
+        a cópia falhar a campanha é desfeita junto, em vez de ficar no
+        diretório sem a sua cópia no shard.
+
+        Returns:
+            True se a campanha tem shard e foi copiada para ele
+        """
+        if not self.enabled:
+            return False
+        if session is not None:
+            return self._sync_campaign(session.connection(), campaign_id)
+        with self.directory.read_engine.connect() as conn:
+            return self._sync_campaign(conn, campaign_id)
+
+    def _sync_campaign(self, conn, campaign_id):
+        row = conn.execute(text(
+            "SELECT c.id, c.name, c.description, c.created_at, s.shard FROM campaigns c "
+            "JOIN campaign_shards s ON s.campaign_id = c.id WHERE c.id = :id"
+        ), {'id': campaign_id}).mappings().first()
+        if row is None:
+            return False
+        _upsert_campaign(self.get(row['shard']).engine, row)
+        return True
+
+    def campaign_stats(self, campaign_ids):
+        """Estatísticas das campanhas, lidas de cada shard
+
+        Returns:
+            Mapa id -> linha de campaign_stats (campanhas sem notas ficam de fora)
+        """
+        by_shard = {}
+        located = self.locate_many(campaign_ids)
+        for campaign_id in campaign_ids:
+            by_shard.setdefault(located.get(campaign_id), []).append(campaign_id)
+        stats = {}
+        for shard, ids in by_shard.items():
+            session = self.get(shard).ReadSession()
+            try:
+                rows = session.query(CampaignStats).filter(CampaignStats.campaign_id.in_(ids)).all()
+                stats.update((row.campaign_id, row) for row in rows)
+            finally:
+                session.close()
+        return stats
+
+    def writer_stats(self):
+        """Totais de group commit somados entre os bancos abertos"""
+        with self._lock:
+            databases = [db for db in (self._directory, *self._open.values()) if db is not None]
+        writers = [db.writer for db in databases if db.writer is not None]
+        totals = {'batches': 0, 'writes': 0, 'failed': 0, 'timeouts': 0, 'largest_batch': 0}
+        for writer in writers:
+            for key, value in writer.stats().items():
+                totals[key] = max(totals[key], value) if key == 'largest_batch' else totals[key] + value
+        return totals
+
+    def close(self):
+        with self._lock:
+            databases, self._open = list(self._open.values()), OrderedDict()
+        for database in databases:
+            database.close()
+
+
+# sessões de leitura compartilhadas no contexto atual, por shard (POST /batch)
+_shared_sessions = ContextVar('rpg_shared_read_sessions', default=None)
+
+
+class _SharedSession:
+    """Sessão de leitura compartilhada; os handlers a fecham como de costume,
+    mas ela só é fechada ao final de shared_read_sessions"""
+
+    def __init__(self, session):
+        self._session = session
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def shared_read_sessions():
+    """Faz ReadSession devolver uma única sessão por banco até o fim do bloco
+
+    As leituras do bloco reutilizam a mesma conexão e, enquanto a transação
+    da sessão não termina, enxergam o mesmo snapshot do banco. Para ver
+    escritas feitas no meio do bloco, encerre a transação com rollback().
+
+    Yields:
+        Dicionário shard -> sessão compartilhada, preenchido sob demanda
+    """
+    sessions = {}
+    token = _shared_sessions.set(sessions)
+    try:
+        yield sessions
+    finally:
+        _shared_sessions.reset(token)
+        for session in sessions.values():
+            session._session.close()
+
+
+class RoutedSessionFactory:
+    """Fábrica de sessões que escolhe o banco pelo shard
+
+    Session() e ReadSession() continuam abrindo sessões no banco principal;
+    Session(shard=n) abre no shard n, como devolvido por ShardRouter.locate.
+    Dentro de shared_read_sessions, ReadSession devolve a sessão compartilhada
+    do banco.
+    """
+
+    def __init__(self, router, kind):
+        self.router = router
+        self.kind = kind
+
+    def __call__(self, shard=None, **kwargs):
+        shared = _shared_sessions.get() if self.kind == 'ReadSession' and not kwargs else None
+        if shared is None:
+            return getattr(self.router.get(shard), self.kind)(**kwargs)
+        session = shared.get(shard)
+        if session is None:
+            session = shared[shard] = _SharedSession(self.router.get(shard).ReadSession())
+        return session
+
+
+_NOTE_COLUMNS = 'id, campaign_id, title, excerpt, content, created_at, updated_at'
+
+
+def _upsert_campaign(engine, row):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO campaigns (id, name, description, created_at) "
+            "VALUES (:id, :name, :description, :created_at) "
+            "ON CONFLICT(id) DO UPDATE SET name = excluded.name, description = excluded.description"
+        ), {key: row[key] for key in ('id', 'name', 'description', 'created_at')})
+
+
+def _move_notes(source, target, campaign_id, batch_size, progress=None, moved=0):
+    """Move as notas da campanha entre dois bancos (Database) em transações curtas
+
+    O conteúdo é copiado na forma gravada (sem descomprimir) e os ids são
+    preservados; cada lote é gravado no destino antes de ser apagado na
+    origem, então uma interrupção pode ser retomada sem perda.
+    """
+    while True:
+        with source.read_engine.connect() as conn:
+            rows = conn.execute(text(
+                f"SELECT {_NOTE_COLUMNS} FROM notes WHERE campaign_id = :campaign_id ORDER BY id LIMIT :limit"
+            ), {'campaign_id': campaign_id, 'limit': batch_size}).mappings().all()
+        if not rows:
+            return moved
+        with target.engine.begin() as conn:
+            conn.execute(text(
+                f"INSERT OR IGNORE INTO notes ({_NOTE_COLUMNS}) "
+                "VALUES (:id, :campaign_id, :title, :excerpt, :content, :created_at, :updated_at)"
+            ), [dict(row) for row in rows])
+        with source.engine.begin() as conn:
+            conn.execute(text("DELETE FROM notes WHERE id = :id"), [{'id': row['id']} for row in rows])
+        moved += len(rows)
+        if progress:
+            progress(campaign_id, moved)
+
+
+def _copy_import_checkpoint(source_db, target_db, campaign_id):
+    """Leva para o novo banco o registro de importação da campanha, se houver"""
+    with source_db.read_engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT * FROM campaign_imports WHERE campaign_id = :id"), {'id': campaign_id}
+        ).mappings().first()
+    if row is None:
+        return
+    with target_db.engine.begin() as conn:
+        conn.execute(text(
+            "INSERT OR REPLACE INTO campaign_imports "
+            "(campaign_id, export_id, last_created_at, last_source_id, imported, completed_at) "
+            "VALUES (:campaign_id, :export_id, :last_created_at, :last_source_id, :imported, :completed_at)"
+        ), dict(row))
+
+
+def _relocate(router, campaign_id, source, target, batch_size, progress=None):
+    directory = router.directory
+    with directory.read_engine.connect() as conn:
+        row = conn.execute(
+            text("SELECT id, name, description, created_at FROM campaigns WHERE id = :id"), {'id': campaign_id}
+        ).mappings().first()
+    if row is None:
+        raise MigrationError(f"Campanha {campaign_id} não encontrada.")
+
+    source_db = router.get(source)
+    target_db = router.get(target)
+    _upsert_campaign(target_db.engine, row)
+    _copy_import_checkpoint(source_db, target_db, campaign_id)
+    moved = _move_notes(source_db, target_db, campaign_id, batch_size, progress)
+
+    with directory.engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO campaign_shards (campaign_id, shard) VALUES (:campaign_id, :shard) "
+            "ON CONFLICT(campaign_id) DO UPDATE SET shard = excluded.shard"
+        ), {'campaign_id': campaign_id, 'shard': target})
+
+    # notas gravadas na origem enquanto o diretório ainda apontava para ela
+    moved = _move_notes(source_db, target_db, campaign_id, batch_size, progress, moved)
+
+    if source is not None:
+        with source_db.engine.begin() as conn:
+            for table in ('campaign_imports', 'campaign_note_versions', 'campaign_stats', 'campaigns'):
+                key = 'id' if table == 'campaigns' else 'campaign_id'
+                conn.execute(text(f"DELETE FROM {table} WHERE {key} = :id"), {'id': campaign_id})
+    return moved
+
+
+def move_campaign(router, campaign_id, target, batch_size=MIGRATION_BATCH_SIZE, progress=None):
+    """Move as notas de uma campanha para outro shard (rebalanceamento)
+
+    Returns:
+        Quantidade de notas movidas
+    """
+    if not router.enabled:
+        raise MigrationError("Sharding desligado; defina RPG_DB_SHARDS.")
+    source = router.locate(campaign_id=campaign_id)
+    if source == target:
+        return 0
+    return _relocate(router, campaign_id, source, target, batch_size, progress)
+
+
+def migrate_schemas(router):
+    """Cria ou atualiza tabelas, índices e triggers do banco principal e de todos os shards conhecidos
+
+    Returns:
+        Quantidade de bancos atualizados
+    """
+    init_schema(router.directory.engine)
+    shards = router.shards()[1:]
+    for shard in shards:
+        _init_shard(router.get(shard).engine, shard, force=True)
+    return 1 + len(shards)
+
+
+def migrate_to_shards(router, batch_size=MIGRATION_BATCH_SIZE, progress=None):
+    """Move as notas do banco principal para os shards de suas campanhas
+
+    Campanhas sem linha no diretório recebem o shard id % count. Pode ser
+    interrompida e executada de novo; cada campanha passa a ser lida do seu
+    shard assim que o diretório é atualizado.
+
+    Returns:
+        Tupla (campanhas migradas, notas movidas)
+    """
+    if not router.enabled:
+        raise MigrationError("Sharding desligado; defina RPG_DB_SHARDS.")
+    directory = router.directory
+    if needs_campaign_fk_migration(directory.engine):
+        raise MigrationError("Execute 'flask migrate-campaign-fk' antes de distribuir as notas.")
+
+    with directory.read_engine.connect() as conn:
+        pending = conn.execute(text(
+            "SELECT c.id, s.shard FROM campaigns c LEFT JOIN campaign_shards s ON s.campaign_id = c.id "
+            "WHERE s.campaign_id IS NULL OR EXISTS (SELECT 1 FROM notes n WHERE n.campaign_id = c.id) "
+            "ORDER BY c.id"
+        )).all()
+
+    moved = 0
+    for campaign_id, shard in pending:
+        target = shard if shard is not None else campaign_id % router.count
+        moved += _relocate(router, campaign_id, None, target, batch_size, progress)
+    return len(pending), moved
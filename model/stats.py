@@ -0,0 +1,124 @@
+from sqlalchemy import Column, Integer, Float, ForeignKey, text
+from model.base import Base
+
+
+class CampaignStats(Base):
+    """
+    Estatísticas das notas de cada campanha (quantidade, bytes de conteúdo e
+    última atividade), mantidas por triggers a cada inclusão, alteração ou
+    exclusão de nota para que a listagem de campanhas não precise agregar notes
+    """
+    __tablename__ = 'campaign_stats'
+
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), primary_key=True)
+    note_count = Column(Integer, nullable=False, default=0)
+    # bytes do conteúdo original em UTF-8 (antes da compressão)
+    content_bytes = Column(Integer, nullable=False, default=0)
+    # epoch em segundos (UTC) da última alteração em uma nota da campanha
+    last_activity_at = Column(Float, nullable=True)
+
+    def __repr__(self):
+        return f'<CampaignStats {self.campaign_id}: {self.note_count} notas>'
+
+
+_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+
+_ADD = f"""
+    INSERT INTO campaign_stats(campaign_id, note_count, content_bytes, last_activity_at)
+    VALUES (new.campaign_id, 1, rpg_content_size(new.content), {_NOW})
+    ON CONFLICT(campaign_id) DO UPDATE
+    SET note_count = note_count + 1,
+        content_bytes = content_bytes + excluded.content_bytes,
+        last_activity_at = excluded.last_activity_at;
+"""
+
+_REMOVE = f"""
+    UPDATE campaign_stats
+    SET note_count = note_count - 1,
+        content_bytes = content_bytes - rpg_content_size(old.content),
+        last_activity_at = {_NOW}
+    WHERE campaign_id = old.campaign_id;
+"""
+
+STATS_TRIGGERS = ('notes_stats_ai', 'notes_stats_ad', 'notes_stats_au')
+
+STATS_TRIGGERS_DDL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_stats_ai AFTER INSERT ON notes BEGIN
+        {_ADD}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_stats_ad AFTER DELETE ON notes BEGIN
+        {_REMOVE}
+    END
+    """,
+    # remove da campanha antiga e soma na nova (que pode ser a mesma)
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_stats_au AFTER UPDATE ON notes BEGIN
+        {_REMOVE}
+        {_ADD}
+    END
+    """,
+]
+
+# estatísticas recalculadas a partir de notes; a última atividade passa a ser
+# a data da alteração mais recente entre as notas existentes
+_EXPECTED_SQL = """
+    SELECT campaign_id,
+           count(*) AS note_count,
+           coalesce(sum(rpg_content_size(content)), 0) AS content_bytes,
+           (julianday(max(updated_at)) - 2440587.5) * 86400.0 AS last_activity_at
+    FROM notes
+    GROUP BY campaign_id
+"""
+
+_CHECK_SQL = f"""
+    SELECT ids.campaign_id,
+           coalesce(e.note_count, 0) AS expected_count, coalesce(s.note_count, 0) AS actual_count,
+           coalesce(e.content_bytes, 0) AS expected_bytes, coalesce(s.content_bytes, 0) AS actual_bytes
+    FROM (SELECT campaign_id FROM notes UNION SELECT campaign_id FROM campaign_stats) ids
+    LEFT JOIN ({_EXPECTED_SQL}) e ON e.campaign_id = ids.campaign_id
+    LEFT JOIN campaign_stats s ON s.campaign_id = ids.campaign_id
+    WHERE coalesce(e.note_count, 0) != coalesce(s.note_count, 0)
+       OR coalesce(e.content_bytes, 0) != coalesce(s.content_bytes, 0)
+    ORDER BY 1
+"""
+
+
+def _rebuild(conn):
+    conn.execute(text("DELETE FROM campaign_stats"))
+    conn.execute(text(
+        f"INSERT INTO campaign_stats(campaign_id, note_count, content_bytes, last_activity_at) {_EXPECTED_SQL}"
+    ))
+
+
+def rebuild_campaign_stats(engine):
+    """Recalcula campaign_stats inteira a partir da tabela notes"""
+    with engine.begin() as conn:
+        _rebuild(conn)
+
+
+def check_campaign_stats(engine):
+    """Compara campaign_stats com os valores recalculados a partir de notes
+
+    Returns:
+        Lista das campanhas divergentes (vazia se tudo confere)
+    """
+    with engine.connect() as conn:
+        return [dict(row) for row in conn.execute(text(_CHECK_SQL)).mappings()]
+
+
+def create_stats_triggers(engine):
+    """Cria os triggers de campaign_stats, populando a tabela na primeira vez"""
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'notes_stats_ai'")
+        ).first()
+        # recriados a cada inicialização para acompanhar a definição atual
+        for name in STATS_TRIGGERS:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        for ddl in STATS_TRIGGERS_DDL:
+            conn.execute(text(ddl))
+        if not exists:
+            _rebuild(conn)
@@ -0,0 +1,62 @@
+from sqlalchemy import Column, Integer, Float, ForeignKey, text
+from model.base import Base
+
+
+class CampaignNoteVersion(Base):
+    """
+    Versão das notas de cada campanha - incrementada por triggers a cada
+    inclusão, alteração ou exclusão de nota e a cada renomeação da campanha
+    (as listagens trazem o nome), serve de validador barato para
+    ETag/Last-Modified e para o cache de listagens
+    """
+    __tablename__ = 'campaign_note_versions'
+
+    campaign_id = Column(Integer, ForeignKey('campaigns.id'), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    # epoch em segundos (UTC) da última alteração, gravado pelos triggers
+    changed_at = Column(Float, nullable=False)
+
+    def __repr__(self):
+        return f'<CampaignNoteVersion {self.campaign_id}: v{self.version}>'
+
+
+_BUMP = """
+    INSERT INTO campaign_note_versions(campaign_id, version, changed_at)
+    VALUES ({campaign}, 1, (julianday('now') - 2440587.5) * 86400.0)
+    ON CONFLICT(campaign_id) DO UPDATE
+    SET version = version + 1, changed_at = excluded.changed_at;
+"""
+
+VERSION_TRIGGERS_DDL = [
+    # na mesma transação da renomeação, de modo que nenhum worker sirva do
+    # cache uma página com o nome antigo
+    f"""
+    CREATE TRIGGER IF NOT EXISTS campaigns_version_au AFTER UPDATE OF name ON campaigns
+    WHEN new.name IS NOT old.name BEGIN
+        {_BUMP.format(campaign='new.id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_version_ai AFTER INSERT ON notes BEGIN
+        {_BUMP.format(campaign='new.campaign_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_version_ad AFTER DELETE ON notes BEGIN
+        {_BUMP.format(campaign='old.campaign_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS notes_version_au AFTER UPDATE ON notes BEGIN
+        {_BUMP.format(campaign='new.campaign_id')}
+        {_BUMP.format(campaign='old.campaign_id')}
+    END
+    """,
+]
+
+
+def create_version_triggers(engine):
+    """Cria os triggers que mantêm campaign_note_versions atualizada"""
+    with engine.begin() as conn:
+        for ddl in VERSION_TRIGGERS_DDL:
+            conn.execute(text(ddl))
@@ -0,0 +1,66 @@
+"""Cache em disco da especificação OpenAPI gerada pelo flask-openapi3
+
+Gerar a especificação percorre todas as rotas e converte cada modelo pydantic
+em JSON Schema. O resultado só muda quando mudam as rotas (app.py), os
+schemas (schemas/*.py) ou as versões do flask-openapi3/pydantic, então fica
+gravado em um arquivo cujo nome leva um hash desses insumos: um deploy com
+código novo nunca lê a especificação antiga.
+
+Com o arquivo presente a aplicação é criada sem registrar a documentação de
+cada rota (doc_ui=False no blueprint) e GET /openapi/openapi.json devolve o
+conteúdo do arquivo.
+"""
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+import flask_openapi3
+import pydantic
+
+from logger import logger
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# diretório do cache; vazio desliga o cache e a especificação é gerada sempre
+OPENAPI_CACHE_DIR = os.environ.get('RPG_OPENAPI_CACHE_DIR', os.path.join(ROOT, '.cache'))
+
+
+def spec_hash():
+    """Hash dos arquivos e versões de bibliotecas que determinam a especificação"""
+    digest = hashlib.sha1()
+    digest.update(f'flask-openapi3 {flask_openapi3.__version__} pydantic {pydantic.VERSION}'.encode())
+    for path in [os.path.join(ROOT, 'app.py')] + sorted(glob.glob(os.path.join(ROOT, 'schemas', '*.py'))):
+        digest.update(os.path.relpath(path, ROOT).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def cache_path():
+    """Arquivo da especificação para o código atual, ou None com o cache desligado"""
+    if not OPENAPI_CACHE_DIR:
+        return None
+    return os.path.join(OPENAPI_CACHE_DIR, f'openapi-{spec_hash()[:16]}.json')
+
+
+def load(path):
+    """Especificação gravada em path, ou None se ausente ou ilegível"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store(path, spec):
+    """Grava a especificação de forma atômica; falhas (ex.: disco somente leitura) só geram aviso"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(spec, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("Não foi possível gravar o cache da especificação OpenAPI em %s: %s", path, e)
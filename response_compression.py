@@ -0,0 +1,100 @@
+import gzip
+import os
+import zlib
+
+from flask import request
+
+
+# liga/desliga a compressão das respostas (RPG_GZIP=0 desliga)
+GZIP_ENABLED = os.environ.get('RPG_GZIP', '1').lower() not in ('0', 'false', 'off', 'no')
+# nível 1: ~95% da redução de bytes do nível 6 com ~1/5 da CPU (benchmarks/response_compression.py)
+GZIP_LEVEL = int(os.environ.get('RPG_GZIP_LEVEL', 1))
+# respostas menores que isso não compensam o custo de comprimir
+GZIP_MIN_BYTES = int(os.environ.get('RPG_GZIP_MIN_BYTES', 1024))
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/msgpack',
+    'application/cbor',
+    'application/javascript',
+}
+# text/* que não é comprimido: cada evento SSE precisa chegar ao cliente na
+# hora, e proxies costumam acumular respostas gzip antes de repassá-las
+UNCOMPRESSED_TEXT_MIMETYPES = {'text/event-stream'}
+
+
+def _compressible(response):
+    if response.status_code < 200 or response.status_code >= 300 or response.status_code in (204, 206):
+        return False
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    mimetype = response.mimetype or ''
+    if mimetype in UNCOMPRESSED_TEXT_MIMETYPES:
+        return False
+    return mimetype in COMPRESSIBLE_MIMETYPES or mimetype.startswith('text/')
+
+
+def _weaken_etag(response):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def iter_gzip(chunks, level=GZIP_LEVEL):
+    """Comprime um corpo transmitido em streaming, pedaço a pedaço
+
+    Cada pedaço é descarregado com Z_SYNC_FLUSH, de modo que o cliente pode
+    descomprimir e processar o que já recebeu sem esperar o fim da resposta.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if chunk:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def init_compression(app, level=GZIP_LEVEL, min_bytes=GZIP_MIN_BYTES):
+    """Comprime com gzip as respostas dos clientes que enviam Accept-Encoding: gzip
+
+    Respostas comuns são comprimidas inteiras, a partir de min_bytes; respostas
+    em streaming são comprimidas à medida que são geradas. Para quem aceita
+    gzip o ETag passa a ser fraco, pois o corpo enviado muda, mas continua
+    valendo para If-None-Match; ele é fraco também nas respostas pequenas
+    demais para comprimir e no 304, para que todas tragam o mesmo valor.
+    """
+    if not GZIP_ENABLED:
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if response.status_code == 304:
+            # o 304 repete o ETag da resposta completa (as rotas com ETag só
+            # respondem tipos comprimíveis)
+            response.vary.add('Accept-Encoding')
+            if request.accept_encodings['gzip'] > 0:
+                _weaken_etag(response)
+            return response
+        if not _compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        if request.accept_encodings['gzip'] <= 0:
+            return response
+        _weaken_etag(response)
+
+        if response.is_streamed:
+            # o gerador original (e a sessão que ele mantém aberta) continua
+            # sendo fechado ao fim da resposta, mesmo se o cliente desconectar
+            original = response.response
+            response.response = iter_gzip(response.iter_encoded(), level)
+            if hasattr(original, 'close'):
+                response.call_on_close(original.close)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_bytes:
+                return response
+            response.set_data(gzip.compress(data, level, mtime=0))
+
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
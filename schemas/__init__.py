@@ -3,10 +3,32 @@ from .campaign import (
     CampaignCreate,
     CampaignUpdate,
     CampaignInDB,
+    CampaignWithStats,
 )
 from .note import (
     NoteCreate,
     NoteResponse,
-    NotesSearchResponse
+    NoteSparseResponse,
+    NotesQuery,
+    NotesSearchResponse,
+    NoteChangesQuery,
+    NoteChangesResponse,
+    NoteSearchQuery,
+    NoteSearchHit,
+    NoteSearchResponse,
+    NoteBulkResult,
+    NoteBulkResponse
 )
 
+from .archive import (
+    CampaignExportQuery,
+    CampaignImportQuery,
+    CampaignImportResponse
+)
+
+from .batch import (
+    BatchItem,
+    BatchRequest,
+    BatchItemResponse,
+    BatchResponse
+)
@@ -0,0 +1,91 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import Annotated, Literal, Optional, Union
+from datetime import datetime
+
+from .note import CreatedRangeQuery, naive_utc
+
+
+# versão do formato dos arquivos de exportação; importações de outra versão são recusadas
+ARCHIVE_FORMAT = 1
+
+
+class ArchiveCampaign(BaseModel):
+    """Campanha exportada, sem o id, que é atribuído pela instância que importa"""
+    name: str = Field(..., min_length=1, max_length=100, description="Nome da campanha")
+    description: Optional[str] = Field(None, description="Descrição da campanha")
+    created_at: datetime = Field(..., description="Data de criação da campanha na origem")
+
+    @field_validator('created_at')
+    @classmethod
+    def to_utc(cls, value):
+        return naive_utc(value)
+
+
+class ArchiveHeader(BaseModel):
+    """Primeira linha do arquivo"""
+    type: Literal['campaign'] = 'campaign'
+    format: int = Field(ARCHIVE_FORMAT, description="Versão do formato do arquivo")
+    export_id: str = Field(..., min_length=1, max_length=64, description="Identificador único desta exportação")
+    exported_at: datetime
+    campaign: ArchiveCampaign
+
+
+class ArchiveNote(BaseModel):
+    """Uma nota, em ordem (created_at, id) da origem"""
+    type: Literal['note'] = 'note'
+    id: int = Field(..., description="ID da nota na origem; a nota importada recebe um novo ID")
+    title: Optional[str] = None
+    content: str
+    created_at: datetime
+    updated_at: datetime
+
+    @field_validator('created_at', 'updated_at')
+    @classmethod
+    def to_utc(cls, value):
+        return naive_utc(value)
+
+    class Config:
+        from_attributes = True
+
+
+class ArchiveEnd(BaseModel):
+    """Última linha do arquivo; sem ela a importação fica incompleta e pode ser retomada"""
+    type: Literal['end'] = 'end'
+    notes: int = Field(..., ge=0, description="Quantidade de notas do arquivo")
+
+
+ArchiveRecord = Annotated[Union[ArchiveHeader, ArchiveNote, ArchiveEnd], Field(discriminator='type')]
+
+
+class CampaignExportQuery(CreatedRangeQuery):
+    """Parâmetros da exportação: o intervalo [from, to) restringe as notas exportadas"""
+
+
+class CampaignImportQuery(BaseModel):
+    name: Optional[str] = Field(
+        None, min_length=1, max_length=100,
+        description="Nome da campanha criada na importação (padrão: o nome gravado no arquivo)"
+    )
+
+
+class CampaignImportResponse(BaseModel):
+    campaign_id: int = Field(..., description="ID da campanha nesta instância")
+    campaign_name: str
+    export_id: str = Field(..., description="Exportação importada, registrada para retomadas")
+    imported: int = Field(..., description="Notas gravadas nesta requisição")
+    skipped: int = Field(..., description="Notas do arquivo já importadas por requisições anteriores")
+    total: int = Field(..., description="Notas desta exportação gravadas até agora na campanha")
+    completed: bool = Field(..., description="O arquivo foi lido até o fim e todas as notas foram gravadas")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "campaign_id": 7,
+                "campaign_name": "Campanha Épica",
+                "export_id": "3f0c9a51d2b84e0e9b8f3f3a6c1d2e4f",
+                "imported": 1500,
+                "skipped": 0,
+                "total": 1500,
+                "completed": True
+            }
+        }
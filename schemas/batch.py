@@ -0,0 +1,35 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional
+
+
+class BatchItem(BaseModel):
+    """Uma requisição da API executada dentro de POST /batch"""
+    method: Literal['GET', 'POST', 'PATCH', 'PUT', 'DELETE'] = Field('GET', description="Método HTTP")
+    path: str = Field(..., min_length=1, description="Caminho com query string, ex.: /campaigns/1?include=stats")
+    body: Optional[Any] = Field(None, description="Corpo JSON da requisição")
+    headers: Optional[Dict[str, str]] = Field(None, description="Headers adicionais da requisição")
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., min_length=1, max_length=50, description="Requisições, executadas em ordem")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "requests": [
+                    {"method": "GET", "path": "/campaigns/1"},
+                    {"method": "GET", "path": "/campaigns/Campanha%20%C3%89pica/notes?limit=20"},
+                    {"method": "GET", "path": "/notes?ids=3,5,8"}
+                ]
+            }
+        }
+
+
+class BatchItemResponse(BaseModel):
+    status: int = Field(..., description="Status HTTP da requisição")
+    headers: Dict[str, str] = Field(..., description="Headers da resposta")
+    body: Optional[Any] = Field(None, description="Corpo da resposta (JSON decodificado)")
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchItemResponse] = Field(..., description="Uma resposta por requisição, na ordem enviada")
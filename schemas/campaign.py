@@ -1,7 +1,9 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal, Optional
 from datetime import datetime
 
+from .note import MULTI_GET_MAX_IDS, split_comma_list
+
 class CampaignBase(BaseModel):
     """Define como uma nova campanha deve ser representada"""
     name: str = Field(..., example="Campanha Épica", max_length=100, description="Nome da campanha")
@@ -24,10 +26,42 @@ class CampaignInDB(CampaignBase):
     class Config:
         from_attributes = True
 
+class CampaignWithStats(CampaignInDB):
+    """Schema de campanha acompanhada das estatísticas de suas notas"""
+    note_count: int = Field(..., example=42, description="Quantidade de notas da campanha")
+    content_bytes: int = Field(..., example=18250, description="Tamanho total do conteúdo das notas, em bytes (UTF-8)")
+    last_activity_at: Optional[datetime] = Field(
+        None, example="2023-09-17T12:00:00Z", description="Última inclusão, alteração ou exclusão de nota"
+    )
+
 class CampaignListResponse(BaseModel):
     """Schema para resposta em lista de campanhas"""
     campaigns: List["CampaignInDB"] = Field(..., description="Lista de campanhas")
 
+class CampaignIncludeQuery(BaseModel):
+    """Schema para os dados opcionais incluídos na resposta de campanhas"""
+    include: Optional[Literal['stats']] = Field(
+        None, description="Use 'stats' para incluir quantidade de notas, bytes de conteúdo e última atividade"
+    )
+
+class CampaignListQuery(CampaignIncludeQuery):
+    """Schema para parâmetros de query da listagem de campanhas"""
+    stream: bool = Field(
+        False,
+        description="Transmite a lista como um array JSON incremental (use Accept: application/x-ndjson para NDJSON)"
+    )
+    ids: Optional[List[int]] = Field(
+        None, max_length=MULTI_GET_MAX_IDS,
+        description="Busca as campanhas com estes IDs, separados por vírgula, em uma única consulta; "
+                    "a resposta segue a ordem pedida e os IDs não encontrados vêm no header X-Missing-Ids"
+    )
+
+    @field_validator('ids', mode='before')
+    @classmethod
+    def split_ids(cls, value):
+        """Aceita tanto ids=1,2 quanto ids=1&ids=2"""
+        return split_comma_list(value)
+
 class CampaignPath(BaseModel):
     """Schema para parâmetros de path da campanha"""
     campaign_id: int = Field(..., description="ID da campanha", example=1)
\ No newline at end of file
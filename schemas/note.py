@@ -1,6 +1,19 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, Field, field_validator, model_validator
+from typing import Optional, List, Literal, Union
+from datetime import datetime, timezone
+
+
+# IDs aceitos por consulta em ids= (multi-get)
+MULTI_GET_MAX_IDS = 1000
+
+
+def split_comma_list(value):
+    """Normaliza um parâmetro de lista enviado como a,b ou repetido (x=a&x=b)"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [value]
+    return [name.strip() for item in value for name in str(item).split(',') if name.strip()]
 
 
 class NoteCreate(BaseModel):
@@ -30,21 +43,200 @@ class NoteResponse(BaseModel):
         from_attributes = True
 
 
+# campos que podem ser pedidos em fields=
+NoteField = Literal['id', 'title', 'excerpt', 'content', 'campaign_name', 'created_at', 'updated_at']
+
+
+class NoteSparseResponse(BaseModel):
+    """Nota com apenas os campos pedidos em fields= (e a prévia, com excerpt=N)"""
+    id: Optional[int] = None
+    title: Optional[str] = None
+    excerpt: Optional[str] = Field(None, description="Início do conteúdo, com até excerpt caracteres")
+    content: Optional[str] = None
+    campaign_name: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class CampaignNamePath(BaseModel):
     campaign_name: str = Field(..., description="Nome da campanha")
 
 
+def naive_utc(value):
+    """As datas são gravadas em UTC, sem fuso; datas com fuso são convertidas"""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class CreatedRangeQuery(BaseModel):
+    """Intervalo [from, to) de created_at das notas"""
+    from_: Optional[datetime] = Field(
+        None, alias='from',
+        description="Apenas notas criadas a partir desta data/hora (inclusive), ISO 8601; sem fuso, UTC"
+    )
+    to: Optional[datetime] = Field(
+        None, description="Apenas notas criadas antes desta data/hora (exclusive), ISO 8601; sem fuso, UTC"
+    )
+
+    @field_validator('from_', 'to')
+    @classmethod
+    def to_utc(cls, value):
+        return naive_utc(value)
+
+    @model_validator(mode='after')
+    def check_range(self):
+        if self.from_ is not None and self.to is not None and self.to <= self.from_:
+            raise ValueError("'to' deve ser posterior a 'from'")
+        return self
+
+
+class NotesQuery(CreatedRangeQuery):
+    limit: Optional[int] = Field(
+        None, ge=1, le=1000,
+        description="Quantidade máxima de notas por página (padrão 100; em streaming, sem limite se omitido)"
+    )
+    cursor: Optional[str] = Field(None, description="Cursor opaco retornado em next_cursor pela página anterior")
+    stream: bool = Field(
+        False,
+        description="Transmite a coleção inteira a partir do cursor como um array JSON incremental, "
+                    "no mesmo formato da resposta paginada (use Accept: application/x-ndjson para NDJSON)"
+    )
+    fields: Optional[List[NoteField]] = Field(
+        None, min_length=1,
+        description="Campos de cada nota a retornar, separados por vírgula (ex.: id,title,created_at); "
+                    "as demais colunas não são lidas do banco"
+    )
+    # limite igual ao tamanho de notes.excerpt (EXCERPT_LENGTH em model/notes.py)
+    excerpt: Optional[int] = Field(
+        None, ge=1, le=200,
+        description="Retorna a prévia gravada do conteúdo (campo excerpt) com até N caracteres, "
+                    "em vez do conteúdo completo; não pode ser combinado com content em fields"
+    )
+
+    ids: Optional[List[int]] = Field(
+        None, max_length=MULTI_GET_MAX_IDS,
+        description="Busca as notas com estes IDs, separados por vírgula, em uma única consulta; "
+                    "a resposta segue a ordem pedida, sem paginação, e os IDs não encontrados "
+                    "vêm no header X-Missing-Ids"
+    )
+
+    @field_validator('fields', 'ids', mode='before')
+    @classmethod
+    def split_fields(cls, value):
+        """Aceita tanto fields=a,b quanto fields=a&fields=b (idem para ids)"""
+        return split_comma_list(value)
+
+    @model_validator(mode='after')
+    def check_excerpt(self):
+        if self.excerpt is not None and self.fields and 'content' in self.fields:
+            raise ValueError("excerpt substitui o conteúdo; não peça content em fields junto com excerpt")
+        return self
+
+
 class NotesSearchResponse(BaseModel):
-    notes: List[NoteResponse]
-    total: int
+    notes: List[Union[NoteResponse, NoteSparseResponse]] = Field(
+        ..., description="Notas completas ou, com fields/excerpt, apenas os campos pedidos"
+    )
+    total: int = Field(..., description="Quantidade de notas retornadas nesta página")
     campaign_name: Optional[str] = None
+    next_cursor: Optional[str] = Field(None, description="Cursor da próxima página; ausente na última página")
     
     class Config:
         json_schema_extra = {
             "example": {
                 "notes": [],
                 "total": 0,
-                "campaign_name": "Campanha Épica"
+                "campaign_name": "Campanha Épica",
+                "next_cursor": None
             }
         }
 
+
+
+class NoteChangesQuery(BaseModel):
+    since: Optional[str] = Field(
+        None, description="Cursor retornado em cursor pela resposta anterior; ausente, o feed começa do início"
+    )
+    campaign_name: Optional[str] = Field(None, description="Restringe o feed a uma campanha")
+    limit: int = Field(100, ge=1, le=1000, description="Quantidade máxima de notas por resposta")
+    wait: float = Field(
+        0, ge=0, le=60,
+        description="Long-poll: segundos a aguardar por alterações quando não houver nenhuma desde o cursor"
+    )
+
+
+class NoteChangesResponse(BaseModel):
+    notes: List[NoteResponse] = Field(..., description="Notas criadas ou alteradas desde o cursor, no estado atual")
+    total: int = Field(..., description="Quantidade de notas retornadas nesta resposta")
+    cursor: str = Field(..., description="Cursor a enviar em since na próxima consulta")
+    has_more: bool = Field(..., description="Há mais alterações a buscar imediatamente com o novo cursor")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "notes": [],
+                "total": 0,
+                "cursor": "eyJtYWluIjo0Mn0",
+                "has_more": False
+            }
+        }
+
+
+class NoteSearchQuery(BaseModel):
+    q: str = Field(..., min_length=1, description="Termos de busca no título e no conteúdo das notas")
+    campaign_name: Optional[str] = Field(None, description="Restringe a busca a uma campanha")
+    limit: int = Field(20, ge=1, le=100, description="Quantidade máxima de resultados")
+
+
+class NoteSearchHit(BaseModel):
+    id: int
+    title: Optional[str] = None
+    campaign_name: str
+    created_at: datetime
+    title_highlight: Optional[str] = Field(None, description="Título escapado para HTML, com os termos encontrados em <mark>")
+    snippet: Optional[str] = Field(None, description="Trecho do conteúdo escapado para HTML, com os termos encontrados em <mark>")
+    rank: float = Field(..., description="Relevância bm25 (menor é mais relevante)")
+
+
+class NoteSearchResponse(BaseModel):
+    hits: List[NoteSearchHit]
+    total: int
+    q: str
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "hits": [],
+                "total": 0,
+                "q": "dragão"
+            }
+        }
+
+
+class NoteBulkResult(BaseModel):
+    index: int = Field(..., description="Posição da nota no corpo enviado")
+    status: str = Field(..., description="'created' ou 'error'")
+    id: Optional[int] = Field(None, description="ID da nota criada")
+    error: Optional[str] = Field(None, description="Motivo da rejeição da nota")
+
+
+class NoteBulkResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[NoteBulkResult]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "created": 1,
+                "failed": 1,
+                "results": [
+                    {"index": 0, "status": "created", "id": 42},
+                    {"index": 1, "status": "error", "error": "Campanha 'Inexistente' não encontrada."}
+                ]
+            }
+        }
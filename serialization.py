@@ -0,0 +1,270 @@
+import json
+from typing import List
+
+from flask import Response, request
+from pydantic import TypeAdapter
+from sqlalchemy import func
+
+from metrics import timed_serialization
+from model import Campaign, CampaignStats, Notes
+from schemas.campaign import CampaignInDB, CampaignWithStats
+from schemas.note import NoteResponse, NoteSparseResponse, NotesSearchResponse, NoteChangesResponse
+
+try:
+    import msgpack
+except ImportError:  # dependência opcional
+    msgpack = None
+try:
+    import cbor2
+except ImportError:  # dependência opcional
+    cbor2 = None
+
+
+JSON_MIMETYPE = 'application/json'
+# codificações binárias das mesmas estruturas, negociadas pelo header Accept
+# para os clientes internos; os valores são os mesmos do JSON (datas em texto
+# ISO 8601), apenas a codificação muda
+BINARY_ENCODERS = {}
+if msgpack is not None:
+    BINARY_ENCODERS['application/msgpack'] = msgpack.packb
+    BINARY_ENCODERS['application/x-msgpack'] = msgpack.packb
+if cbor2 is not None:
+    BINARY_ENCODERS['application/cbor'] = cbor2.dumps
+
+# colunas selecionadas pelas listagens; as linhas chegam como tuplas, sem
+# passar pelo identity map nem instanciar objetos do ORM. As queries de notas
+# devem fazer join com Campaign para obter o nome da campanha.
+NOTE_COLUMNS = (
+    Notes.id, Notes.title, Notes.content, Campaign.name.label('campaign_name'), Notes.created_at, Notes.updated_at
+)
+# colunas de cada campo que pode ser pedido em fields=, na ordem da resposta
+NOTE_FIELD_COLUMNS = {
+    'id': Notes.id,
+    'title': Notes.title,
+    'excerpt': Notes.excerpt,
+    'content': Notes.content,
+    'campaign_name': Campaign.name.label('campaign_name'),
+    'created_at': Notes.created_at,
+    'updated_at': Notes.updated_at,
+}
+CAMPAIGN_COLUMNS = (Campaign.id, Campaign.name, Campaign.description, Campaign.created_at)
+# com include=stats; as queries devem fazer outerjoin com CampaignStats
+CAMPAIGN_STATS_COLUMNS = CAMPAIGN_COLUMNS + (
+    func.coalesce(CampaignStats.note_count, 0).label('note_count'),
+    func.coalesce(CampaignStats.content_bytes, 0).label('content_bytes'),
+    CampaignStats.last_activity_at,
+)
+
+# adaptadores compilados uma única vez; validam a lista inteira em uma
+# chamada e serializam direto para bytes JSON
+_note_adapter = TypeAdapter(NoteResponse)
+_notes_adapter = TypeAdapter(List[NoteResponse])
+_sparse_note_adapter = TypeAdapter(NoteSparseResponse)
+_sparse_notes_adapter = TypeAdapter(List[NoteSparseResponse])
+_notes_page_adapter = TypeAdapter(NotesSearchResponse)
+_note_changes_adapter = TypeAdapter(NoteChangesResponse)
+_campaigns_adapter = TypeAdapter(List[CampaignInDB])
+_campaign_adapter = TypeAdapter(CampaignInDB)
+_campaigns_stats_adapter = TypeAdapter(List[CampaignWithStats])
+_campaign_stats_adapter = TypeAdapter(CampaignWithStats)
+
+
+def negotiate_mimetype(accept=None):
+    """Codificação do corpo da resposta conforme o header Accept da requisição
+
+    JSON é o padrão, inclusive para Accept ausente ou */*; as codificações
+    binárias só são usadas quando a biblioteca correspondente está instalada.
+
+    Args:
+        accept: MIMEAccept já interpretado; por padrão o da requisição Flask corrente
+    """
+    accept = request.accept_mimetypes if accept is None else accept
+    best = accept.best_match((JSON_MIMETYPE,) + tuple(BINARY_ENCODERS))
+    if best in BINARY_ENCODERS:
+        # application/x-msgpack é respondido com o nome registrado
+        return 'application/msgpack' if best == 'application/x-msgpack' else best
+    return JSON_MIMETYPE
+
+
+def _encode(adapter, value, mimetype, include=None):
+    """Serializa value com o adaptador em JSON ou na codificação binária pedida"""
+    if mimetype == JSON_MIMETYPE:
+        return adapter.dump_json(value, include=include)
+    return BINARY_ENCODERS[mimetype](adapter.dump_python(value, mode='json', include=include))
+
+
+def note_fields(fields=None, excerpt=None):
+    """Campos de nota a devolver, ou None para a nota completa
+
+    Com excerpt=N a prévia substitui o conteúdo completo: sem fields, a nota
+    vem sem content; com fields, excerpt é acrescentado aos campos pedidos
+    (NotesQuery recusa content junto com excerpt).
+    """
+    if fields is None and excerpt is None:
+        return None
+    if fields is None:
+        fields = [name for name in NOTE_FIELD_COLUMNS if name != 'content']
+    elif excerpt is not None:
+        fields = [*fields, 'excerpt']
+    return tuple(name for name in NOTE_FIELD_COLUMNS if name in fields)
+
+
+def select_notes(query_factory, fields=None, excerpt=None):
+    """Query das listagens de notas lendo só as colunas dos campos pedidos
+
+    id e created_at são sempre lidos, pois formam o cursor de paginação; o
+    join com campaigns só é feito quando o nome da campanha é pedido.
+
+    Args:
+        query_factory: session.query ou select
+        fields: resultado de note_fields
+        excerpt: tamanho máximo da prévia, cortada no próprio SQL
+    """
+    if fields is None:
+        return query_factory(*NOTE_COLUMNS).select_from(Notes).join(Campaign, Campaign.id == Notes.campaign_id)
+
+    columns = []
+    for name, column in NOTE_FIELD_COLUMNS.items():
+        if name not in fields and name not in ('id', 'created_at'):
+            continue
+        if name == 'excerpt' and excerpt is not None:
+            column = func.substr(Notes.excerpt, 1, excerpt).label('excerpt')
+        columns.append(column)
+    query = query_factory(*columns).select_from(Notes)
+    if 'campaign_name' in fields:
+        query = query.join(Campaign, Campaign.id == Notes.campaign_id)
+    return query
+
+
+def _note_adapters(fields):
+    if fields is None:
+        return _note_adapter, _notes_adapter, None
+    return _sparse_note_adapter, _sparse_notes_adapter, set(fields)
+
+
+def _campaign_adapters(stats):
+    if stats:
+        return _campaign_stats_adapter, _campaigns_stats_adapter
+    return _campaign_adapter, _campaigns_adapter
+
+
+@timed_serialization
+def notes_page_json(rows, campaign_name=None, next_cursor=None, fields=None, mimetype=JSON_MIMETYPE):
+    """Serializa uma página de notas no formato de NotesSearchResponse
+
+    Cada linha é validada uma única vez (a partir dos atributos da tupla) e o
+    envelope é montado sem nova validação da lista. Com fields, cada nota
+    traz apenas os campos pedidos. mimetype escolhe entre JSON e uma das
+    codificações binárias de BINARY_ENCODERS.
+    """
+    if fields is not None:
+        notes = _sparse_notes_adapter.validate_python(rows, from_attributes=True)
+        include = {'__all__': set(fields)}
+        if mimetype != JSON_MIMETYPE:
+            return BINARY_ENCODERS[mimetype]({
+                'notes': _sparse_notes_adapter.dump_python(notes, mode='json', include=include),
+                'total': len(notes),
+                'campaign_name': campaign_name,
+                'next_cursor': next_cursor,
+            })
+        body = _sparse_notes_adapter.dump_json(notes, include=include)
+        return b'{"notes":%s,"total":%d,"campaign_name":%s,"next_cursor":%s}' % (
+            body, len(notes),
+            json.dumps(campaign_name, ensure_ascii=False).encode('utf-8'),
+            json.dumps(next_cursor).encode('utf-8'),
+        )
+
+    notes = _notes_adapter.validate_python(rows, from_attributes=True)
+    page = NotesSearchResponse.model_construct(
+        notes=notes,
+        total=len(notes),
+        campaign_name=campaign_name,
+        next_cursor=next_cursor
+    )
+    return _encode(_notes_page_adapter, page, mimetype)
+
+
+@timed_serialization
+def note_changes_json(rows, cursor, has_more, mimetype=JSON_MIMETYPE):
+    """Serializa um lote do feed de alterações no formato de NoteChangesResponse"""
+    notes = _notes_adapter.validate_python(rows, from_attributes=True)
+    changes = NoteChangesResponse.model_construct(notes=notes, total=len(notes), cursor=cursor, has_more=has_more)
+    return _encode(_note_changes_adapter, changes, mimetype)
+
+
+@timed_serialization
+def campaigns_json(rows, stats=False, mimetype=JSON_MIMETYPE):
+    """Serializa uma lista de campanhas (com estatísticas, se stats)"""
+    _, adapter = _campaign_adapters(stats)
+    return _encode(adapter, adapter.validate_python(rows, from_attributes=True), mimetype)
+
+
+@timed_serialization
+def campaign_json(row, stats=False, mimetype=JSON_MIMETYPE):
+    """Serializa uma única campanha (com estatísticas, se stats)"""
+    adapter, _ = _campaign_adapters(stats)
+    return _encode(adapter, adapter.validate_python(row, from_attributes=True), mimetype)
+
+
+def _iter_items(partitions, item_adapter, list_adapter, fmt, counter, include=None):
+    """Serializa cada lote de linhas como itens de um array JSON ou linhas NDJSON"""
+    first = True
+    list_include = {'__all__': include} if include is not None else None
+    for rows in partitions:
+        items = list_adapter.validate_python(rows, from_attributes=True)
+        counter[0] += len(items)
+        if fmt == 'ndjson':
+            yield b''.join(item_adapter.dump_json(item, include=include) + b'\n' for item in items)
+        elif items:
+            # remove os colchetes do array do lote para emendá-lo aos anteriores
+            body = list_adapter.dump_json(items, include=list_include)[1:-1]
+            yield body if first else b',' + body
+            first = False
+
+
+def stream_notes(partitions, fmt, campaign_name=None, fields=None):
+    """Gera o corpo de uma listagem de notas de forma incremental
+
+    Em 'json' o corpo segue o formato de NotesSearchResponse, com total ao
+    final; em 'ndjson' cada nota ocupa uma linha.
+    """
+    counter = [0]
+    item_adapter, list_adapter, include = _note_adapters(fields)
+    if fmt == 'ndjson':
+        yield from _iter_items(partitions, item_adapter, list_adapter, fmt, counter, include)
+        return
+    yield b'{"notes":['
+    yield from _iter_items(partitions, item_adapter, list_adapter, fmt, counter, include)
+    yield b'],"total":%d,"campaign_name":%s,"next_cursor":null}' % (
+        counter[0], json.dumps(campaign_name, ensure_ascii=False).encode('utf-8')
+    )
+
+
+def stream_campaigns(partitions, fmt, stats=False):
+    """Gera o corpo de uma listagem de campanhas de forma incremental"""
+    counter = [0]
+    item_adapter, list_adapter = _campaign_adapters(stats)
+    if fmt == 'ndjson':
+        yield from _iter_items(partitions, item_adapter, list_adapter, fmt, counter)
+        return
+    yield b'['
+    yield from _iter_items(partitions, item_adapter, list_adapter, fmt, counter)
+    yield b']'
+
+
+def streaming_response(body, fmt):
+    """Resposta Flask transmitida a partir de um gerador de bytes"""
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(body, mimetype=mimetype)
+
+
+def json_response(body, status=200, mimetype=JSON_MIMETYPE):
+    """Resposta Flask a partir de bytes JSON (ou binários) já serializados"""
+    return Response(body, status=status, mimetype=mimetype)
+
+
+def negotiated_response(body, mimetype):
+    """Resposta de um corpo cuja codificação foi negociada pelo header Accept"""
+    response = json_response(body, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,205 @@
+import codecs
+import heapq
+import json
+from itertools import islice
+
+from flask import request
+
+
+# tamanho de cada leitura do corpo da requisição
+READ_SIZE = 64 * 1024
+
+# maior item aceito em um array JSON, em caracteres; acima disso o item é
+# recusado sem esperar o fim do corpo
+MAX_ITEM_SIZE = 1024 * 1024
+
+# linhas lidas do banco por vez nas respostas em streaming
+STREAM_BATCH_SIZE = 500
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/ndjson')
+
+
+class MalformedStreamError(ValueError):
+    """Corpo da requisição não pôde ser interpretado como JSON/NDJSON"""
+
+
+def iter_ndjson(stream):
+    """Percorre um corpo NDJSON linha a linha
+
+    Yields:
+        Tuplas (índice, objeto, erro); linhas inválidas geram um erro sem
+        interromper a leitura das seguintes. Linhas em branco são ignoradas.
+    """
+    index = 0
+    for raw_line in stream:
+        line = raw_line.strip()
+        if not line:
+            continue
+        try:
+            yield index, json.loads(line), None
+        except ValueError as e:
+            yield index, None, f"JSON inválido: {e}"
+        index += 1
+
+
+def iter_json_array(stream, read_size=READ_SIZE, max_item_size=MAX_ITEM_SIZE):
+    """Percorre os itens de um array JSON sem carregar o corpo inteiro na memória
+
+    Apenas o item sendo decodificado fica em buffer, de modo que o consumo de
+    memória depende do tamanho de cada item e não do array completo. Um item
+    que não se completa em max_item_size caracteres (grande demais ou com JSON
+    inválido no meio do corpo) interrompe a leitura.
+
+    Yields:
+        Tuplas (índice, objeto, None)
+
+    Raises:
+        MalformedStreamError: se o corpo não for um array JSON válido ou um
+            item passar de max_item_size
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        data = stream.read(read_size)
+        if not data:
+            eof = True
+            buf = buf[pos:] + utf8.decode(b'', final=True)
+        else:
+            buf = buf[pos:] + utf8.decode(data)
+        pos = 0
+
+    def next_char():
+        # avança sobre espaços em branco e retorna o próximo caractere significativo
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                return None
+            fill()
+
+    def pending_too_large(error=None):
+        # sem o limite, um item inválido no meio do corpo ficaria em buffer até o fim
+        if len(buf) - pos >= max_item_size:
+            raise MalformedStreamError(
+                f"Item {index} não termina em {max_item_size} caracteres (grande demais ou JSON inválido)"
+            ) from error
+
+    if next_char() != '[':
+        raise MalformedStreamError("O corpo deve ser um array JSON")
+    pos += 1
+
+    index = 0
+    expect_value = True
+    while True:
+        char = next_char()
+        if char is None:
+            raise MalformedStreamError("Array JSON incompleto")
+        if char == ']':
+            if expect_value and index > 0:
+                raise MalformedStreamError("Vírgula sobrando no array JSON")
+            pos += 1
+            break
+        if not expect_value:
+            if char != ',':
+                raise MalformedStreamError(f"Esperado ',' ou ']' na posição do item {index}")
+            pos += 1
+            expect_value = True
+            continue
+
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise MalformedStreamError(f"JSON inválido no item {index}: {e}") from e
+                pending_too_large(e)
+                fill()
+                continue
+            # um valor que termina exatamente no fim do buffer pode estar truncado
+            if end == len(buf) and not eof:
+                pending_too_large()
+                fill()
+                continue
+            break
+        pos = end
+        yield index, obj, None
+        index += 1
+        expect_value = False
+
+    if next_char() is not None:
+        raise MalformedStreamError("Conteúdo após o fim do array JSON")
+
+
+def stream_format(stream_flag, accept=None):
+    """Decide se a resposta da requisição corrente deve ser transmitida em streaming
+
+    Args:
+        accept: MIMEAccept já interpretado; por padrão o da requisição Flask corrente
+
+    Returns:
+        'ndjson' se o cliente aceita apenas NDJSON, 'json' se pediu stream=1
+        e None para a resposta comum, montada em memória
+    """
+    accept = request.accept_mimetypes if accept is None else accept
+    best = accept.best_match(('application/json',) + NDJSON_MIMETYPES)
+    if best in NDJSON_MIMETYPES:
+        return 'ndjson'
+    if stream_flag:
+        return 'json'
+    return None
+
+
+def iter_partitions(session_factory, statement, batch_size=STREAM_BATCH_SIZE):
+    """Executa o statement em uma sessão própria e entrega as linhas em lotes
+
+    A sessão é aberta apenas quando o primeiro lote é pedido e fechada ao
+    final (ou quando o cliente desconecta e o gerador é descartado), pois o
+    corpo em streaming é consumido depois que o handler já retornou.
+    """
+    session = session_factory()
+    try:
+        result = session.execute(statement, execution_options={'yield_per': batch_size})
+        yield from result.partitions()
+    finally:
+        session.close()
+
+
+def iter_merged_partitions(sources, key, limit=None, batch_size=STREAM_BATCH_SIZE):
+    """Intercala, em ordem, as linhas de vários statements já ordenados por key
+
+    Usada nas listagens que atravessam os shards: cada fonte é lida em lotes
+    na sua própria sessão e as linhas são reagrupadas em lotes de batch_size.
+
+    Args:
+        sources: pares (fábrica de sessão, statement ordenado por key)
+        key: função que extrai a chave de ordenação de uma linha
+        limit: total máximo de linhas, somando todas as fontes
+    """
+    if len(sources) == 1:
+        yield from iter_partitions(*sources[0], batch_size=batch_size)
+        return
+    streams = [
+        (row for rows in iter_partitions(session_factory, statement, batch_size) for row in rows)
+        for session_factory, statement in sources
+    ]
+    try:
+        batch = []
+        for row in islice(heapq.merge(*streams, key=key), limit):
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        # fecha as sessões de todas as fontes, mesmo se o cliente desconectar
+        for stream in streams:
+            stream.close()
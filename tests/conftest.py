@@ -0,0 +1,37 @@
+"""Configuração comum dos testes
+
+O banco, os logs e o cache da especificação OpenAPI ficam em um diretório
+temporário, definido antes de qualquer import de model/ ou app.py.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+import uuid
+
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix='rpg-tests-')
+os.environ['RPG_DB_DIR'] = os.path.join(_workdir, 'database')
+os.environ['RPG_OPENAPI_CACHE_DIR'] = ''
+os.environ.setdefault('RPG_LOG_LEVEL', 'WARNING')
+# logger.py grava em log/ relativo ao diretório corrente
+os.chdir(_workdir)
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def unique():
+    """Gera nomes únicos, já que o banco é compartilhado por todos os testes"""
+    return lambda prefix='Campanha': f'{prefix} {uuid.uuid4().hex[:8]}'
@@ -0,0 +1,46 @@
+"""Controle de admissão: o feed de alterações não ocupa vagas das rotas"""
+import importlib
+import threading
+
+from werkzeug.test import Client
+
+from admission import AdmissionControl, AdmissionMiddleware
+
+
+def _admitted_client(app, control):
+    app_module = importlib.import_module('app')
+    middleware = AdmissionMiddleware(app.wsgi_app, app.url_map, control, ('rpg',), app_module.ADMISSION_EXEMPT)
+    return Client(middleware)
+
+
+def test_long_poll_watchers_do_not_take_route_slots(app, client):
+    control = AdmissionControl(concurrency=1, max_queue=0, client_rate=0)
+    admitted = _admitted_client(app, control)
+    cursor = client.get('/notes/changes').json['cursor']
+
+    statuses = []
+
+    def watch():
+        response = admitted.get('/notes/changes', query_string={'since': cursor, 'wait': 1})
+        statuses.append(response.status_code)
+
+    watchers = [threading.Thread(target=watch) for _ in range(3)]
+    for watcher in watchers:
+        watcher.start()
+    for watcher in watchers:
+        watcher.join()
+
+    assert statuses == [200, 200, 200]
+    assert 'list_note_changes' not in [limiter.name for limiter in control.limiters()]
+
+
+def test_regular_routes_are_still_limited(app):
+    control = AdmissionControl(concurrency=1, max_queue=0, client_rate=0)
+    admitted = _admitted_client(app, control)
+    # uma resposta em streaming só libera a vaga ao ser fechada
+    held = admitted.get('/notes', query_string={'stream': 1})
+    try:
+        assert admitted.get('/notes').status_code == 503
+    finally:
+        held.close()
+    assert admitted.get('/notes').status_code == 200
@@ -0,0 +1,82 @@
+"""Rotas assíncronas do modo ASGI: métricas e controle de admissão como nas rotas Flask"""
+import asyncio
+
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('aiosqlite')
+pytest.importorskip('a2wsgi')
+
+import metrics
+from admission import AdmissionControl
+
+
+async def _get(app, path, query=''):
+    """Executa um GET na aplicação ASGI e devolve status, headers e corpo"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    headers = {key.decode().lower(): value.decode() for key, value in start['headers']}
+    return start['status'], headers, b''.join(m.get('body', b'') for m in messages[1:])
+
+
+def _requests(route):
+    _, _, count = metrics.request_duration._series.get(('GET', route, '200'), (None, 0.0, 0))
+    return count
+
+
+@pytest.fixture
+def asgi(client, unique):
+    # o banco principal precisa existir antes da primeira sessão assíncrona
+    assert client.post('/campaigns', json={'name': unique()}).status_code == 201
+    import asgi
+    return asgi
+
+
+def test_native_routes_are_measured(asgi):
+    before = _requests('/campaigns')
+
+    async def scenario():
+        try:
+            return await _get(asgi.app, '/campaigns')
+        finally:
+            await asgi.AsyncReadSession.dispose()
+
+    status, headers, _ = asyncio.run(scenario())
+    assert status == 200
+    assert 'db;dur=' in headers['server-timing']
+    assert _requests('/campaigns') == before + 1
+
+
+def test_native_routes_go_through_admission(asgi, monkeypatch):
+    control = AdmissionControl(concurrency=1, max_queue=0, client_rate=0)
+    monkeypatch.setattr(asgi, 'admission', control)
+    held = control.limiter('list_all_notes')
+    held.acquire()
+
+    async def scenario():
+        try:
+            rejected = await _get(asgi.app, '/notes')
+            control.release(held, 0.0)
+            admitted = await _get(asgi.app, '/notes')
+            return rejected, admitted
+        finally:
+            await asgi.AsyncReadSession.dispose()
+
+    (status, headers, _), (admitted, _, _) = asyncio.run(scenario())
+    assert status == 503
+    assert 'retry-after' in headers
+    assert admitted == 200
+    assert held.stats()['in_flight'] == 0
@@ -0,0 +1,32 @@
+"""Cache e validadores das listagens de notas após renomear a campanha"""
+import cache
+
+
+def test_rename_bumps_version_for_every_worker(client, unique, monkeypatch):
+    old, new = unique(), unique()
+    campaign_id = client.post('/campaigns', json={'name': old}).json['id']
+    client.post('/notes', json={'title': 'nota', 'content': 'conteúdo', 'campaign_name': old})
+    before = client.get(f'/campaigns/{old}/notes')
+    assert before.json['campaign_name'] == old
+
+    # outro worker não recebe a invalidação do cache deste processo
+    monkeypatch.setattr(cache.notes_cache, 'invalidate', lambda campaign_id: None)
+    response = client.patch(f'/campaigns/{campaign_id}', json={'name': new})
+    assert response.status_code == 200
+
+    after = client.get(f'/campaigns/{new}/notes')
+    assert after.status_code == 200
+    assert after.json['campaign_name'] == new
+    assert after.headers['ETag'] != before.headers['ETag']
+    assert after.last_modified >= before.last_modified
+
+
+def test_description_change_keeps_version(client, unique):
+    name = unique()
+    campaign_id = client.post('/campaigns', json={'name': name}).json['id']
+    client.post('/notes', json={'title': 'nota', 'content': 'conteúdo', 'campaign_name': name})
+    etag = client.get(f'/campaigns/{name}/notes').headers['ETag']
+
+    assert client.patch(f'/campaigns/{campaign_id}', json={'description': 'nova'}).status_code == 200
+
+    assert client.get(f'/campaigns/{name}/notes', headers={'If-None-Match': etag}).status_code == 304
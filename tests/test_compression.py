@@ -0,0 +1,53 @@
+"""gzip das respostas: ETag igual no 200 e no 304, SSE sem compressão"""
+import pytest
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+@pytest.fixture
+def campaign(client, unique):
+    def create(notes):
+        name = unique()
+        assert client.post('/campaigns', json={'name': name}).status_code == 201
+        for i in range(notes):
+            response = client.post('/notes', json={'title': f'nota {i}', 'content': 'x' * 200, 'campaign_name': name})
+            assert response.status_code == 201
+        return name
+    return create
+
+
+@pytest.mark.parametrize('notes, compressed', [(0, False), (20, True)])
+def test_etag_is_weak_on_200_and_304_when_gzip_is_accepted(client, campaign, notes, compressed):
+    url = f'/campaigns/{campaign(notes)}/notes'
+    response = client.get(url, headers=GZIP)
+    assert response.status_code == 200
+    assert (response.headers.get('Content-Encoding') == 'gzip') is compressed
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+
+    revalidated = client.get(url, headers={**GZIP, 'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == etag
+    assert 'Accept-Encoding' in revalidated.headers['Vary']
+
+
+def test_etag_stays_strong_without_gzip(client, campaign):
+    url = f'/campaigns/{campaign(20)}/notes'
+    response = client.get(url)
+    assert 'Content-Encoding' not in response.headers
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+
+    revalidated = client.get(url, headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers['ETag'] == etag
+
+
+def test_event_stream_is_not_compressed(client):
+    response = client.get('/notes/changes', headers={**GZIP, 'Accept': 'text/event-stream'}, buffered=False)
+    try:
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        assert 'Content-Encoding' not in response.headers
+    finally:
+        response.close()
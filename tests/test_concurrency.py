@@ -0,0 +1,67 @@
+"""Leituras e escritas concorrentes sobre o banco temporário em WAL
+
+Versão reduzida de benchmarks/sqlite_concurrency.py: nenhuma requisição pode
+falhar com 500 ou com "database is locked".
+"""
+import threading
+
+from model import shards
+
+WRITERS = 4
+READERS = 4
+REQUESTS = 25
+
+
+def test_database_uses_wal(app):
+    with shards.directory.engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar().lower() == 'wal'
+
+
+def test_mixed_readers_and_writers(app, client, unique):
+    name = unique()
+    assert client.post('/campaigns', json={'name': name}).status_code == 201
+
+    errors = []
+    lock = threading.Lock()
+    start = threading.Barrier(WRITERS + READERS)
+
+    def record(kind, call):
+        try:
+            response = call()
+        except Exception as exc:  # exceções fora do tratamento da aplicação também contam
+            failure = (kind, None, repr(exc))
+        else:
+            if response.status_code < 400:
+                return
+            failure = (kind, response.status_code, response.get_data(as_text=True)[:200])
+        with lock:
+            errors.append(failure)
+
+    def writer(number):
+        local = app.test_client()
+        start.wait()
+        for i in range(REQUESTS):
+            record('write', lambda: local.post('/notes', json={
+                'title': f'w{number}-{i}', 'content': 'x' * 500, 'campaign_name': name
+            }))
+
+    def reader(number):
+        local = app.test_client()
+        start.wait()
+        for i in range(REQUESTS):
+            url = '/notes?limit=50' if i % 2 else f'/campaigns/{name}/notes?limit=50'
+            record('read', lambda: local.get(url))
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(WRITERS)]
+    threads += [threading.Thread(target=reader, args=(n,)) for n in range(READERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not [error for error in errors if 'locked' in error[2]]
+    assert errors == []
+
+    response = client.get(f'/campaigns/{name}/notes', query_string={'limit': 1000})
+    assert response.status_code == 200
+    assert len(response.json['notes']) == WRITERS * REQUESTS
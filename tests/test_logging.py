@@ -0,0 +1,30 @@
+"""Configuração de logging: os loggers da aplicação continuam emitindo"""
+import logging
+
+from sqlalchemy import create_engine
+
+from model.schema import ensure_schema
+
+
+def test_app_loggers_stay_enabled(app):
+    for name in ('model.schema', 'model.compression'):
+        logger = logging.getLogger(name)
+        assert not logger.disabled
+        assert logger.isEnabledFor(logging.WARNING)
+
+
+def test_outdated_schema_warning_is_emitted(app, tmp_path, caplog):
+    engine = create_engine(f"sqlite:///{tmp_path / 'outdated.db'}")
+    try:
+        with caplog.at_level(logging.WARNING, logger='model.schema'):
+            assert ensure_schema(engine, create=False) is False
+    finally:
+        engine.dispose()
+    assert any(
+        record.name == 'model.schema' and 'Esquema do banco desatualizado' in record.getMessage()
+        for record in caplog.records
+    )
+
+
+def test_third_party_loggers_are_silenced(app):
+    assert not logging.getLogger('sqlalchemy.orm.mapper.Mapper').isEnabledFor(logging.ERROR)
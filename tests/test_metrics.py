@@ -0,0 +1,86 @@
+"""Métricas por requisição em streaming, no group commit e com comandos que falham"""
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+import metrics
+from logger import request_id_var
+from model.group_commit import GroupCommitWriter
+
+NOTES_ROUTE = ('GET', '/campaigns/<string:campaign_name>/notes', '200')
+
+
+def _series(histogram, labels):
+    _, total, count = histogram._series.get(labels, (None, 0.0, 0))
+    return total, count
+
+
+def test_streamed_response_counts_sql_of_the_body(client, unique):
+    name = unique()
+    assert client.post('/campaigns', json={'name': name}).status_code == 201
+    for i in range(3):
+        client.post('/notes', json={'title': f'nota {i}', 'content': 'conteúdo', 'campaign_name': name})
+
+    queries_before, count_before = _series(metrics.sql_queries, NOTES_ROUTE)
+    response = client.get(f'/campaigns/{name}/notes', query_string={'stream': 1})
+    assert response.status_code == 200
+    assert len(response.json['notes']) == 3
+    # como o servidor WSGI, fecha o corpo ao fim da transmissão
+    response.close()
+    queries_after, count_after = _series(metrics.sql_queries, NOTES_ROUTE)
+
+    assert count_after == count_before + 1
+    # o header só vê o trabalho feito antes do corpo; o histograma, também o do corpo
+    header_queries = int(response.headers['Server-Timing'].split('desc="')[1].split(' ')[0])
+    assert queries_after - queries_before > header_queries
+
+
+def test_group_commit_runs_work_in_submitter_context(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (value INTEGER)"))
+    metrics.instrument_engine(engine)
+    writer = GroupCommitWriter(sessionmaker(bind=engine), timeout=5)
+
+    def work(session):
+        session.execute(text("INSERT INTO items (value) VALUES (1)"))
+        return request_id_var.get()
+
+    request_metrics = metrics.RequestMetrics()
+    metrics_token = metrics._current.set(request_metrics)
+    request_token = request_id_var.set('req-123')
+    try:
+        assert writer.submit(work) == 'req-123'
+    finally:
+        request_id_var.reset(request_token)
+        metrics._current.reset(metrics_token)
+        writer.stop()
+        engine.dispose()
+
+    assert request_metrics.sql_count >= 1
+    assert request_metrics.sql_time > 0
+
+
+def test_failed_statement_does_not_skew_later_timings(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'failed.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (value INTEGER PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO items (value) VALUES (1)"))
+    metrics.instrument_engine(engine)
+
+    request_metrics = metrics.RequestMetrics()
+    token = metrics._current.set(request_metrics)
+    try:
+        with engine.connect() as conn:
+            try:
+                conn.execute(text("INSERT INTO items (value) VALUES (1)"))
+            except IntegrityError:
+                conn.rollback()
+            conn.execute(text("SELECT value FROM items"))
+    finally:
+        metrics._current.reset(token)
+        engine.dispose()
+
+    # só o SELECT foi contado, com o próprio tempo
+    assert request_metrics.sql_count == 1
+    assert request_metrics.sql_time < 1
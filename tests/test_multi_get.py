@@ -0,0 +1,113 @@
+"""Multi-get (ids=) em uma única consulta e 404 por item em POST /batch"""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from model import shards
+
+
+MISSING_ID = 987654321
+
+
+@contextmanager
+def recorded_selects():
+    """Registra os SELECTs executados nas engines do banco principal"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append(statement)
+
+    engines = {shards.directory.engine, shards.directory.read_engine}
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def campaigns(client, unique):
+    ids = []
+    for _ in range(3):
+        response = client.post('/campaigns', json={'name': unique()})
+        assert response.status_code == 201
+        ids.append(response.json['id'])
+    return ids
+
+
+@pytest.fixture
+def notes(client, unique):
+    name = unique()
+    assert client.post('/campaigns', json={'name': name}).status_code == 201
+    ids = []
+    for i in range(4):
+        response = client.post('/notes', json={'title': f'nota {i}', 'content': f'conteúdo {i}', 'campaign_name': name})
+        assert response.status_code == 201
+        ids.append(response.json['id'])
+    return ids
+
+
+@pytest.mark.skipif(shards.enabled, reason="com shards as estatísticas vêm de uma consulta por shard")
+@pytest.mark.parametrize('include', [None, 'stats'])
+def test_campaigns_multi_get_is_one_select(client, campaigns, include):
+    first, second, third = campaigns
+    query = {'ids': f'{third},{first},{MISSING_ID},{third}'}
+    if include:
+        query['include'] = include
+    client.get('/campaigns', query_string={'ids': str(first)})  # abre o banco antes da contagem
+
+    with recorded_selects() as statements:
+        response = client.get('/campaigns', query_string=query)
+
+    assert response.status_code == 200
+    assert len(statements) == 1, statements
+    assert [c['id'] for c in response.json] == [third, first]
+    assert response.headers['X-Missing-Ids'] == str(MISSING_ID)
+    if include:
+        assert all('note_count' in c for c in response.json)
+
+
+@pytest.mark.skipif(shards.enabled, reason="com shards há uma consulta IN por shard")
+def test_notes_multi_get_is_one_select(client, notes):
+    query = {'ids': f'{notes[2]},{MISSING_ID},{notes[0]},{notes[3]}'}
+    client.get('/notes', query_string={'ids': str(notes[0])})
+
+    with recorded_selects() as statements:
+        response = client.get('/notes', query_string=query)
+
+    assert response.status_code == 200
+    assert len(statements) == 1, statements
+    assert [n['id'] for n in response.json['notes']] == [notes[2], notes[0], notes[3]]
+    assert response.headers['X-Missing-Ids'] == str(MISSING_ID)
+
+
+def test_multi_get_without_missing_ids_has_no_header(client, campaigns):
+    response = client.get('/campaigns', query_string={'ids': ','.join(map(str, campaigns))})
+    assert response.status_code == 200
+    assert 'X-Missing-Ids' not in response.headers
+
+
+def test_batch_reports_404_per_item_in_order(client, campaigns, notes, unique):
+    first = campaigns[0]
+    items = [
+        {'method': 'GET', 'path': f'/campaigns/{first}'},
+        {'method': 'GET', 'path': f'/campaigns/{MISSING_ID}'},
+        {'method': 'GET', 'path': f'/notes?ids={notes[1]},{MISSING_ID}'},
+        {'method': 'POST', 'path': '/notes', 'body': {'title': 't', 'content': 'c', 'campaign_name': unique('Inexistente')}},
+        {'method': 'GET', 'path': f'/campaigns?ids={first}'},
+    ]
+    response = client.post('/batch', json={'requests': items})
+
+    assert response.status_code == 200
+    results = response.json['responses']
+    assert [r['status'] for r in results] == [200, 404, 200, 404, 200]
+    assert results[0]['body']['id'] == first
+    assert 'message' in results[1]['body']
+    assert [n['id'] for n in results[2]['body']['notes']] == [notes[1]]
+    assert results[2]['headers']['X-Missing-Ids'] == str(MISSING_ID)
+    assert 'message' in results[3]['body']
+    assert [c['id'] for c in results[4]['body']] == [first]
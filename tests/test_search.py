@@ -0,0 +1,141 @@
+"""Busca textual (FTS5) comparada a uma varredura ingênua com LIKE"""
+import pytest
+from sqlalchemy import text
+
+from model import Notes, ReadSession, shards, write
+from model.search import search_notes
+
+
+NOTES = [
+    ("O dragão vermelho", "O grupo encontrou o dragão na caverna ao norte."),
+    ("Taverna", "Um bardo contou histórias sobre um dragao de gelo."),
+    ("Mapa antigo", "O mapa indica uma caverna escondida sob a cidade."),
+    ("Emboscada", "Goblins atacaram a caravana na estrada."),
+    ("Tesouro", "Moedas de ouro e uma espada élfica foram encontradas."),
+    ("Elfos", "Os elfos da floresta desconfiam do grupo."),
+]
+
+
+def _create_campaign(client, name, notes):
+    assert client.post('/campaigns', json={'name': name}).status_code == 201
+    ids = []
+    for title, content in notes:
+        response = client.post('/notes', json={'title': title, 'content': content, 'campaign_name': name})
+        assert response.status_code == 201
+        ids.append(response.json['id'])
+    return ids
+
+
+def _search_ids(q, campaign_name):
+    session = ReadSession(shard=shards.locate(name=campaign_name))
+    try:
+        return {hit['id'] for hit in search_notes(session, q, campaign_name=campaign_name, limit=100)}
+    finally:
+        session.close()
+
+
+def _like_ids(campaign_name, *variants):
+    """Notas da campanha cujo título ou conteúdo contém alguma das grafias (LIKE '%termo%')"""
+    conditions = ' OR '.join(
+        f"(t.title LIKE :p{i} OR t.content LIKE :p{i})" for i in range(len(variants))
+    )
+    params = {f'p{i}': f'%{variant}%' for i, variant in enumerate(variants)}
+    params['campaign_name'] = campaign_name
+    session = ReadSession(shard=shards.locate(name=campaign_name))
+    try:
+        rows = session.execute(text(
+            "SELECT t.id FROM notes_text t JOIN notes n ON n.id = t.id "
+            "JOIN campaigns c ON c.id = n.campaign_id "
+            f"WHERE c.name = :campaign_name AND ({conditions})"
+        ), params)
+        return {row.id for row in rows}
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def campaign(client, unique):
+    name = unique()
+    ids = _create_campaign(client, name, NOTES)
+    return name, ids
+
+
+@pytest.mark.parametrize('term', ['caverna', 'grupo', 'goblins', 'ouro', 'estrada', 'inexistente'])
+def test_search_matches_like_scan(campaign, term):
+    name, _ = campaign
+    assert _search_ids(term, name) == _like_ids(name, term)
+
+
+def test_campaign_filter(client, unique, campaign):
+    name, ids = campaign
+    other = unique()
+    other_ids = _create_campaign(client, other, NOTES[:3])
+
+    assert _search_ids('caverna', name) == _like_ids(name, 'caverna')
+    assert _search_ids('caverna', other) == _like_ids(other, 'caverna')
+    assert _search_ids('caverna', name) <= set(ids)
+    assert _search_ids('caverna', other) <= set(other_ids)
+    assert _search_ids('caverna', other)
+
+
+@pytest.mark.parametrize('term', ['dragao', 'dragão', 'elfica', 'élfica'])
+def test_accent_insensitive(campaign, term):
+    name, _ = campaign
+    stripped = term.replace('ã', 'a').replace('é', 'e')
+    accented = {'dragao': 'dragão', 'elfica': 'élfica'}.get(stripped, stripped)
+    expected = _like_ids(name, stripped, accented)
+    assert expected
+    assert _search_ids(term, name) == expected
+
+
+def _update_content(note_id, shard, content):
+    def update(session):
+        session.get(Notes, note_id).content = content
+    write(update, shard=shard)
+
+
+def _delete(note_id, shard):
+    def delete(session):
+        session.delete(session.get(Notes, note_id))
+    write(delete, shard=shard)
+
+
+def test_index_follows_update(campaign):
+    name, ids = campaign
+    shard = shards.locate(name=name)
+    target = ids[3]
+    assert target in _search_ids('goblins', name)
+
+    _update_content(target, shard, "Kobolds atacaram a caravana na estrada.")
+
+    assert target not in _search_ids('goblins', name)
+    assert target in _search_ids('kobolds', name)
+    for term in ('goblins', 'kobolds', 'caravana'):
+        assert _search_ids(term, name) == _like_ids(name, term)
+
+
+def test_index_follows_delete(campaign):
+    name, ids = campaign
+    shard = shards.locate(name=name)
+    target = ids[2]
+    assert target in _search_ids('mapa', name)
+
+    _delete(target, shard)
+
+    assert target not in _search_ids('mapa', name)
+    for term in ('mapa', 'caverna'):
+        assert _search_ids(term, name) == _like_ids(name, term)
+
+
+def test_highlight_escapes_html(client, unique):
+    name = unique()
+    _create_campaign(client, name, [
+        ('<script>alert(1)</script> dragão', '<img src=x onerror=alert(1)> o dragão & o grupo'),
+    ])
+    response = client.get('/notes/search', query_string={'q': 'dragão', 'campaign_name': name})
+    assert response.status_code == 200
+    [hit] = response.json['hits']
+    assert hit['title_highlight'] == '&lt;script&gt;alert(1)&lt;/script&gt; <mark>dragão</mark>'
+    assert '<img' not in hit['snippet']
+    assert '&lt;img src=x onerror=alert(1)&gt;' in hit['snippet']
+    assert '<mark>dragão</mark> &amp; o grupo' in hit['snippet']
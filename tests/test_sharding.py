@@ -0,0 +1,45 @@
+"""Cache LRU de shards: fechamento adiado dos bancos descartados"""
+import time
+
+import pytest
+from sqlalchemy import text
+
+from model import WriterClosedError, db_profile
+from model.sharding import ShardRouter
+
+
+@pytest.fixture
+def router(tmp_path):
+    profile = dict(db_profile, group_commit=True)
+    router = ShardRouter(None, str(tmp_path / 'shards'), 2, profile, max_open=1)
+    yield router
+    router.close()
+
+
+def _wait_closed(database, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not database.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return database.closed
+
+
+def test_evicted_shard_waits_for_connections_in_use(router):
+    first = router.get(0)
+    session = first.ReadSession()
+    session.execute(text("SELECT 1"))
+
+    router.get(1)  # descarta o shard 0 do cache
+    assert not first.closed
+    assert session.execute(text("SELECT count(*) FROM notes")).scalar() == 0
+
+    session.close()
+    assert _wait_closed(first)
+    with pytest.raises(WriterClosedError):
+        first.write(lambda session: None)
+
+
+def test_idle_evicted_shard_closes_at_once(router):
+    first = router.get(0)
+    router.get(1)
+    assert first.closed
+    assert router.get(0) is not first
@@ -0,0 +1,46 @@
+"""fields= e excerpt= nas listagens de notas"""
+import pytest
+
+
+@pytest.fixture
+def campaign(client, unique):
+    name = unique()
+    assert client.post('/campaigns', json={'name': name}).status_code == 201
+    for i in range(2):
+        response = client.post('/notes', json={'title': f'nota {i}', 'content': 'conteúdo ' * 40, 'campaign_name': name})
+        assert response.status_code == 201
+    return name
+
+
+@pytest.mark.parametrize('url', ['/notes', '/campaigns/{name}/notes'])
+@pytest.mark.parametrize('fields', ['', ','])
+def test_empty_fields_is_rejected(client, campaign, url, fields):
+    response = client.get(url.format(name=campaign), query_string={'fields': fields})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize('url', ['/notes', '/campaigns/{name}/notes'])
+def test_excerpt_with_content_field_is_rejected(client, campaign, url):
+    response = client.get(url.format(name=campaign), query_string={'fields': 'id,content', 'excerpt': 10})
+    assert response.status_code == 422
+
+
+def test_excerpt_replaces_content(client, campaign):
+    response = client.get(f'/campaigns/{campaign}/notes', query_string={'excerpt': 10})
+    assert response.status_code == 200
+    for note in response.json['notes']:
+        assert 'content' not in note
+        assert note['excerpt'] == 'conteúdo c'
+
+
+def test_excerpt_is_added_to_fields(client, campaign):
+    response = client.get(f'/campaigns/{campaign}/notes', query_string={'fields': 'id,title', 'excerpt': 5})
+    assert response.status_code == 200
+    assert [set(note) for note in response.json['notes']] == [{'id', 'title', 'excerpt'}] * 2
+    assert all(note['excerpt'] == 'conte' for note in response.json['notes'])
+
+
+def test_fields_returns_only_requested(client, campaign):
+    response = client.get(f'/campaigns/{campaign}/notes', query_string={'fields': 'title'})
+    assert response.status_code == 200
+    assert [note for note in response.json['notes']] == [{'title': 'nota 0'}, {'title': 'nota 1'}]
@@ -0,0 +1,66 @@
+"""Leitura incremental de arrays JSON (POST /notes/bulk)"""
+import io
+import json
+
+import pytest
+
+from streaming import MalformedStreamError, iter_json_array
+
+
+class CountingStream(io.BytesIO):
+    """BytesIO que conta quantos bytes já foram lidos"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.consumed = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.consumed += len(data)
+        return data
+
+
+def _items(body, **kwargs):
+    return [obj for _, obj, _ in iter_json_array(io.BytesIO(body), **kwargs)]
+
+
+def test_reads_items_across_reads():
+    items = [{'title': f'nota {i}', 'content': 'é' * i} for i in range(50)]
+    assert _items(json.dumps(items, ensure_ascii=False).encode('utf-8'), read_size=7) == items
+
+
+def test_item_at_size_limit_is_accepted():
+    item = {'content': 'x' * 1000}
+    body = json.dumps([item, item]).encode('utf-8')
+    assert _items(body, read_size=64, max_item_size=2000) == [item, item]
+
+
+def test_malformed_item_fails_before_end_of_body():
+    valid = json.dumps({'title': 't', 'content': 'x' * 100})
+    body = ('[' + valid + ', {"title": "quebrado" "content": 1}, ' + ', '.join([valid] * 5000) + ']').encode('utf-8')
+    stream = CountingStream(body)
+    source = iter_json_array(stream, read_size=1024, max_item_size=4096)
+
+    assert next(source)[1]['title'] == 't'
+    with pytest.raises(MalformedStreamError, match='Item 1'):
+        next(source)
+    assert stream.consumed < 8 * 1024 < len(body)
+
+
+def test_oversized_item_is_rejected():
+    body = json.dumps([{'content': 'x' * 10000}]).encode('utf-8')
+    with pytest.raises(MalformedStreamError):
+        _items(body, read_size=512, max_item_size=4096)
+
+
+def test_bulk_rejects_malformed_item_with_400(client, unique):
+    name = unique()
+    assert client.post('/campaigns', json={'name': name}).status_code == 201
+    valid = json.dumps({'title': 't', 'content': 'x' * 1000, 'campaign_name': name})
+    body = '[' + valid + ', {"title": "quebrado" ' + ', '.join([valid] * 2000) + ']'
+
+    response = client.post('/notes/bulk', data=body, content_type='application/json')
+
+    assert response.status_code == 400
+    assert 'Item 1' in response.json['message']
+    assert client.get(f'/campaigns/{name}/notes').json['notes'] == []